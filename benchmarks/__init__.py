@@ -0,0 +1 @@
+# 基准测试：python -m benchmarks.run --help
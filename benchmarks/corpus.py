@@ -0,0 +1,244 @@
+# benchmarks/corpus.py
+# 生成可复现的合成样本：同样的规模和随机种子总是得到同样的文件
+import html
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import zipfile
+
+_WORDS = (
+    'conversion document format paragraph table image page layout font render '
+    'stream buffer cache latency throughput worker process queue memory disk '
+    'quarterly report summary revenue growth customer product market review'
+).split()
+# DOCX/HTML 里混入中文，覆盖 UTF-8 多字节字符
+_CJK_WORDS = ['文档', '转换', '格式', '段落', '表格', '图片', '页面', '字体', '缓存', '队列']
+
+# 各规模下每种样本的大小
+SCALES = {
+    'small': {'docx_paragraphs': 200, 'docx_tables': 5, 'html_mb': 0.5, 'pdf_pages': 5, 'image_pdf_pages': 2},
+    'medium': {'docx_paragraphs': 2000, 'docx_tables': 20, 'html_mb': 5, 'pdf_pages': 50, 'image_pdf_pages': 10},
+    'large': {'docx_paragraphs': 20000, 'docx_tables': 100, 'html_mb': 50, 'pdf_pages': 300, 'image_pdf_pages': 50},
+}
+
+# 样本种类 -> (输入格式, 文件名后缀)
+VARIANTS = {
+    'docx': ('docx', 'docx'),
+    'html': ('html', 'html'),
+    'pdf-text': ('pdf', 'pdf'),
+    'pdf-image': ('pdf', 'pdf'),
+    'doc': ('doc', 'doc'),
+}
+
+
+class MissingGeneratorError(Exception):
+    """生成样本所需的库或程序不存在"""
+    pass
+
+
+def _sentence(rng: random.Random, words: int, cjk: bool = False) -> str:
+    vocabulary = _WORDS + _CJK_WORDS if cjk else _WORDS
+    text = ' '.join(rng.choice(vocabulary) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+# ---- DOCX ----
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+_DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships"/>'
+)
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def _docx_paragraph(text: str) -> str:
+    return f'<w:p><w:r><w:t xml:space="preserve">{html.escape(text, quote=False)}</w:t></w:r></w:p>'
+
+
+def _docx_table(rng: random.Random, rows: int = 6, cols: int = 4) -> str:
+    cells = ''.join(
+        '<w:tr>' + ''.join(f'<w:tc>{_docx_paragraph(_sentence(rng, 3, cjk=True))}</w:tc>' for _ in range(cols))
+        + '</w:tr>'
+        for _ in range(rows)
+    )
+    return f'<w:tbl><w:tblPr><w:tblW w:w="0" w:type="auto"/></w:tblPr>{cells}</w:tbl>'
+
+
+def make_docx(path: str, paragraphs: int, tables: int = 0, seed: int = 0):
+    """直接写 OOXML 生成 DOCX（不依赖 python-docx），表格均匀分布在段落之间"""
+    rng = random.Random(seed)
+    table_every = paragraphs // tables if tables else 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('word/_rels/document.xml.rels', _DOCUMENT_RELS)
+        with archive.open('word/document.xml', 'w') as f:
+            f.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    f'<w:document xmlns:w="{_W_NS}"><w:body>'.encode('utf-8'))
+            for index in range(paragraphs):
+                f.write(_docx_paragraph(_sentence(rng, rng.randint(8, 40), cjk=True)).encode('utf-8'))
+                if table_every and (index + 1) % table_every == 0:
+                    f.write(_docx_table(rng).encode('utf-8'))
+            f.write(b'<w:sectPr/></w:body></w:document>')
+
+
+# ---- HTML ----
+
+def make_html(path: str, megabytes: float, seed: int = 0):
+    """生成约 megabytes MB 的 HTML，包含标题、段落、列表和表格"""
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        head = '<!DOCTYPE html><html><head><meta charset="UTF-8"><title>benchmark</title></head><body>\n'
+        f.write(head)
+        written += len(head.encode('utf-8'))
+        section = 0
+        while written < target:
+            section += 1
+            parts = [f'<h2>{section}. {html.escape(_sentence(rng, 4, cjk=True))}</h2>']
+            parts += [f'<p>{html.escape(_sentence(rng, rng.randint(20, 80), cjk=True))}</p>' for _ in range(5)]
+            parts.append('<ul>' + ''.join(f'<li>{html.escape(_sentence(rng, 6))}</li>' for _ in range(4)) + '</ul>')
+            if section % 4 == 0:
+                rows = ''.join('<tr>' + ''.join(f'<td>{rng.randint(0, 99999)}</td>' for _ in range(5)) + '</tr>'
+                               for _ in range(8))
+                parts.append(f'<table>{rows}</table>')
+            chunk = '\n'.join(parts) + '\n'
+            f.write(chunk)
+            written += len(chunk.encode('utf-8'))
+        f.write('</body></html>\n')
+
+
+# ---- PDF ----
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_text_pdf(path: str, pages: int, seed: int = 0, lines_per_page: int = 55):
+    """手写一个带文本层的 PDF（Helvetica，ASCII 文本），不依赖任何 PDF 库"""
+    rng = random.Random(seed)
+    # 对象编号：1 目录，2 页面树，3 字体，之后每页占两个对象（页面、内容流）
+    offsets = []
+    with open(path, 'wb') as f:
+        def _object(number: int, body: bytes):
+            offsets.append((number, f.tell()))
+            f.write(f'{number} 0 obj\n'.encode('ascii') + body + b'\nendobj\n')
+
+        f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        kids = ' '.join(f'{4 + 2 * i} 0 R' for i in range(pages))
+        _object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        _object(2, f'<< /Type /Pages /Kids [{kids}] /Count {pages} >>'.encode('ascii'))
+        _object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+        for i in range(pages):
+            page_number, content_number = 4 + 2 * i, 5 + 2 * i
+            lines = [_pdf_escape(_sentence(rng, rng.randint(8, 14))) for _ in range(lines_per_page)]
+            stream = ('BT /F1 10 Tf 14 TL 50 800 Td\n' + ''.join(f'({line}) Tj T*\n' for line in lines)
+                      + 'ET').encode('ascii')
+            _object(page_number, (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                                  f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_number} 0 R >>')
+                    .encode('ascii'))
+            _object(content_number, f'<< /Length {len(stream)} >>\nstream\n'.encode('ascii') + stream
+                    + b'\nendstream')
+
+        xref_offset = f.tell()
+        count = 3 + 2 * pages + 1
+        f.write(f'xref\n0 {count}\n0000000000 65535 f \n'.encode('ascii'))
+        for _, offset in sorted(offsets):
+            f.write(f'{offset:010d} 00000 n \n'.encode('ascii'))
+        f.write(f'trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode('ascii'))
+
+
+def make_image_pdf(path: str, pages: int, seed: int = 0, dpi: int = 150):
+    """生成只有图片、没有文本层的 PDF（模拟扫描件），需要 Pillow"""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        raise MissingGeneratorError("生成扫描版PDF需要 Pillow")
+
+    rng = random.Random(seed)
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    line_height = dpi // 6
+
+    def _page():
+        image = Image.new('L', (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        y = dpi // 2
+        while y < height - dpi // 2:
+            draw.text((dpi // 2, y), _sentence(rng, rng.randint(6, 10)), fill=0)
+            y += line_height
+        return image
+
+    first = _page()
+    rest = [_page() for _ in range(pages - 1)]
+    first.save(path, 'PDF', save_all=True, append_images=rest, resolution=float(dpi))
+
+
+# ---- DOC ----
+
+def make_doc(path: str, paragraphs: int, tables: int = 0, seed: int = 0):
+    """先生成 DOCX，再用 LibreOffice 另存为 DOC"""
+    from core.backends.libreoffice import _soffice_binary
+
+    soffice = _soffice_binary()
+    if not shutil.which(soffice):
+        raise MissingGeneratorError("生成DOC样本需要 LibreOffice")
+    with tempfile.TemporaryDirectory(prefix='fileconvert-bench-') as temp_dir:
+        docx_path = os.path.join(temp_dir, 'sample.docx')
+        make_docx(docx_path, paragraphs, tables, seed)
+        subprocess.run(
+            [soffice, '--headless', '--norestore', f'-env:UserInstallation=file://{temp_dir}/profile',
+             '--convert-to', 'doc', '--outdir', temp_dir, docx_path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, timeout=600,
+        )
+        shutil.move(os.path.join(temp_dir, 'sample.doc'), path)
+
+
+def ensure_sample(corpus_dir: str, variant: str, scale: str, seed: int = 0) -> str:
+    """
+    返回指定种类和规模的样本路径，不存在时生成（文件名包含规模和种子，可以跨次运行复用）
+    :raises MissingGeneratorError: 生成所需的库或程序不存在
+    """
+    params = SCALES[scale]
+    suffix = VARIANTS[variant][1]
+    path = os.path.join(corpus_dir, f'{variant}-{scale}-{seed}.{suffix}')
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        if variant == 'docx':
+            make_docx(temp_path, params['docx_paragraphs'], params['docx_tables'], seed)
+        elif variant == 'html':
+            make_html(temp_path, params['html_mb'], seed)
+        elif variant == 'pdf-text':
+            make_text_pdf(temp_path, params['pdf_pages'], seed)
+        elif variant == 'pdf-image':
+            make_image_pdf(temp_path, params['image_pdf_pages'], seed)
+        elif variant == 'doc':
+            make_doc(temp_path, params['docx_paragraphs'], params['docx_tables'], seed)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+    return path
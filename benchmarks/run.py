@@ -0,0 +1,252 @@
+# benchmarks/run.py
+"""
+转换基准测试：为注册表中的每个转换对生成合成样本，在不同规模和并发度下测量
+耗时、峰值内存和吞吐量，结果保存为 JSON，并可与基线比较
+
+    python -m benchmarks.run --scales small,medium --concurrency 1,4
+    python -m benchmarks.run --baseline benchmarks/baseline.json --update-baseline
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.corpus import SCALES, MissingGeneratorError, ensure_sample
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS_DIR = os.path.join(ROOT, 'benchmarks', 'corpus')
+DEFAULT_RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+# 每个并发进程分到的文件数
+FILES_PER_WORKER = 2
+
+# 输入格式 -> 用来测试它的样本种类
+INPUT_VARIANTS = {
+    'docx': ['docx'],
+    'html': ['html'],
+    'pdf': ['pdf-text', 'pdf-image'],
+    'doc': ['doc'],
+}
+
+# 转换对（或转换对 + 样本种类）需要的 Python 模块和外部程序，缺少时跳过
+REQUIREMENTS = {
+    ('docx', 'txt'): ([], []),
+    ('docx', 'html'): ([], []),
+    ('docx', 'pdf'): ([], ['pandoc', 'xelatex']),
+    ('pdf', 'txt'): (['pdfplumber'], []),
+    # 文本型PDF直接转换，扫描件走OCR
+    ('pdf', 'docx', 'pdf-text'): (['pdfplumber', 'pdf2docx'], []),
+    ('pdf', 'docx', 'pdf-image'): (['pdfplumber', 'docx'], ['pdfinfo', 'pdftoppm', 'tesseract']),
+    ('html', 'txt'): (['html2text'], []),
+    ('html', 'pdf'): ([], ['pandoc', 'xelatex']),
+    ('doc', 'docx'): ([], ['soffice']),
+    ('doc', 'pdf'): ([], ['soffice']),
+}
+
+
+def _find_program(name: str):
+    if name == 'pandoc':
+        from core.backends.pandoc import pandoc_binary
+        return shutil.which(pandoc_binary())
+    if name == 'soffice':
+        from core.backends.libreoffice import _soffice_binary
+        return shutil.which(_soffice_binary())
+    return shutil.which(name)
+
+
+def missing_requirements(input_ext: str, output_ext: str, variant: str = None) -> list:
+    """返回该转换对缺少的模块和程序"""
+    modules, programs = REQUIREMENTS.get((input_ext, output_ext, variant)) \
+        or REQUIREMENTS.get((input_ext, output_ext), ([], []))
+    missing = [name for name in modules if importlib.util.find_spec(name) is None]
+    missing += [name for name in programs if not _find_program(name)]
+    return missing
+
+
+def benchmark_pairs(selected=None):
+    """注册表中所有直接转换对 [(input_ext, output_ext), ...]"""
+    from core.factory import ConverterFactory
+    from core.registry import get_supported_conversions
+
+    ConverterFactory.load_converters()
+    pairs = [(input_ext, output_ext) for input_ext, outputs in sorted(get_supported_conversions().items())
+             for output_ext in outputs]
+    if selected:
+        pairs = [pair for pair in pairs if f'{pair[0]}->{pair[1]}' in selected]
+    return pairs
+
+
+def _run_worker(sample: str, input_ext: str, output_ext: str, copies: int, concurrency: int) -> dict:
+    """在子进程里执行一轮转换；峰值内存取自 wait4 返回的整棵进程树"""
+    with tempfile.TemporaryDirectory(prefix='fileconvert-bench-') as output_dir:
+        env = dict(os.environ, FILECONVERT_NO_CACHE='1')
+        env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+        with tempfile.TemporaryFile() as stdout:
+            started = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'benchmarks.worker', sample, output_dir, '--input-ext', input_ext,
+                 '--output-ext', output_ext, '--copies', str(copies), '--concurrency', str(concurrency)],
+                cwd=ROOT, env=env, stdout=stdout,
+            )
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            wall = time.perf_counter() - started
+            stdout.seek(0)
+            output = stdout.read().decode('utf-8', 'replace')
+
+    if process.returncode != 0:
+        return {'ok': 0, 'failed': copies, 'errors': [f'工作进程退出码 {process.returncode}']}
+    result = json.loads(output)
+    # Linux 上 ru_maxrss 单位是 KB，macOS 上是字节
+    scale = 1 if sys.platform == 'darwin' else 1024
+    result['peak_rss_mb'] = usage.ru_maxrss * scale / 1024 / 1024
+    result['process_seconds'] = wall
+    result['cpu_seconds'] = usage.ru_utime + usage.ru_stime
+    return result
+
+
+def run_benchmarks(scales, concurrency_levels, pairs=None, repeat: int = 3, corpus_dir: str = DEFAULT_CORPUS_DIR,
+                   seed: int = 0, log=print) -> dict:
+    """
+    执行全部基准
+    :return: {'meta': {...}, 'results': {键: 测量结果}, 'skipped': {键: 原因}}
+    """
+    results, skipped = {}, {}
+    for input_ext, output_ext in benchmark_pairs(pairs):
+        for variant in INPUT_VARIANTS.get(input_ext, []) or [None]:
+            missing = missing_requirements(input_ext, output_ext, variant)
+            for scale in scales:
+                if variant is None:
+                    skipped[f'{input_ext}->{output_ext}|-|{scale}'] = f'没有 {input_ext} 格式的样本生成器'
+                    continue
+                if missing:
+                    skipped[f'{input_ext}->{output_ext}|{variant}|{scale}'] = '缺少: ' + ', '.join(missing)
+                    continue
+                try:
+                    sample = ensure_sample(corpus_dir, variant, scale, seed)
+                except (MissingGeneratorError, OSError, subprocess.SubprocessError) as e:
+                    skipped[f'{input_ext}->{output_ext}|{variant}|{scale}'] = f'无法生成样本: {e}'
+                    continue
+
+                input_bytes = os.path.getsize(sample)
+                for concurrency in concurrency_levels:
+                    key = f'{input_ext}->{output_ext}|{variant}|{scale}|c{concurrency}'
+                    copies = concurrency * FILES_PER_WORKER
+                    runs = [_run_worker(sample, input_ext, output_ext, copies, concurrency) for _ in range(repeat)]
+                    failed = [run for run in runs if run.get('failed')]
+                    if failed:
+                        results[key] = {'status': 'failed', 'errors': failed[0].get('errors')}
+                        log(f'{key}: 失败 {failed[0].get("errors")}')
+                        continue
+                    seconds = statistics.median(run['seconds'] for run in runs)
+                    results[key] = {
+                        'status': 'ok',
+                        'files': copies,
+                        'input_bytes': input_bytes,
+                        'seconds': seconds,
+                        'seconds_min': min(run['seconds'] for run in runs),
+                        'seconds_max': max(run['seconds'] for run in runs),
+                        'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+                        'cpu_seconds': statistics.median(run['cpu_seconds'] for run in runs),
+                        'files_per_second': copies / seconds if seconds else None,
+                        'mb_per_second': copies * input_bytes / 1024 / 1024 / seconds if seconds else None,
+                    }
+                    log(f'{key}: {seconds:.3f}s, {results[key]["files_per_second"]:.2f} 文件/秒, '
+                        f'峰值内存 {results[key]["peak_rss_mb"]:.0f} MB')
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'scales': list(scales),
+            'concurrency': list(concurrency_levels),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(current: dict, baseline: dict, time_threshold: float = 0.2, rss_threshold: float = 0.2) -> list:
+    """
+    与基线比较，耗时或峰值内存超过基线 (1 + 阈值) 倍即为回归
+    :return: [(键, 指标, 基线值, 当前值), ...]
+    """
+    regressions = []
+    for key, result in current['results'].items():
+        base = baseline.get('results', {}).get(key)
+        if not base or base.get('status') != 'ok':
+            continue
+        if result.get('status') != 'ok':
+            regressions.append((key, 'status', 'ok', result.get('status')))
+            continue
+        for metric, threshold in (('seconds', time_threshold), ('peak_rss_mb', rss_threshold)):
+            if result[metric] > base[metric] * (1 + threshold):
+                regressions.append((key, metric, base[metric], result[metric]))
+    return regressions
+
+
+def _split(value: str):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文件转换基准测试')
+    parser.add_argument('--scales', default='small', help=f'逗号分隔的规模，可选 {", ".join(SCALES)}')
+    parser.add_argument('--concurrency', default='1', help='逗号分隔的并发进程数，例如 1,4')
+    parser.add_argument('--pairs', help='只测试这些转换对，例如 docx->txt,pdf->txt')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取中位数')
+    parser.add_argument('--seed', type=int, default=0, help='样本生成的随机种子')
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR, help='样本缓存目录')
+    parser.add_argument('--output', help='结果 JSON 路径（默认 benchmarks/results/时间戳.json）')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线 JSON 路径')
+    parser.add_argument('--threshold', type=float, default=0.2, help='耗时回归阈值（0.2 即慢 20%%）')
+    parser.add_argument('--rss-threshold', type=float, default=0.2, help='峰值内存回归阈值')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写为新的基线')
+    args = parser.parse_args()
+
+    scales = _split(args.scales)
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        parser.error(f'未知的规模: {", ".join(unknown)}')
+
+    report = run_benchmarks(scales, [int(c) for c in _split(args.concurrency)],
+                            pairs=_split(args.pairs) if args.pairs else None, repeat=args.repeat,
+                            corpus_dir=args.corpus_dir, seed=args.seed)
+    for key, reason in report['skipped'].items():
+        print(f'{key}: 跳过（{reason}）')
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'结果已保存: {output}')
+
+    if args.update_baseline:
+        shutil.copyfile(output, args.baseline)
+        print(f'基线已更新: {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.threshold, args.rss_threshold)
+    for key, metric, before, after in regressions:
+        print(f'回归: {key} {metric} {before} -> {after}', file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+    print('与基线相比没有回归')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# benchmarks/worker.py
+# 在独立进程里执行一轮转换，父进程用 wait4 取得这棵进程树的峰值内存
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='执行一轮基准转换（由 benchmarks.run 调用）')
+    parser.add_argument('input')
+    parser.add_argument('output_dir')
+    parser.add_argument('--input-ext', required=True)
+    parser.add_argument('--output-ext', required=True)
+    parser.add_argument('--copies', type=int, default=1, help='转换同一输入的次数')
+    parser.add_argument('--concurrency', type=int, default=1)
+    args = parser.parse_args()
+
+    from core.batch import BatchJob, run_batch
+
+    jobs = [
+        BatchJob(args.input, os.path.join(args.output_dir, f'out{i}.{args.output_ext}'),
+                 args.input_ext, args.output_ext)
+        for i in range(args.copies)
+    ]
+    errors = []
+
+    def _on_result(result):
+        if result['status'] != 'ok':
+            errors.append(result['error'])
+
+    started = time.perf_counter()
+    summary = run_batch(jobs, workers=args.concurrency, on_result=_on_result, use_cache=False)
+    seconds = time.perf_counter() - started
+
+    output_bytes = sum(os.path.getsize(job.output_path) for job in jobs if os.path.exists(job.output_path))
+    json.dump({'seconds': seconds, 'ok': summary['ok'], 'failed': summary['failed'],
+               'output_bytes': output_bytes, 'errors': errors[:3]}, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
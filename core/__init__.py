@@ -4,8 +4,9 @@ from .exceptions import (
     FileConversionError,
     UnsupportedFormatError,
     FileReadError,
-    FileWriteError
+    FileWriteError,
+    ConversionCancelledError
 )
 
 __all__ = ['ConverterFactory', 'FileConversionError', 'UnsupportedFormatError',
-           'FileReadError', 'FileWriteError']
\ No newline at end of file
+           'FileReadError', 'FileWriteError', 'ConversionCancelledError']
\ No newline at end of file
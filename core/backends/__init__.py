@@ -0,0 +1,4 @@
+# 外部转换后端（LibreOffice 等长驻进程）
+from .libreoffice import LibreOfficePool, get_libreoffice_pool
+
+__all__ = ['LibreOfficePool', 'get_libreoffice_pool']
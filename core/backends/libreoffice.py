@@ -0,0 +1,287 @@
+# core/backends/libreoffice.py
+import atexit
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from core import metrics
+from core.backends.process import (
+    CANCEL_POLL_INTERVAL, cancel_requested, check_cancelled, check_quarantine, kill_process_group, process_exited,
+    process_timeout, record_strike, run_process, spawn_process
+)
+from core.exceptions import ConversionCancelledError, ConversionTimeoutError, FileConversionError
+
+# LibreOffice 导出过滤器
+_EXPORT_FILTERS = {
+    'docx': ('MS Word 2007 XML', None),
+    'pdf': ('writer_pdf_Export', None),
+    'html': ('HTML (StarWriter)', None),
+    'txt': ('Text (encoded)', 'UTF8'),
+}
+
+DEFAULT_POOL_SIZE = min(4, os.cpu_count() or 1)
+DEFAULT_START_TIMEOUT = 60
+DEFAULT_CONVERT_TIMEOUT = 300
+
+
+def _soffice_binary() -> str:
+    return shutil.which('soffice') or shutil.which('libreoffice') or 'soffice'
+
+
+def _uno_available() -> bool:
+    try:
+        import uno  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class LibreOfficeWorker:
+    """一个长驻的 headless LibreOffice 实例，拥有独立的用户配置目录"""
+
+    def __init__(self, index: int, profile_root: str, use_uno: bool = True):
+        self.index = index
+        self.profile_dir = os.path.join(profile_root, f'worker-{index}')
+        self.pipe_name = f'fileconvert_{os.getpid()}_{index}'
+        self.use_uno = use_uno
+        self.process = None
+        self._desktop = None
+
+    @property
+    def profile_url(self) -> str:
+        return Path(self.profile_dir).absolute().as_uri()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and not process_exited(self.process)
+
+    def start(self, timeout: float = DEFAULT_START_TIMEOUT):
+        """启动 soffice 进程并等待 UNO 连接就绪"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        cmd = [
+            _soffice_binary(),
+            '--headless',
+            '--invisible',
+            '--nologo',
+            '--norestore',
+            '--nodefault',
+            '--nolockcheck',
+            f'-env:UserInstallation={self.profile_url}',
+            f'--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext',
+        ]
+        try:
+            self.process = spawn_process(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                stdin=subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            raise FileConversionError("LibreOffice未安装或不在PATH中")
+
+        self._desktop = self._connect(timeout)
+
+    def _connect(self, timeout: float):
+        import uno
+        from com.sun.star.connection import NoConnectException
+
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_ctx)
+        url = f'uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext'
+
+        deadline = time.monotonic() + timeout
+        while True:
+            if not self.is_alive():
+                raise FileConversionError("LibreOffice进程启动后意外退出")
+            try:
+                ctx = resolver.resolve(url)
+                return ctx.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', ctx)
+            except NoConnectException:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise FileConversionError("等待LibreOffice启动超时")
+                time.sleep(0.25)
+
+    def stop(self):
+        """终止 soffice 进程及其子进程（soffice.bin 等），保留配置目录以便重启时复用"""
+        self._desktop = None
+        if self.process is None:
+            return
+        kill_process_group(self.process, grace=10)
+        self.process = None
+
+    def convert(self, input_path: str, outputs: dict, timeout: float):
+        """
+        在本实例中执行一次转换，超时则杀死进程
+        :param outputs: {导出格式: 输出路径}，UNO 模式下文档只打开一次，依次导出各格式
+        """
+        if self.use_uno:
+            self._convert_with_uno(input_path, outputs, timeout)
+        else:
+            # --convert-to 一次只能导出一种格式
+            for output_format, output_path in outputs.items():
+                self._convert_oneshot(input_path, output_path, output_format, timeout)
+
+    def _convert_with_uno(self, input_path: str, outputs: dict, timeout: float):
+        # 常驻实例不经过 run_process，隔离检查、取消和超时记录在这里做
+        check_quarantine(input_path)
+        check_cancelled()
+        if not self.is_alive() or self._desktop is None:
+            self.stop()
+            self.start()
+
+        result = {}
+
+        def _run():
+            try:
+                self._store(input_path, outputs)
+            except Exception as e:
+                result['error'] = e
+
+        # UNO 调用本身无法设置超时和取消，放到线程里执行，超时或取消后杀掉实例让调用失败返回
+        thread = threading.Thread(target=_run, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + timeout
+        while thread.is_alive() and not cancel_requested() and time.monotonic() < deadline:
+            thread.join(min(CANCEL_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+        if thread.is_alive() and cancel_requested():
+            self.stop()
+            thread.join(10)
+            raise ConversionCancelledError("转换已取消")
+        if thread.is_alive():
+            self.stop()
+            thread.join(10)
+            record_strike(input_path, 'LibreOffice超时')
+            raise ConversionTimeoutError(f"LibreOffice转换超时（{timeout:.0f}秒）")
+        if 'error' in result:
+            if not self.is_alive():
+                # 实例在转换中崩溃
+                record_strike(input_path, 'LibreOffice崩溃')
+                self.stop()
+            raise FileConversionError(f"LibreOffice转换失败: {result['error']}")
+
+    def _store(self, input_path: str, outputs: dict):
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        load_props = (PropertyValue(Name='Hidden', Value=True),)
+        document = self._desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(input_path)), '_blank', 0, load_props)
+        if document is None:
+            raise FileConversionError("LibreOffice无法打开输入文件")
+        try:
+            for output_format, output_path in outputs.items():
+                filter_name, filter_options = _EXPORT_FILTERS[output_format]
+                store_props = [PropertyValue(Name='FilterName', Value=filter_name)]
+                if filter_options:
+                    store_props.append(PropertyValue(Name='FilterOptions', Value=filter_options))
+                document.storeToURL(uno.systemPathToFileUrl(os.path.abspath(output_path)), tuple(store_props))
+        finally:
+            document.close(True)
+
+    def _convert_oneshot(self, input_path: str, output_path: str, output_format: str, timeout: float):
+        """没有 UNO 时退化为一次性进程，但仍使用本实例独占的配置目录"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        out_dir = tempfile.mkdtemp(prefix='soffice-out-', dir=self.profile_dir)
+        try:
+            filter_name, filter_options = _EXPORT_FILTERS[output_format]
+            target = f'{output_format}:{filter_name}'
+            if filter_options:
+                target += f':{filter_options}'
+            cmd = [
+                _soffice_binary(),
+                '--headless',
+                '--norestore',
+                '--nolockcheck',
+                f'-env:UserInstallation={self.profile_url}',
+                '--convert-to',
+                target,
+                '--outdir',
+                out_dir,
+                input_path,
+            ]
+            try:
+                run_process(cmd, name='LibreOffice', timeout=timeout, subject=input_path)
+            except subprocess.CalledProcessError as e:
+                raise FileConversionError(f"LibreOffice转换失败: {e.stderr.decode('utf-8', 'replace')}")
+            except FileNotFoundError:
+                raise FileConversionError("LibreOffice未安装或不在PATH中")
+
+            generated_file = os.path.join(
+                out_dir, os.path.splitext(os.path.basename(input_path))[0] + '.' + output_format)
+            if not os.path.exists(generated_file):
+                raise FileConversionError("LibreOffice转换失败，未生成输出文件")
+            shutil.move(generated_file, output_path)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+class LibreOfficePool:
+    """LibreOffice 实例池：按需启动、独立配置目录、崩溃或卡死后自动重启"""
+
+    def __init__(self, size: int = None, profile_root: str = None,
+                 convert_timeout: float = DEFAULT_CONVERT_TIMEOUT):
+        self.size = max(1, size or DEFAULT_POOL_SIZE)
+        self.convert_timeout = convert_timeout
+        self._own_profile_root = profile_root is None
+        self.profile_root = profile_root or tempfile.mkdtemp(prefix='fileconvert-soffice-')
+        self.use_uno = _uno_available()
+        self._workers = [LibreOfficeWorker(i, self.profile_root, self.use_uno) for i in range(self.size)]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def convert(self, input_path: str, output_path: str, output_format: str, timeout: float = None):
+        """借出一个空闲实例执行转换（已崩溃的实例会在借出时重启）"""
+        self.convert_many(input_path, {output_format: output_path}, timeout)
+
+    def convert_many(self, input_path: str, outputs: dict, timeout: float = None):
+        """
+        同一输入导出为多个格式，只占用一个实例、只打开一次文档
+        :param outputs: {导出格式: 输出路径}
+        """
+        for output_format in outputs:
+            if output_format not in _EXPORT_FILTERS:
+                raise FileConversionError(f"LibreOffice不支持导出为 {output_format}")
+
+        timeout = process_timeout(timeout or self.convert_timeout)
+        with metrics.stage('soffice_wait'):
+            worker = self._idle.get()
+        try:
+            # UNO 模式下常驻的 soffice 不会被回收，它的 CPU 时间不计入子进程 CPU 时间
+            output_path = next(iter(outputs.values())) if len(outputs) == 1 else None
+            with metrics.stage('soffice', input_path, output_path, mode='uno' if worker.use_uno else 'oneshot',
+                               formats=','.join(outputs)):
+                worker.convert(input_path, outputs, timeout)
+        finally:
+            self._idle.put(worker)
+
+        for output_path in outputs.values():
+            if not os.path.exists(output_path):
+                raise FileConversionError("LibreOffice转换失败，未生成输出文件")
+
+    def shutdown(self):
+        """停止所有实例并清理临时配置目录"""
+        for worker in self._workers:
+            worker.stop()
+        if self._own_profile_root:
+            shutil.rmtree(self.profile_root, ignore_errors=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_libreoffice_pool() -> LibreOfficePool:
+    """获取进程内共享的实例池，大小由环境变量 FILECONVERT_SOFFICE_WORKERS 配置"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            size = int(os.environ.get('FILECONVERT_SOFFICE_WORKERS', 0)) or None
+            _pool = LibreOfficePool(size=size)
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,108 @@
+# core/backends/ocr.py
+import os
+import re
+import subprocess
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional, Tuple
+from core import metrics
+from core.backends.process import job_limits, job_snapshot, run_process
+from core.exceptions import FileConversionError
+
+DEFAULT_OCR_DPI = 200
+DEFAULT_OCR_LANG = 'chi_sim'
+# OCR不可用：没有安装 pdftoppm/tesseract，或它们运行失败（例如缺少语言数据）
+# auto 模式下遇到时保留直接提取的结果；超时和隔离不在其中，照常向上抛出
+OCR_UNAVAILABLE_ERRORS = (FileNotFoundError, subprocess.CalledProcessError)
+
+
+def pdf_page_count(input_path: str) -> int:
+    """读取PDF页数（不做栅格化）"""
+    result = run_process(['pdfinfo', input_path], name='pdfinfo')
+    match = re.search(r'^Pages:\s+(\d+)', result.stdout.decode('utf-8', 'replace'), re.MULTILINE)
+    if match is None:
+        raise FileConversionError("pdfinfo 未能读取PDF页数")
+    return int(match.group(1))
+
+
+def ocr_page(input_path: str, page_number: int, dpi: int = DEFAULT_OCR_DPI,
+             lang: str = DEFAULT_OCR_LANG) -> str:
+    """
+    栅格化单页并识别文字（供进程池调用）
+    直接调用 pdftoppm 和 tesseract，两者都受任务的时间和资源限制，超时时连同子进程一起终止；
+    图像写到临时文件由 tesseract 读取，不在内存里保留整页位图
+    :param page_number: 从 1 开始的页码
+    """
+    with tempfile.TemporaryDirectory(prefix='fileconvert-ocr-') as temp_dir:
+        image_path = os.path.join(temp_dir, 'page.png')
+        with metrics.stage('rasterize', page=page_number, dpi=dpi) as record:
+            run_process(['pdftoppm', '-r', str(dpi), '-f', str(page_number), '-l', str(page_number),
+                         '-png', '-singlefile', input_path, image_path[:-len('.png')]], name='pdftoppm')
+            record['bytes_out'] = os.path.getsize(image_path)
+        with metrics.stage('tesseract', page=page_number, lang=lang) as record:
+            record['bytes_in'] = os.path.getsize(image_path)
+            result = run_process(['tesseract', image_path, 'stdout', '-l', lang], name='tesseract')
+            return result.stdout.decode('utf-8', 'replace')
+
+
+def _ocr_page_task(input_path: str, page_number: int, dpi: int, lang: str, limits: dict):
+    """进程池里执行的 ocr_page：沿用父进程任务的限制；阶段记录随结果带回父进程，由父进程发往输出端"""
+    metrics.clear_sinks()
+    with job_limits(**limits), metrics.collect() as records:
+        text = ocr_page(input_path, page_number, dpi, lang)
+    return text, records
+
+
+def iter_ocr_pages(input_path: str, pages: Optional[Iterable[int]] = None, dpi: int = DEFAULT_OCR_DPI,
+                   lang: str = DEFAULT_OCR_LANG, jobs: int = 1) -> Iterator[Tuple[int, str]]:
+    """
+    按页码顺序逐页产出 (page_number, text)
+    多进程时最多同时有 2 * jobs 页在处理，内存占用与总页数无关
+    """
+    if pages is None:
+        pages = range(1, pdf_page_count(input_path) + 1)
+
+    jobs = max(1, jobs or 1)
+    if jobs == 1:
+        for page_number in pages:
+            yield page_number, ocr_page(input_path, page_number, dpi, lang)
+        return
+
+    def _result(future):
+        text, records = future.result()
+        metrics.replay(records)
+        return text
+
+    window = 2 * jobs
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for page_number in pages:
+            pending.append((page_number, executor.submit(
+                _ocr_page_task, input_path, page_number, dpi, lang, job_snapshot())))
+            if len(pending) >= window:
+                done_page, future = pending.popleft()
+                yield done_page, _result(future)
+        while pending:
+            done_page, future = pending.popleft()
+            yield done_page, _result(future)
+
+
+def record_ocr_skipped(input_path: str, pages, error: Exception):
+    """auto 模式下OCR不可用、扫描页保留直接提取结果时，记一个 ocr_skipped 阶段说明原因"""
+    if isinstance(error, subprocess.CalledProcessError):
+        stderr = (error.stderr or b'').decode('utf-8', 'replace').strip()
+        reason = f"{os.path.basename(str(error.cmd[0]))} 退出码 {error.returncode}" + (f": {stderr}" if stderr else "")
+    else:
+        reason = str(error)
+    with metrics.stage('ocr_skipped', input_path, pages=len(pages), reason=reason[:500]):
+        pass
+
+
+def split_paragraphs(text: str):
+    """按空行切分 OCR 结果，去掉段内换行两端的空白"""
+    for block in text.split('\n\n'):
+        block = '\n'.join(line.strip() for line in block.strip().splitlines())
+        if block:
+            yield block
+
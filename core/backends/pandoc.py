@@ -0,0 +1,371 @@
+# core/backends/pandoc.py
+import atexit
+import hashlib
+import json
+import os
+import queue
+import re
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import urllib.request
+from core import metrics
+from core.backends.process import kill_process_group, process_exited, process_timeout, run_process, spawn_process
+from core.exceptions import ConversionTimeoutError, FileConversionError
+
+# 固定的模板参数：xelatex + 中文字体 + A4
+PDF_ENGINE = 'xelatex'
+PDF_VARIABLES = {
+    'mainfont': 'SimHei',
+    'geometry': 'a4paper',
+}
+
+DEFAULT_TIMEOUT = 600
+_SERVER_START_TIMEOUT = 15
+_MAX_LATEX_RUNS = 3
+
+# 字体设置必须在运行时执行（XeTeX 无法把系统字体存进格式文件），预编译只到这些命令之前
+_FONT_SETUP = re.compile(r'\\(setmainfont|setsansfont|setmonofont|setmathfont|setCJK\w*font|newfontfamily)\b')
+_CONDITIONAL_OPEN = re.compile(r'(?<!\\newif)\\if(?!thenelse)[A-Za-z@]*')
+_CONDITIONAL_CLOSE = re.compile(r'\\fi(?![A-Za-z@])')
+
+
+def pandoc_binary() -> str:
+    """优先使用 pypandoc 找到（或下载）的 pandoc"""
+    try:
+        import pypandoc
+        return pypandoc.get_pandoc_path()
+    except (ImportError, OSError):
+        return shutil.which('pandoc') or 'pandoc'
+
+
+class _ServerStartError(FileConversionError):
+    """pandoc server 无法启动（通常是 pandoc 版本低于 3.0）"""
+    pass
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class PandocServer:
+    """一个本地 `pandoc server` 进程（pandoc 3.0 起提供），通过 HTTP JSON 接口转换文本格式"""
+
+    def __init__(self):
+        self.port = None
+        self.process = None
+
+    def is_alive(self) -> bool:
+        return self.process is not None and not process_exited(self.process)
+
+    def start(self):
+        self.port = _free_port()
+        try:
+            self.process = spawn_process(
+                [pandoc_binary(), 'server', '--port', str(self.port), '--timeout', str(DEFAULT_TIMEOUT)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                stdin=subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            raise _ServerStartError("pandoc未安装或不在PATH中")
+
+        deadline = time.monotonic() + _SERVER_START_TIMEOUT
+        while True:
+            if not self.is_alive():
+                raise _ServerStartError("pandoc server 启动失败（需要 pandoc 3.0 及以上版本）")
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=0.5):
+                    return
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise _ServerStartError("等待 pandoc server 启动超时")
+                time.sleep(0.1)
+
+    def stop(self):
+        if self.process is not None:
+            kill_process_group(self.process, grace=5)
+        self.process = None
+
+    def convert_text(self, text: str, from_format: str, to_format: str, variables: dict = None,
+                     standalone: bool = True) -> str:
+        if not self.is_alive():
+            self.start()
+        payload = {
+            'text': text,
+            'from': from_format,
+            'to': to_format,
+            'standalone': standalone,
+            'variables': variables or {},
+        }
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{self.port}/',
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'Accept': 'application/json'},
+        )
+        timeout = process_timeout(DEFAULT_TIMEOUT)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                result = json.loads(response.read().decode('utf-8'))
+        except Exception as e:
+            raise FileConversionError(f"pandoc server 转换失败: {e}")
+        if result.get('error'):
+            raise FileConversionError(f"pandoc server 转换失败: {result['error']}")
+        return result['output']
+
+
+class PandocBackend:
+    """
+    PDF 生成后端：pandoc 生成 LaTeX，xelatex 排版
+    - 不含图片的 HTML 和 DOCX 交给常驻的 pandoc server 池，省去进程启动；带图片的文档仍走 pandoc 命令行
+    - 固定模板的导言区用 mylatexformat 预编译为格式文件并缓存，xelatex 不再每次重新加载宏包
+    - 每次转换使用独立的工作目录，可以多线程并发调用
+    """
+
+    def __init__(self, server_count: int = 1, format_dir: str = None):
+        self.server_count = max(1, server_count)
+        if format_dir is None:
+            from core.cache import default_cache_dir
+            format_dir = os.path.join(default_cache_dir(), 'latex-formats')
+        self.format_dir = format_dir
+        self._servers = queue.Queue()
+        self._servers_started = False
+        self._server_unavailable = False
+        self._lock = threading.Lock()
+
+    # ---- pandoc ----
+
+    def _acquire_server(self):
+        with self._lock:
+            if not self._servers_started:
+                for _ in range(self.server_count):
+                    self._servers.put(PandocServer())
+                self._servers_started = True
+        return self._servers.get()
+
+    @staticmethod
+    def _server_text(input_path: str, input_format: str):
+        """
+        pandoc server 的输入：HTML 按 BOM / meta charset 解码，DOCX 按 server 对二进制格式的约定以 base64 传入
+        server 读不到本地文件，也不能把图片导出到工作目录，带图片的文档和解码失败的 HTML 返回 None，走命令行
+        """
+        if input_format == 'html':
+            from core.html_text import detect_encoding
+            with open(input_path, 'rb') as f:
+                data = f.read()
+            encoding, bom_length = detect_encoding(data[:4096])
+            try:
+                text = data[bom_length:].decode(encoding)
+            except UnicodeDecodeError:
+                return None
+            return None if '<img' in text.lower() else text
+        if input_format == 'docx':
+            import base64
+            import zipfile
+            try:
+                with zipfile.ZipFile(input_path) as archive:
+                    if any(name.startswith('word/media/') for name in archive.namelist()):
+                        return None
+            except zipfile.BadZipFile:
+                return None
+            with open(input_path, 'rb') as f:
+                return base64.b64encode(f.read()).decode('ascii')
+        return None
+
+    def _to_latex_with_server(self, input_path: str, input_format: str, text: str) -> str:
+        server = self._acquire_server()
+        try:
+            with metrics.stage('pandoc', input_path, mode='server'):
+                return server.convert_text(text, input_format, 'latex', variables=PDF_VARIABLES)
+        finally:
+            self._servers.put(server)
+
+    def _to_latex_with_cli(self, input_path: str, input_format: str, work_dir: str) -> str:
+        tex_path = os.path.join(work_dir, 'document.tex')
+        cmd = [
+            pandoc_binary(),
+            input_path,
+            '-f', input_format,
+            '-t', 'latex',
+            '--standalone',
+            f'--extract-media={work_dir}',
+            f'--resource-path={os.path.dirname(os.path.abspath(input_path))}',
+            '-o', tex_path,
+        ]
+        for name, value in PDF_VARIABLES.items():
+            cmd += ['-V', f'{name}={value}']
+        try:
+            with metrics.stage('pandoc', input_path, tex_path, mode='cli'):
+                run_process(cmd, name='pandoc', timeout=DEFAULT_TIMEOUT)
+        except subprocess.CalledProcessError as e:
+            raise FileConversionError(f"pandoc转换失败: {e.stderr.decode('utf-8', 'replace')}")
+        except FileNotFoundError:
+            raise FileConversionError("pandoc未安装或不在PATH中")
+        with open(tex_path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def to_latex(self, input_path: str, input_format: str, work_dir: str) -> str:
+        """
+        生成完整的 LaTeX 源码
+        不含图片的 HTML 和 DOCX 交给常驻的 pandoc server；带图片的文档（以及 server 不可用时）启动 pandoc 命令行
+        """
+        text = None if self._server_unavailable else self._server_text(input_path, input_format)
+        if text is not None:
+            try:
+                return self._to_latex_with_server(input_path, input_format, text)
+            except _ServerStartError:
+                # 老版本 pandoc 没有 server 模式，之后都直接走命令行
+                self._server_unavailable = True
+            except ConversionTimeoutError:
+                raise
+            except FileConversionError:
+                # 单个文档在 server 上失败时改用命令行，由命令行给出完整的错误信息
+                pass
+        return self._to_latex_with_cli(input_path, input_format, work_dir)
+
+    # ---- LaTeX ----
+
+    @staticmethod
+    def _split_preamble(latex: str):
+        """
+        找到可以预编译的导言区部分：字体设置之前、且不在条件分支内部的最后一行
+        :return: (可预编译部分, 剩余部分)，找不到安全位置时返回 None
+        """
+        lines = latex.splitlines(keepends=True)
+        depth = 0
+        safe_index = None
+        for index, line in enumerate(lines):
+            code = line.split('%', 1)[0]
+            if _FONT_SETUP.search(code) or code.lstrip().startswith('\\begin{document}'):
+                break
+            if depth == 0:
+                safe_index = index
+            depth += len(_CONDITIONAL_OPEN.findall(code)) - len(_CONDITIONAL_CLOSE.findall(code))
+        else:
+            return None
+        if not safe_index:
+            return None
+        preamble = ''.join(lines[:safe_index])
+        if '\\documentclass' not in preamble:
+            return None
+        return preamble, ''.join(lines[safe_index:])
+
+    def _format_for(self, preamble: str):
+        """返回预编译格式名（必要时构建），构建失败返回 None"""
+        name = 'fc-' + hashlib.sha256(preamble.encode('utf-8')).hexdigest()[:16]
+        fmt_path = os.path.join(self.format_dir, name + '.fmt')
+        failed_marker = os.path.join(self.format_dir, name + '.failed')
+        if os.path.exists(fmt_path):
+            return name
+        if os.path.exists(failed_marker):
+            return None
+
+        os.makedirs(self.format_dir, exist_ok=True)
+        build_name = f'{name}-{os.getpid()}-{threading.get_ident()}'
+        preamble_path = os.path.join(self.format_dir, build_name + '.tex')
+        with open(preamble_path, 'w', encoding='utf-8') as f:
+            f.write(preamble)
+            f.write('\\begin{document}\n\\end{document}\n')
+        try:
+            with metrics.stage('latex_format', preamble_path):
+                run_process(
+                    [PDF_ENGINE, '-ini', '-interaction=nonstopmode', f'-jobname={build_name}',
+                     f'&{PDF_ENGINE}', 'mylatexformat.ltx', build_name + '.tex'],
+                    cwd=self.format_dir, timeout=DEFAULT_TIMEOUT,
+                )
+            os.replace(os.path.join(self.format_dir, build_name + '.fmt'), fmt_path)
+            return name
+        except ConversionTimeoutError:
+            # 超时说明任务时间不够，不代表导言区不能预编译
+            raise
+        except (subprocess.SubprocessError, OSError):
+            # 缺少 mylatexformat 或导言区不能转储时，以后直接跳过预编译
+            open(failed_marker, 'w').close()
+            return None
+        finally:
+            for ext in ('.tex', '.log', '.fmt'):
+                path = os.path.join(self.format_dir, build_name + ext)
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def _run_latex(self, tex_name: str, work_dir: str, fmt_name: str = None):
+        cmd = [PDF_ENGINE, '-interaction=nonstopmode', '-halt-on-error']
+        env = dict(os.environ)
+        if fmt_name:
+            cmd.append(f'-fmt={fmt_name}')
+            # 末尾的路径分隔符表示保留默认搜索路径
+            env['TEXFORMATS'] = self.format_dir + os.pathsep
+        cmd.append(tex_name)
+
+        pdf_path = os.path.join(work_dir, os.path.splitext(tex_name)[0] + '.pdf')
+        for run in range(1, _MAX_LATEX_RUNS + 1):
+            try:
+                with metrics.stage(PDF_ENGINE, os.path.join(work_dir, tex_name), pdf_path,
+                                   run=run, preamble_format=bool(fmt_name)):
+                    result = run_process(cmd, cwd=work_dir, env=env, timeout=DEFAULT_TIMEOUT, check=False)
+            except FileNotFoundError:
+                raise FileConversionError(f"{PDF_ENGINE}未安装，PDF转换需要系统上的LaTeX发行版")
+            if result.returncode != 0:
+                output = result.stdout.decode('utf-8', 'replace')
+                raise FileConversionError(f"{PDF_ENGINE}排版失败: {output[-2000:]}")
+            log_path = os.path.join(work_dir, os.path.splitext(tex_name)[0] + '.log')
+            with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+                if 'Rerun to get' not in f.read():
+                    return
+
+    def render_pdf(self, input_path: str, output_path: str, input_format: str):
+        """把 docx/html 渲染为 PDF"""
+        from core.utils import scratch_dir
+
+        with scratch_dir() as work_dir:
+            latex = self.to_latex(input_path, input_format, work_dir)
+            tex_name = 'document.tex'
+
+            fmt_name = None
+            split = self._split_preamble(latex)
+            if split is not None:
+                preamble, rest = split
+                fmt_name = self._format_for(preamble)
+                if fmt_name:
+                    with open(os.path.join(work_dir, 'document-fmt.tex'), 'w', encoding='utf-8') as f:
+                        f.write(preamble + '\\endofdump\n' + rest)
+
+            with open(os.path.join(work_dir, tex_name), 'w', encoding='utf-8') as f:
+                f.write(latex)
+
+            if fmt_name:
+                try:
+                    self._run_latex('document-fmt.tex', work_dir, fmt_name)
+                    shutil.move(os.path.join(work_dir, 'document-fmt.pdf'), output_path)
+                    return
+                except ConversionTimeoutError:
+                    raise
+                except FileConversionError:
+                    # 预编译格式不兼容时退回完整排版
+                    pass
+
+            self._run_latex(tex_name, work_dir)
+            shutil.move(os.path.join(work_dir, 'document.pdf'), output_path)
+
+    def shutdown(self):
+        while not self._servers.empty():
+            self._servers.get_nowait().stop()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_pandoc_backend() -> PandocBackend:
+    """获取进程内共享的 PDF 后端，pandoc server 数量由 FILECONVERT_PANDOC_SERVERS 配置"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = PandocBackend(server_count=int(os.environ.get('FILECONVERT_PANDOC_SERVERS', 1)))
+            atexit.register(_backend.shutdown)
+        return _backend
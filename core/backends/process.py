@@ -0,0 +1,414 @@
+# core/backends/process.py
+# 外部进程（soffice、pandoc、xelatex、tesseract、pdftoppm 等）的统一执行层：
+# 每个任务的墙钟时间上限、每个进程的 CPU 时间和内存上限（prlimit）、超时或取消后连同孙进程整组杀掉，
+# 以及对反复导致超时/崩溃的输入（毒输入）的重试与隔离
+import contextvars
+import hashlib
+import json
+import math
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Optional
+from core.exceptions import ConversionCancelledError, ConversionTimeoutError, QuarantinedInputError
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_TIMEOUT = 600.0
+# 进程组收到 SIGTERM 后等待退出的时间
+_TERMINATE_GRACE = 10
+# 等待外部进程期间检查取消事件的间隔，秒
+CANCEL_POLL_INTERVAL = 0.2
+
+
+@dataclass(frozen=True)
+class ProcessLimits:
+    """
+    :param timeout: 一个转换任务（可能包含多次外部进程调用）的墙钟时间上限，秒
+    :param cpu_timeout: 每个外部进程的 CPU 时间上限，秒（RLIMIT_CPU）
+    :param memory_mb: 每个外部进程的地址空间上限，MB（RLIMIT_AS）
+    :param retries: 外部进程被信号异常终止（崩溃）时的重试次数
+    :param quarantine_after: 同一输入超时/超限/崩溃这么多次后隔离，0 表示不隔离
+    """
+    timeout: Optional[float] = DEFAULT_TIMEOUT
+    cpu_timeout: Optional[float] = None
+    memory_mb: Optional[int] = None
+    retries: int = 1
+    quarantine_after: int = 2
+
+
+def _env_number(name: str, cast, default):
+    value = os.environ.get(name, '')
+    if not value:
+        return default
+    number = cast(value)
+    return number if number > 0 else None
+
+
+def default_limits() -> ProcessLimits:
+    """从环境变量读取默认限制（设为 0 表示不限制）"""
+    return ProcessLimits(
+        timeout=_env_number('FILECONVERT_PROCESS_TIMEOUT', float, DEFAULT_TIMEOUT),
+        cpu_timeout=_env_number('FILECONVERT_PROCESS_CPU_SECONDS', float, None),
+        memory_mb=_env_number('FILECONVERT_PROCESS_MEMORY_MB', int, None),
+        retries=int(os.environ.get('FILECONVERT_PROCESS_RETRIES', 1)),
+        quarantine_after=int(os.environ.get('FILECONVERT_QUARANTINE_AFTER', 2)),
+    )
+
+
+# 当前任务的 (限制, 截止时间, 输入文件)
+_job = contextvars.ContextVar('fileconvert_process_job', default=None)
+
+
+@contextmanager
+def job_limits(subject: str = None, timeout: float = None, cpu_timeout: float = None, memory_mb: int = None):
+    """
+    一个转换任务范围内生效的限制，未指定的项取环境变量配置；墙钟时间从进入时开始计算
+    :param subject: 任务的输入文件，外部进程超时/崩溃记在它名下
+    """
+    overrides = {'timeout': timeout, 'cpu_timeout': cpu_timeout, 'memory_mb': memory_mb}
+    limits = replace(default_limits(), **{key: value for key, value in overrides.items() if value is not None})
+    deadline = time.monotonic() + limits.timeout if limits.timeout else None
+    token = _job.set((limits, deadline, subject))
+    try:
+        yield limits
+    finally:
+        _job.reset(token)
+
+
+def current_limits() -> ProcessLimits:
+    job = _job.get()
+    return job[0] if job else default_limits()
+
+
+def job_snapshot() -> dict:
+    """当前任务剩余的限制，传给进程池里的工作进程后用 job_limits(**snapshot) 恢复"""
+    job = _job.get()
+    if job is None:
+        return {}
+    limits, deadline, subject = job
+    return {
+        'subject': subject,
+        'timeout': None if deadline is None else max(0.001, deadline - time.monotonic()),
+        'cpu_timeout': limits.cpu_timeout,
+        'memory_mb': limits.memory_mb,
+    }
+
+
+# 当前任务的取消事件（threading.Event）
+_cancel = contextvars.ContextVar('fileconvert_process_cancel', default=None)
+
+
+@contextmanager
+def cancel_scope(event):
+    """
+    范围内的外部进程在 event 置位后整组杀掉，调用方收到 ConversionCancelledError；
+    不报告进度的转换（soffice、xelatex 等）也能据此中途取消
+    """
+    token = _cancel.set(event)
+    try:
+        yield
+    finally:
+        _cancel.reset(token)
+
+
+def cancel_requested() -> bool:
+    event = _cancel.get()
+    return event is not None and event.is_set()
+
+
+def check_cancelled():
+    """:raises ConversionCancelledError: 当前任务已被取消"""
+    if cancel_requested():
+        raise ConversionCancelledError("转换已取消")
+
+
+def process_timeout(cap: float = None) -> Optional[float]:
+    """
+    下一个外部进程可用的墙钟时间：任务剩余时间与 cap 中较小的一个
+    :raises ConversionTimeoutError: 任务已经用完了时间
+    """
+    job = _job.get()
+    if job is None:
+        timeout = default_limits().timeout
+    elif job[1] is None:
+        timeout = None
+    else:
+        timeout = job[1] - time.monotonic()
+        if timeout <= 0:
+            raise ConversionTimeoutError(f"转换超时（{job[0].timeout:.0f}秒）")
+    if cap is not None:
+        timeout = cap if timeout is None else min(timeout, cap)
+    return timeout
+
+
+# ---- 启动与终止 ----
+
+def _apply_limits(process: subprocess.Popen, cpu_timeout: Optional[float], memory_mb: Optional[int]):
+    """
+    进程启动后用 prlimit 设置资源上限（Linux）；不在 fork 后的子进程里执行 Python 代码（preexec_fn），
+    调用方可能在多线程里启动进程，fork 出的子进程可能卡在别的线程持有的锁上
+    """
+    limits = []
+    if cpu_timeout:
+        seconds = int(math.ceil(cpu_timeout))
+        # 软上限发 SIGXCPU，硬上限再给几秒后 SIGKILL
+        limits.append((resource.RLIMIT_CPU, (seconds, seconds + 5)))
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        limits.append((resource.RLIMIT_AS, (limit, limit)))
+    for which, value in limits:
+        try:
+            resource.prlimit(process.pid, which, value)
+        except ProcessLookupError:
+            return
+
+
+def _limited_command(cmd, cpu_timeout: Optional[float], memory_mb: Optional[int]) -> list:
+    """
+    没有 prlimit 的 POSIX 系统（如 macOS）由 sh 先 ulimit 再 exec 目标程序
+    :raises FileNotFoundError: 程序不存在（与直接启动时一致）
+    """
+    if shutil.which(cmd[0]) is None:
+        raise FileNotFoundError(f"找不到程序: {cmd[0]}")
+    limits = []
+    if cpu_timeout:
+        seconds = int(math.ceil(cpu_timeout))
+        # 先降软上限，硬上限不能低于当前的软上限
+        limits += [f'ulimit -S -t {seconds}', f'ulimit -H -t {seconds + 5}']
+    if memory_mb:
+        limits.append(f'ulimit -v {memory_mb * 1024}')
+    return ['/bin/sh', '-c', ' && '.join(limits) + ' && exec "$@"', 'sh'] + list(cmd)
+
+
+def _popen(cmd, cpu_timeout: Optional[float] = None, memory_mb: Optional[int] = None,
+           **popen_kwargs) -> subprocess.Popen:
+    """新进程自成一个进程组，方便整组终止；POSIX 上按需设置资源上限"""
+    if os.name != 'posix':
+        return subprocess.Popen(cmd, creationflags=subprocess.CREATE_NEW_PROCESS_GROUP, **popen_kwargs)
+    limited = resource is not None and bool(cpu_timeout or memory_mb)
+    if limited and not hasattr(resource, 'prlimit'):
+        cmd = _limited_command(cmd, cpu_timeout, memory_mb)
+    process = subprocess.Popen(cmd, start_new_session=True, **popen_kwargs)
+    if limited and hasattr(resource, 'prlimit'):
+        _apply_limits(process, cpu_timeout, memory_mb)
+    return process
+
+
+def spawn_process(cmd, **popen_kwargs) -> subprocess.Popen:
+    """
+    启动长驻进程（soffice 实例、pandoc server）：独立进程组并限制内存
+    CPU 时间上限按进程累计，不适用于长驻进程
+    """
+    return _popen(cmd, memory_mb=current_limits().memory_mb, **popen_kwargs)
+
+
+def process_exited(process: subprocess.Popen) -> bool:
+    """
+    进程是否已经退出；不回收它（poll 会回收），僵尸进程继续占着 pid，
+    之后 kill_process_group 仍能安全地清理组里残留的孙进程
+    """
+    if process.returncode is not None:
+        return True
+    if os.name != 'posix' or not hasattr(os, 'waitid'):
+        return process.poll() is not None
+    try:
+        return os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return process.poll() is not None
+
+
+def kill_process_group(process: subprocess.Popen, grace: float = 0):
+    """
+    终止进程及其整个进程组（soffice.bin、xelatex 等孙进程）
+    只在进程还没被回收时向进程组发信号：回收后它的 pid（即进程组号）可能已被别的进程复用
+    :param grace: 先发 SIGTERM 等待这么多秒，仍未退出再 SIGKILL
+    """
+    if os.name != 'posix':
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        return
+    if process.returncode is None:
+        if grace and not process_exited(process):
+            _signal_group(process, signal.SIGTERM)
+            deadline = time.monotonic() + grace
+            while not process_exited(process) and time.monotonic() < deadline:
+                time.sleep(0.05)
+        # 进程本身已退出（尚未回收）时，组里可能还有残留的孙进程
+        _signal_group(process, signal.SIGKILL)
+    process.wait()
+
+
+def _signal_group(process: subprocess.Popen, sig: int):
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _communicate(process: subprocess.Popen, timeout: Optional[float]):
+    """等待进程结束并收集输出；有取消事件时分段等待，取消后抛出（由调用方整组杀掉进程）"""
+    if _cancel.get() is None:
+        return process.communicate(timeout=timeout)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        step = CANCEL_POLL_INTERVAL if deadline is None else \
+            max(0.0, min(CANCEL_POLL_INTERVAL, deadline - time.monotonic()))
+        try:
+            return process.communicate(timeout=step)
+        except subprocess.TimeoutExpired:
+            check_cancelled()
+            if deadline is not None and time.monotonic() >= deadline:
+                raise
+
+
+def run_process(cmd, name: str = None, cwd: str = None, env: dict = None, timeout: float = None,
+                check: bool = True, subject: str = None) -> subprocess.CompletedProcess:
+    """
+    运行一个外部进程并收集输出，受当前任务的限制约束；超时或取消时连同孙进程整组杀掉
+    被信号异常终止（崩溃、被 OOM killer 杀掉）时按 retries 重试
+    :param name: 错误信息里的程序名，缺省为 cmd[0] 的文件名
+    :param timeout: 本次调用的墙钟上限，与任务剩余时间取较小者
+    :param subject: 正在处理的输入文件，缺省为当前任务的输入；超时、超限和崩溃记在它名下，次数够多后隔离
+    :raises ConversionTimeoutError: 超过墙钟或 CPU 时间上限
+    :raises ConversionCancelledError: 任务被取消（见 cancel_scope）
+    :raises QuarantinedInputError: 输入已被隔离
+    :raises subprocess.CalledProcessError: check 为 True 且退出码非零
+    :raises FileNotFoundError: 程序不存在
+    """
+    job = _job.get()
+    limits = current_limits()
+    name = name or os.path.basename(cmd[0])
+    subject = subject or (job[2] if job else None)
+    if subject:
+        check_quarantine(subject, limits)
+
+    attempt = 0
+    while True:
+        check_cancelled()
+        wall_timeout = process_timeout(timeout)
+        process = _popen(cmd, limits.cpu_timeout, limits.memory_mb, cwd=cwd, env=env, stdin=subprocess.DEVNULL,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            stdout, stderr = _communicate(process, wall_timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_group(process)
+            process.communicate()
+            _strike(subject, f'{name}超时', limits)
+            raise ConversionTimeoutError(f"{name}超时（{wall_timeout:.0f}秒）")
+        except BaseException:
+            # 取消或中断：进程还没回收，连同孙进程整组杀掉
+            kill_process_group(process)
+            raise
+
+        returncode = process.returncode
+        if returncode < 0:
+            signum = -returncode
+            if limits.cpu_timeout and signum in (signal.SIGXCPU, signal.SIGKILL):
+                _strike(subject, f'{name}超过CPU时间上限', limits)
+                raise ConversionTimeoutError(f"{name}超过CPU时间上限（{limits.cpu_timeout:.0f}秒）")
+            _strike(subject, f'{name}被信号 {signum} 终止', limits)
+            if attempt < limits.retries:
+                attempt += 1
+                continue
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+        return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+
+
+# ---- 毒输入隔离 ----
+
+def quarantine_dir() -> str:
+    """FILECONVERT_QUARANTINE_DIR，默认在缓存目录下"""
+    configured = os.environ.get('FILECONVERT_QUARANTINE_DIR')
+    if configured:
+        return configured
+    from core.cache import default_cache_dir
+    return os.path.join(default_cache_dir(), 'quarantine')
+
+
+def _marker_path(subject: str) -> Optional[str]:
+    """按路径、大小和修改时间标识输入，文件被修改后自动解除隔离"""
+    try:
+        st = os.stat(subject)
+    except OSError:
+        return None
+    identity = f'{os.path.realpath(subject)}|{st.st_size}|{st.st_mtime_ns}'
+    return os.path.join(quarantine_dir(), hashlib.sha256(identity.encode('utf-8')).hexdigest()[:32] + '.json')
+
+
+def _read_marker(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def check_quarantine(subject: str, limits: ProcessLimits = None):
+    """:raises QuarantinedInputError: 输入的失败次数达到隔离阈值"""
+    limits = limits or current_limits()
+    if limits.quarantine_after <= 0:
+        return
+    path = _marker_path(subject)
+    if path is None:
+        return
+    marker = _read_marker(path)
+    if marker.get('strikes', 0) >= limits.quarantine_after:
+        raise QuarantinedInputError(
+            f"输入文件已被隔离（{marker['strikes']} 次超时或崩溃，最近一次: {marker.get('reason')}）: {subject}")
+
+
+def record_strike(subject: str, reason: str, limits: ProcessLimits = None) -> int:
+    """
+    记一次超时/超限/崩溃
+    :return: 该输入累计的次数
+    """
+    limits = limits or current_limits()
+    path = _marker_path(subject)
+    if path is None or limits.quarantine_after <= 0:
+        return 0
+    marker = _read_marker(path)
+    marker.update({
+        'input': os.path.abspath(subject),
+        'strikes': marker.get('strikes', 0) + 1,
+        'reason': reason,
+        'time': time.time(),
+    })
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(marker, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+    return marker['strikes']
+
+
+def _strike(subject: Optional[str], reason: str, limits: ProcessLimits):
+    if subject:
+        record_strike(subject, reason, limits)
+
+
+def clear_quarantine(subject: str = None):
+    """解除某个输入（缺省为全部输入）的隔离"""
+    if subject is not None:
+        path = _marker_path(subject)
+        if path and os.path.exists(path):
+            os.unlink(path)
+        return
+    directory = quarantine_dir()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                os.unlink(os.path.join(directory, name))
@@ -0,0 +1,269 @@
+# core/batch.py
+import glob
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Iterable, List, Optional
+from core import metrics
+from core.factory import ConverterFactory
+
+REPORT_NAME = 'conversion_report.jsonl'
+# 单独运行时仍使工作进程意外退出这么多次的任务记为失败，不再重试
+MAX_JOB_ATTEMPTS = 2
+
+
+@dataclass
+class BatchJob:
+    """批量转换中的单个任务"""
+    input_path: str
+    output_path: str
+    input_ext: str
+    output_ext: str
+    # 多目标转换时的全部输出路径（包括 output_path），见 ConverterFactory.convert_many
+    output_paths: Optional[List[str]] = None
+
+
+def _ext(path: str) -> str:
+    return Path(path).suffix[1:].lower()
+
+
+def _iter_sources(source: str):
+    """展开单个来源：目录递归遍历，通配符按 glob 展开，其余视为单个文件"""
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                yield path, os.path.relpath(path, source)
+    elif glob.has_magic(source):
+        base = source.split('*')[0].split('?')[0].split('[')[0]
+        base = base if os.path.isdir(base) else os.path.dirname(base)
+        for path in sorted(glob.glob(source, recursive=True)):
+            if os.path.isfile(path):
+                yield path, os.path.relpath(path, base or '.')
+    else:
+        yield source, os.path.basename(source)
+
+
+def _read_manifest(manifest_path: str):
+    """读取清单文件：每行一个输入路径，可用制表符跟一个输出路径，# 开头为注释"""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            parts = line.split('\t')
+            yield parts[0].strip(), (parts[1].strip() if len(parts) > 1 else None)
+
+
+def collect_jobs(sources: Iterable[str], output_dir: str, output_ext: str,
+                 manifest: Optional[str] = None) -> List[BatchJob]:
+    """
+    根据目录、通配符或清单文件收集转换任务
+    output_ext 可以是逗号分隔的多个格式，每个文件一个任务、一次生成全部格式（不支持的格式跳过）
+    不支持转换到任何目标格式的文件会被跳过
+    """
+    output_exts = [ext.strip().lower().lstrip('.') for ext in output_ext.split(',') if ext.strip()]
+    reachable = ConverterFactory.supported_conversions()
+
+    jobs = []
+
+    def _add(input_path, rel_path, output_path=None):
+        input_ext = _ext(input_path)
+        targets = [ext for ext in output_exts if ext in reachable.get(input_ext, [])]
+        if not targets:
+            return
+        base = Path(output_path) if output_path is not None else Path(output_dir, rel_path)
+        if output_path is None or len(output_exts) > 1:
+            # 清单给出的输出路径在多目标时只用作文件名主干
+            output_path = str(base.with_suffix(f'.{targets[0]}'))
+        if len(output_exts) > 1:
+            output_paths = [str(base.with_suffix(f'.{ext}')) for ext in targets]
+            jobs.append(BatchJob(input_path, output_path, input_ext, targets[0], output_paths))
+        else:
+            jobs.append(BatchJob(input_path, output_path, input_ext, targets[0]))
+
+    for source in sources:
+        for input_path, rel_path in _iter_sources(source):
+            _add(input_path, rel_path)
+
+    if manifest:
+        for input_path, output_path in _read_manifest(manifest):
+            _add(input_path, os.path.basename(input_path), output_path)
+
+    return jobs
+
+
+def _init_worker():
+    """每个工作进程只加载一次转换器"""
+    ConverterFactory.load_converters()
+
+
+def _init_pool_worker():
+    """进程池工作进程：阶段记录由父进程统一发往输出端，不使用从父进程继承的输出端"""
+    metrics.clear_sinks()
+    _init_worker()
+
+
+def _run_job(job: BatchJob, use_cache: bool = True, options: Optional[dict] = None,
+             collect_metrics: bool = False) -> dict:
+    """
+    执行单个任务，任何异常都记录到结果里而不是向上抛出
+    :param collect_metrics: 把阶段记录放进结果的 stages 字段带回父进程
+    """
+    started = time.perf_counter()
+    result = {
+        'input': job.input_path,
+        'output': job.output_path,
+        'status': 'ok',
+        'error': None,
+        'cache': None,
+    }
+    with (metrics.collect() if collect_metrics else nullcontext([])) as stages:
+        try:
+            if job.output_paths:
+                result.update(_run_fanout_job(job, use_cache, options or {}))
+            else:
+                result['cache'] = ConverterFactory.convert(
+                    job.input_path, job.output_path, job.input_ext, job.output_ext, use_cache=use_cache,
+                    **(options or {}))
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e)
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    if collect_metrics:
+        result['stages'] = stages
+    return result
+
+
+def _run_fanout_job(job: BatchJob, use_cache: bool, options: dict) -> dict:
+    """
+    多目标任务：各输出的结果放在 outputs 字段；有输出失败时整个任务记为失败
+    cache 为 hit（全部命中）/ miss（有未命中）/ None
+    """
+    outputs = ConverterFactory.convert_many(job.input_path, job.output_paths, job.input_ext,
+                                            use_cache=use_cache, **options)
+    failed = [f"{path}: {outcome['error']}" for path, outcome in outputs.items() if outcome['status'] == 'failed']
+    caches = {outcome['cache'] for outcome in outputs.values() if outcome['status'] == 'ok'}
+    return {
+        'outputs': outputs,
+        'status': 'failed' if failed else 'ok',
+        'error': '; '.join(failed) or None,
+        'cache': None if None in caches or not caches else ('hit' if caches == {'hit'} else 'miss'),
+    }
+
+
+def _failed_result(job: BatchJob, error: str) -> dict:
+    return {'input': job.input_path, 'output': job.output_path,
+            'status': 'failed', 'error': error, 'cache': None, 'seconds': None}
+
+
+def _run_pool(jobs: List[BatchJob], workers: int, run_job, record):
+    """
+    用进程池执行任务，同时在执行的任务不超过 workers 个
+    工作进程意外退出（段错误、被 OOM killer 杀掉、超出资源上限）会使整个进程池失效：
+    此时重建进程池，当时正在执行的任务逐个单独重跑以找出导致退出的任务，
+    单独运行仍然退出的任务重试 MAX_JOB_ATTEMPTS 次后记为失败，其余任务照常继续
+    """
+    pending = deque(enumerate(jobs))
+    suspects = deque()
+    crashes = {}
+    while pending or suspects:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker)
+        running = {}
+        broken = []
+        try:
+            while not broken:
+                if suspects:
+                    # 有嫌疑的任务单独运行，崩溃时可以确定是它
+                    if not running:
+                        item = suspects.popleft()
+                        running[executor.submit(run_job, item[1], collect_metrics=True)] = item
+                else:
+                    while pending and len(running) < workers:
+                        item = pending.popleft()
+                        running[executor.submit(run_job, item[1], collect_metrics=True)] = item
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = running.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        broken.append(item)
+                        continue
+                    except Exception as e:
+                        result = _failed_result(item[1], str(e))
+                    record(result)
+        finally:
+            executor.shutdown(wait=True)
+        # 进程池失效时还没取结果的任务：已经完成的照常记录，其余同样没有结果
+        for future, item in running.items():
+            try:
+                record(future.result())
+            except BrokenProcessPool:
+                broken.append(item)
+            except Exception as e:
+                record(_failed_result(item[1], str(e)))
+        if not broken:
+            continue
+
+        if len(broken) > 1:
+            suspects.extend(sorted(broken, key=lambda item: item[0]))
+            continue
+        index, job = broken[0]
+        crashes[index] = crashes.get(index, 0) + 1
+        if crashes[index] >= MAX_JOB_ATTEMPTS:
+            record(_failed_result(job, f"转换该文件时工作进程已意外退出 {crashes[index]} 次，不再尝试"))
+        else:
+            suspects.appendleft((index, job))
+
+
+def run_batch(jobs: List[BatchJob], workers: int = 1, report_path: Optional[str] = None,
+              on_result=None, use_cache: bool = True, options: Optional[dict] = None) -> dict:
+    """
+    用进程池并发执行批量任务，并逐条写入 JSON Lines 报告
+    :return: {'total': n, 'ok': n, 'failed': n, 'cache_hits': n, 'cache_misses': n, 'seconds': t}
+    """
+    summary = {'total': len(jobs), 'ok': 0, 'failed': 0, 'cache_hits': 0, 'cache_misses': 0}
+    run_job = partial(_run_job, use_cache=use_cache, options=options)
+    started = time.perf_counter()
+
+    report = None
+    if report_path:
+        Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+        report = open(report_path, 'w', encoding='utf-8')
+
+    def _record(result):
+        metrics.replay(result.pop('stages', []))
+        summary[result['status']] += 1
+        if result.get('cache') == 'hit':
+            summary['cache_hits'] += 1
+        elif result.get('cache') == 'miss':
+            summary['cache_misses'] += 1
+        if report:
+            report.write(json.dumps(result, ensure_ascii=False) + '\n')
+            report.flush()
+        if on_result:
+            on_result(result)
+
+    try:
+        if workers <= 1:
+            _init_worker()
+            for job in jobs:
+                _record(run_job(job))
+        else:
+            _run_pool(jobs, workers, run_job, _record)
+    finally:
+        if report:
+            report.close()
+
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    return summary
@@ -0,0 +1,302 @@
+# core/cache.py
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_MAX_SIZE_MB = 1024
+_CHUNK_SIZE = 1024 * 1024
+# 只影响执行方式、不影响输出内容的参数，不参与缓存键
+RUNTIME_OPTIONS = {'jobs', 'progress', 'timeout', 'cpu_timeout', 'memory_mb'}
+# 平时按进程内累计的大小判断是否需要淘汰；每存入这么多次重新扫描一次目录，计入其他进程写入的条目
+_RESCAN_EVERY = 100
+# 超过上限时淘汰到上限的这个比例，留出余量，避免缓存满了以后每次存入都要扫描
+_EVICT_TARGET = 0.9
+
+
+def default_cache_dir() -> str:
+    """缓存目录：FILECONVERT_CACHE_DIR，否则为系统用户缓存目录下的 fileconvert"""
+    configured = os.environ.get('FILECONVERT_CACHE_DIR')
+    if configured:
+        return configured
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') \
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'fileconvert')
+
+
+def file_digest(path: str) -> str:
+    """分块计算文件内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_enabled() -> bool:
+    """
+    FILECONVERT_CACHE_LINK=1 时命中和存入都用硬链接代替复制，省去大文件的复制
+    此时缓存条目设为只读，与之共享的输出文件也随之只读，防止原地修改输出污染缓存
+    """
+    return os.environ.get('FILECONVERT_CACHE_LINK', '') not in ('', '0')
+
+
+def _place(src: str, dst: str, link: bool):
+    """复制文件；link 为真时优先硬链接，跨文件系统等情况退化为复制"""
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    if link:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
+
+def _place_tree(src: str, dst: str, link: bool):
+    """按目录结构逐个复制/硬链接文件"""
+    for root, _, files in os.walk(src):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            _place(os.path.join(root, name), os.path.join(target_root, name), link)
+
+
+def _make_read_only(path: str):
+    """把缓存条目（文件或目录树里的文件）设为只读"""
+    paths = [path] if os.path.isfile(path) else \
+        [os.path.join(root, name) for root, _, files in os.walk(path) for name in files]
+    for file_path in paths:
+        os.chmod(file_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def _force_remove(func, path, _):
+    """rmtree 的出错回调：只读文件（Windows 上不能直接删除）先恢复可写再删，其他错误忽略"""
+    try:
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+        func(path)
+    except OSError:
+        pass
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except PermissionError:
+        _force_remove(os.unlink, path, None)
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+def _entry_size(path: str) -> int:
+    """缓存条目（输出文件及其 .d 附属目录）的大小，条目不存在时为 0"""
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+    if os.path.isdir(path + '.d'):
+        size += _tree_size(path + '.d')
+    return size
+
+
+class ConversionCache:
+    """
+    以内容寻址的转换结果缓存
+    键 = 输入内容哈希 + 转换器类 + 输出格式 + 转换参数，按总大小做 LRU 淘汰
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_size: Optional[int] = None,
+                 link: Optional[bool] = None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        if max_size is None:
+            max_size = int(os.environ.get('FILECONVERT_CACHE_SIZE_MB', DEFAULT_MAX_SIZE_MB)) * 1024 * 1024
+        self.max_size = max_size
+        # 是否用硬链接代替复制，见 _link_enabled
+        self.link = _link_enabled() if link is None else link
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # 本进程估计的缓存总大小，None 表示还没扫描过目录
+        self._size = None
+        self._stores = 0
+
+    @staticmethod
+    def make_key(input_path: str, converters, output_ext: str, options: Optional[dict] = None,
+                 digest: Optional[str] = None) -> str:
+        """
+        计算缓存键；converters 为转换器类或多步转换路径上的转换器类列表
+        :param digest: 已经算好的输入文件 file_digest，同一输入计算多个键时避免重复读取
+        """
+        if not isinstance(converters, (list, tuple)):
+            converters = [converters]
+        identity = {
+            'input': digest or file_digest(input_path),
+            'converter': [f'{c.__module__}.{c.__qualname__}@{getattr(c, "version", "")}' for c in converters],
+            'output_ext': output_ext,
+            'options': {k: v for k, v in (options or {}).items() if k not in RUNTIME_OPTIONS},
+        }
+        encoded = json.dumps(identity, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _object_path(self, key: str) -> str:
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def fetch(self, key: str, output_path: str, side_dirs=()) -> bool:
+        """
+        命中时把缓存结果复制（或硬链接）到输出路径并刷新其 LRU 时间
+        :param side_dirs: 输出文件旁的附属目录（见 BaseConverter.side_outputs），一并恢复
+        """
+        path = self._object_path(key)
+        try:
+            for side_dir in side_dirs:
+                if not os.path.isdir(os.path.join(path + '.d', os.path.basename(side_dir))):
+                    raise FileNotFoundError(side_dir)
+            Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+            _place(path, output_path, self.link)
+            for side_dir in side_dirs:
+                shutil.rmtree(side_dir, onerror=_force_remove)
+                _place_tree(os.path.join(path + '.d', os.path.basename(side_dir)), side_dir, self.link)
+            # LRU 按访问时间排序；只改访问时间，硬链接时不会改动输出文件的修改时间
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key: str, output_path: str, side_dirs=()):
+        """把转换结果放入缓存，写入过程先落到临时文件再原子替换；附属目录先于输出文件写入"""
+        path = self._object_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        replaced_size = _entry_size(path)
+        side_dirs = [side_dir for side_dir in side_dirs if os.path.isdir(side_dir)]
+        if side_dirs:
+            temp_dir = tempfile.mkdtemp(dir=os.path.dirname(path), prefix='.tmp-')
+            try:
+                for side_dir in side_dirs:
+                    _place_tree(side_dir, os.path.join(temp_dir, os.path.basename(side_dir)), self.link)
+                if self.link:
+                    _make_read_only(temp_dir)
+                shutil.rmtree(path + '.d', onerror=_force_remove)
+                os.replace(temp_dir, path + '.d')
+            finally:
+                shutil.rmtree(temp_dir, onerror=_force_remove)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        os.close(fd)
+        try:
+            _place(output_path, temp_path, self.link)
+            if self.link:
+                _make_read_only(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                _unlink(temp_path)
+        self._account(_entry_size(path) - replaced_size)
+
+    def _account(self, delta: int):
+        """累计存入的大小，超过上限或到了定期重扫的次数时才扫描目录淘汰"""
+        with self._lock:
+            self._stores += 1
+            if self._size is not None and self._stores % _RESCAN_EVERY:
+                self._size += delta
+                if self._size <= self.max_size:
+                    return
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.objects_dir):
+            return entries
+        for bucket in os.scandir(self.objects_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.startswith('.tmp-') or entry.name.endswith('.d'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                size = st.st_size
+                if os.path.isdir(entry.path + '.d'):
+                    size += _tree_size(entry.path + '.d')
+                entries.append((st.st_atime, size, entry.path))
+        return entries
+
+    def evict(self):
+        """总大小超过上限时，从最久未使用的条目开始删除，直到降到上限的 _EVICT_TARGET 以下"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_size:
+            with self._lock:
+                self._size = total
+            return
+        target = self.max_size * _EVICT_TARGET
+        for _, size, path in sorted(entries):
+            try:
+                _unlink(path)
+            except FileNotFoundError:
+                continue
+            shutil.rmtree(path + '.d', onerror=_force_remove)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+            if total <= target:
+                break
+        with self._lock:
+            self._size = total
+
+    def clear(self):
+        shutil.rmtree(self.objects_dir, onerror=_force_remove)
+        with self._lock:
+            self._size = 0
+
+    def stats(self) -> dict:
+        """本进程的命中统计以及缓存目录的当前占用"""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'size': sum(size for _, size, _ in entries),
+            'max_size': self.max_size,
+            'cache_dir': self.cache_dir,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_conversion_cache() -> Optional[ConversionCache]:
+    """获取进程内共享的缓存；设置 FILECONVERT_NO_CACHE=1 时返回 None"""
+    global _cache
+    if os.environ.get('FILECONVERT_NO_CACHE', '') not in ('', '0'):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ConversionCache()
+        return _cache
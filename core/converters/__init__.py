@@ -1,8 +1,61 @@
-# 确保所有转换器被导入，这样它们会被自动注册到工厂
-from .docx_converter import DocxConverter
-from .pdf_converter import PdfConverter
-from .html_converter import HtmlConverter
-from .doc_converter import DocConverter
-
-# 方便外部导入
-__all__ = ['DocxConverter', 'PdfConverter', 'HtmlConverter', 'DocConverter']
\ No newline at end of file
+# 转换器清单：只声明支持的格式和代价，转换器模块在真正执行转换时才导入，
+# 它们依赖的 python-docx、pdf2docx、pypandoc、html2text 等也在各自方法里按需导入
+import importlib
+
+# {'模块:类名': {输入格式: {输出格式: 声明的代价 或 (声明的代价, 质量档位)}}}
+# 代价约等于典型文档的耗时秒数，用于规划多步转换路径、在同一转换对的多个引擎间选择，有实测耗时后以实测为准
+# 质量档位见 core.registry.QUALITY_TIERS，缺省为 standard
+CONVERTER_MANIFEST = {
+    'core.converters.docx_converter:DocxConverter': {
+        # 生成PDF需要 pandoc + xelatex，远比直接读取文本慢
+        'docx': {'txt': 0.5, 'html': 0.5, 'pdf': 5.0},
+    },
+    'core.converters.pdf_converter:PdfConverter': {
+        # 转DOCX：文本型PDF用 pdf2docx 直接转换，扫描件走OCR（按较慢的OCR估计）
+        # 转TXT：pdfplumber 按字符位置重建版面，质量最好也最慢，是默认引擎
+        'pdf': {'docx': 10.0, 'txt': 1.0},
+    },
+    # 快速引擎只在 --quality draft 时使用，默认输出不变；看起来是乱码的页交给 pdfplumber 重新提取，
+    # 代价按大多数页不需要重新提取估计
+    'core.converters.pdf_text_converter:PdfMinerTextConverter': {
+        # 行内合并正常，但不按阅读顺序重排文本框，多栏版面可能交错
+        'pdf': {'txt': (0.35, 'draft')},
+    },
+    'core.converters.pdf_text_converter:PyPdf2TextConverter': {
+        # 不做版面分析，段落和表格可能错乱，适合建立搜索索引
+        'pdf': {'txt': (0.1, 'draft')},
+    },
+    'core.converters.html_converter:HtmlConverter': {
+        'html': {'txt': 0.5, 'pdf': 5.0},
+    },
+    'core.converters.doc_converter:DocConverter': {
+        # html、txt 等格式由工厂经 docx 规划多步转换
+        'doc': {'docx': 3.0, 'pdf': 3.0},
+        # DOCX转PDF的另一个引擎：版式还原比 pandoc 好；声明代价高于 pandoc，实测更快时才会优先使用
+        'docx': {'pdf': (6.0, 'high')},
+    },
+}
+
+
+def register_manifest():
+    """把清单里的转换注册为延迟引用"""
+    from core.registry import DEFAULT_QUALITY, register_converter
+
+    for reference, formats in CONVERTER_MANIFEST.items():
+        for input_ext, outputs in formats.items():
+            for output_ext, declared in outputs.items():
+                cost, tier = declared if isinstance(declared, tuple) else (declared, DEFAULT_QUALITY)
+                register_converter(input_ext, output_ext, reference, cost=cost, tier=tier)
+
+
+def __getattr__(name):
+    # 方便外部导入，例如 from core.converters import DocxConverter
+    for reference in CONVERTER_MANIFEST:
+        module_name, class_name = reference.split(':')
+        if class_name == name:
+            return getattr(importlib.import_module(module_name), class_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['DocxConverter', 'PdfConverter', 'HtmlConverter', 'DocConverter', 'PdfMinerTextConverter',
+           'PyPdf2TextConverter']
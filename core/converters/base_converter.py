@@ -1,11 +1,24 @@
+import os
+import shutil
 from abc import ABC, abstractmethod
 from pathlib import Path
-from core.exceptions import FileConversionError
+from core.exceptions import (
+    FileConversionError, ConversionCancelledError, ConversionTimeoutError, QuarantinedInputError
+)
+from core import metrics
+
+# 落盘/取回数据时每次复制的字节数
+_STREAM_CHUNK_SIZE = 1024 * 1024
+# 转换器不包装成普通转换失败、原样向上抛出的异常：取消、超时和隔离都不是引擎本身的问题，工厂不据此换用备选引擎
+PASSTHROUGH_ERRORS = (ConversionCancelledError, ConversionTimeoutError, QuarantinedInputError)
 
 
 class BaseConverter(ABC):
     """所有转换器的抽象基类"""
 
+    # 转换器的输出格式/内容有变化时递增，同步模式和缓存据此判断旧输出是否失效
+    version = '1'
+
     @classmethod
     @abstractmethod
     def supported_formats(cls) -> dict:
@@ -21,15 +34,92 @@ class BaseConverter(ABC):
         formats = cls.supported_formats()
         return input_ext in formats and output_ext in formats[input_ext]
 
+    @classmethod
+    def is_available(cls) -> bool:
+        """依赖的可选模块是否已安装；同一转换对有多个引擎时，不可用的引擎不参与选择"""
+        return True
+
+    @classmethod
+    def conversion_cost(cls, input_ext: str, output_ext: str) -> float:
+        """
+        声明的转换代价（约等于典型文档的耗时秒数），用于规划多步转换路径
+        有实测耗时后以实测为准
+        """
+        return 1.0
+
+    @classmethod
+    def side_outputs(cls, output_path: str, output_ext: str) -> list:
+        """
+        转换时在输出文件旁额外生成的目录（例如 HTML 引用的图片目录），缓存会连同输出文件一起保存和恢复
+        :return: [目录路径, ...]
+        """
+        return []
+
     @classmethod
     @abstractmethod
-    def convert(cls, input_path: str, output_path: str, input_ext: str, output_ext: str):
+    def convert(cls, input_path: str, output_path: str, input_ext: str, output_ext: str, **options):
         """
         执行文件转换
+        :param options: 转换参数（各转换器忽略自己不认识的参数），
+                        其中 progress 为可选的进度回调 progress(done, total)
         :raises: FileConversionError 如果转换失败
         """
         pass
 
+    @classmethod
+    def shared_outputs(cls, input_ext: str) -> set:
+        """
+        同一输入能在一次 convert_many 调用里共用解析结果（或同一个外部进程）生成的输出格式
+        一个输入转多个格式时，工厂把这些步骤合并为一次调用
+        """
+        return set()
+
+    @classmethod
+    def convert_many(cls, input_path: str, output_paths: dict, input_ext: str, **options):
+        """
+        一次生成多个输出格式，参数同 convert
+        :param output_paths: {output_ext: output_path}
+        默认实现逐个调用 convert；shared_outputs 非空的转换器覆盖此方法
+        """
+        for output_ext, output_path in output_paths.items():
+            cls.convert(input_path, output_path, input_ext, output_ext, **options)
+
+    @classmethod
+    def convert_stream(cls, src, dst, input_ext: str, output_ext: str, **options):
+        """
+        在二进制文件对象之间转换，参数同 convert
+        默认实现把输入落到临时目录（优先 tmpfs）再调用 convert，然后把结果复制到 dst；
+        能直接读写内存的转换器覆盖此方法，对不能处理的格式再调用这里
+        """
+        from core.utils import scratch_dir
+        with scratch_dir() as work_dir:
+            input_path = os.path.join(work_dir, f'input.{input_ext}')
+            output_path = os.path.join(work_dir, f'output.{output_ext}')
+            with cls._stage('spill', output_path=input_path):
+                with open(input_path, 'wb') as f:
+                    shutil.copyfileobj(src, f, _STREAM_CHUNK_SIZE)
+            cls.convert(input_path, output_path, input_ext, output_ext, **options)
+            with cls._stage('unspill', input_path=output_path):
+                with open(output_path, 'rb') as f:
+                    shutil.copyfileobj(f, dst, _STREAM_CHUNK_SIZE)
+
+    @staticmethod
+    def _report_progress(progress, done: int, total: int):
+        """
+        调用进度回调 progress(done, total)，例如 PDF 的第 done 页 / 共 total 页
+        回调可以抛出 ConversionCancelledError 来取消转换
+        """
+        if progress:
+            progress(done, total)
+
+    @classmethod
+    def _stage(cls, name: str, input_path: str = None, output_path: str = None, **attrs):
+        """
+        统计转换中的一个阶段（读取、外部进程、写出等），记录发往 core.metrics 的输出端
+        用法: with cls._stage('read', input_path): ...
+        """
+        return metrics.stage(name, input_path, output_path, converter=cls.__name__, **attrs)
+
     @classmethod
     def _ensure_output_dir_exists(cls, output_path: str):
         """确保输出目录存在"""
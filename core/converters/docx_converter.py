@@ -1,10 +1,9 @@
 # core/converters/docx_converter.py
-from docx import Document
+import os
 from pathlib import Path
-from core.converters.base_converter import BaseConverter
+from core.converters.base_converter import BaseConverter, PASSTHROUGH_ERRORS
 from core.exceptions import FileReadError, FileWriteError, UnsupportedFormatError, FileConversionError
-from core.registry import register_converter
-import pypandoc
+
 class DocxConverter(BaseConverter):
     """处理DOCX文件的转换"""
 
@@ -16,7 +15,14 @@ class DocxConverter(BaseConverter):
         }
 
     @classmethod
-    def convert(cls, input_path: str, output_path: str, input_ext: str, output_ext: str):
+    def side_outputs(cls, output_path: str, output_ext: str) -> list:
+        if output_ext == 'html':
+            from core.docx_html import assets_dir_for
+            return [assets_dir_for(output_path)]
+        return []
+
+    @classmethod
+    def convert(cls, input_path: str, output_path: str, input_ext: str, output_ext: str, **options):
         try:
             cls._ensure_output_dir_exists(output_path)
 
@@ -25,59 +31,216 @@ class DocxConverter(BaseConverter):
             elif output_ext == 'html':
                 cls._convert_to_html(input_path, output_path)
             elif output_ext == 'pdf':  # 添加对 pdf 转换的处理
-                cls._convert_to_pdf(input_path, output_path)
+                cls._convert_to_pdf(input_path, output_path, split=options.get('split_pdf', False),
+                                    jobs=options.get('jobs', 1))
             else:
                 raise UnsupportedFormatError(f"不支持将 docx 转换为 {output_ext}")
+        except PASSTHROUGH_ERRORS:
+            raise
+        except Exception as e:
+            raise FileConversionError(f"DOCX转换失败: {str(e)}")
+
+    @classmethod
+    def shared_outputs(cls, input_ext: str) -> set:
+        return {'txt', 'html'}
+
+    @classmethod
+    def convert_many(cls, input_path: str, output_paths: dict, input_ext: str, **options):
+        """txt 和 html 共用一次 document.xml 解析结果；其它格式逐个转换"""
+        shared = {ext: path for ext, path in output_paths.items() if ext in ('txt', 'html')}
+        rest = {ext: path for ext, path in output_paths.items() if ext not in shared}
+        if len(shared) > 1:
+            from core.docx_reader import STREAM_ERRORS
+            try:
+                for output_path in shared.values():
+                    cls._ensure_output_dir_exists(output_path)
+                cls._write_shared(input_path, shared['txt'], shared['html'])
+                shared = {}
+            except STREAM_ERRORS:
+                # 文件结构异常，逐个转换（各自退回 python-docx）
+                pass
+            except PASSTHROUGH_ERRORS:
+                raise
+            except Exception as e:
+                raise FileConversionError(f"DOCX转换失败: {str(e)}")
+        super().convert_many(input_path, dict(shared, **rest), input_ext, **options)
+
+    @classmethod
+    def _write_shared(cls, input_path: str, txt_path: str, html_path: str):
+        """解析一次 document.xml，把内容同时写成 TXT 和 HTML"""
+        import zipfile
+        from core.docx_html import DocxHtmlWriter
+        from core.docx_reader import iter_blocks, write_text
+
+        with zipfile.ZipFile(input_path) as archive, \
+                open(txt_path, 'w', encoding='utf-8') as txt_out, \
+                open(html_path, 'w', encoding='utf-8') as html_out, \
+                cls._stage('write_shared', input_path, html_path) as record:
+            writer = DocxHtmlWriter(html_out, html_path, archive)
+            record['blocks'] = 0
+
+            def blocks():
+                # 读一遍内容流，每项先写入 HTML 再交给 write_text，不在内存里保留整篇文档
+                for kind, value in iter_blocks(archive):
+                    record['blocks'] += 1
+                    writer.write_block(kind, value)
+                    yield kind, value
+
+            writer.write_header()
+            write_text(blocks(), txt_out)
+            writer.write_footer()
+            record['images_written'] = writer.images_written
+            record['images_deduplicated'] = writer.images_deduplicated
+
+    @classmethod
+    def convert_stream(cls, src, dst, input_ext: str, output_ext: str, **options):
+        """txt 和 html 直接在内存里读写（html 的图片以 data URI 内嵌），pdf 需要 pandoc，落盘处理"""
+        if output_ext not in ('txt', 'html'):
+            return super().convert_stream(src, dst, input_ext, output_ext, **options)
+        try:
+            from core.utils import ensure_seekable, text_writer
+            src = ensure_seekable(src)
+            with text_writer(dst) as out:
+                if output_ext == 'txt':
+                    cls._write_txt(src, out)
+                else:
+                    cls._write_html(src, out)
+        except PASSTHROUGH_ERRORS:
+            raise
         except Exception as e:
             raise FileConversionError(f"DOCX转换失败: {str(e)}")
 
     @classmethod
     def _convert_to_txt(cls, input_path: str, output_path: str):
+        with open(output_path, 'w', encoding='utf-8') as f:
+            cls._write_txt(input_path, f, output_path)
+
+    @classmethod
+    def _write_txt(cls, source, out, output_path: str = None):
+        """
+        流式读取 document.xml 并逐段写出；文件结构异常时退回 python-docx
+        :param source: 文件路径，或支持 seek 的二进制文件对象
+        """
+        from core.docx_reader import STREAM_ERRORS, iter_docx_blocks, write_text
+        input_path = source if isinstance(source, str) else None
+        start = out.tell() if out.seekable() else None
         try:
-            doc = Document(input_path)
-            with open(output_path, 'w', encoding='utf-8') as f:
+            with cls._stage('stream', input_path, output_path):
+                write_text(iter_docx_blocks(source), out)
+            return
+        except STREAM_ERRORS:
+            if start is None:
+                raise
+            # 丢弃已写出的部分，重新生成
+            out.seek(start)
+            out.truncate()
+
+        try:
+            from docx import Document
+            if not isinstance(source, str):
+                source.seek(0)
+            with cls._stage('read', input_path):
+                doc = Document(source)
+            with cls._stage('write', output_path=output_path):
                 for para in doc.paragraphs:
-                    f.write(para.text + '\n')
+                    out.write(para.text + '\n')
         except Exception as e:
             raise FileReadError(f"读取DOCX文件失败: {str(e)}")
 
     @classmethod
     def _convert_to_html(cls, input_path: str, output_path: str):
+        with open(output_path, 'w', encoding='utf-8') as f:
+            cls._write_html(input_path, f, output_path)
+
+    @classmethod
+    def _write_html(cls, source, out, output_path: str = None):
+        """
+        单遍生成 HTML（标题、列表、表格、图片）；文件结构异常时退回 python-docx
+        :param output_path: 图片写到它旁边的 *_files 目录；为 None 时（内存流）图片以 data URI 内嵌
+        """
+        from core.docx_html import DocxHtmlWriter, write_docx_html
+        from core.docx_reader import STREAM_ERRORS
+        input_path = source if isinstance(source, str) else None
+        start = out.tell() if out.seekable() else None
         try:
-            doc = Document(input_path)
-            html_content = ['<!DOCTYPE html><html><head><meta charset="UTF-8"></head><body>']
+            with cls._stage('stream', input_path, output_path) as record:
+                writer = write_docx_html(source, out, output_path)
+                record['images_written'] = writer.images_written
+                record['images_deduplicated'] = writer.images_deduplicated
+            return
+        except STREAM_ERRORS:
+            if start is None:
+                raise
+            out.seek(start)
+            out.truncate()
 
-            for para in doc.paragraphs:
-                html_content.append(f'<p>{para.text}</p>')
+        try:
+            from docx import Document
+            from core.docx_reader import Paragraph
+            if not isinstance(source, str):
+                source.seek(0)
+            with cls._stage('read', input_path):
+                doc = Document(source)
 
-            html_content.append('</body></html>')
+            def _blocks():
+                for para in doc.paragraphs:
+                    paragraph = Paragraph()
+                    paragraph.add_text(para.text)
+                    paragraph.style = para.style.name if para.style is not None else None
+                    yield 'paragraph', paragraph
 
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(html_content))
+            with cls._stage('write', output_path=output_path):
+                DocxHtmlWriter(out, output_path).write(_blocks())
         except Exception as e:
             raise FileWriteError(f"写入HTML文件失败: {str(e)}")
 
     @classmethod
-    def _convert_to_pdf(cls, input_path: str, output_path: str):
+    def _convert_to_pdf(cls, input_path: str, output_path: str, split: bool = False, jobs: int = 1):
+        """
+        :param split: 在分节符/分页符处切块，用 jobs 个线程并行排版后按顺序合并（块边界处会另起一页）
+        """
         try:
-            # 使用xelatex引擎并添加中文支持
-            pypandoc.convert_file(
-                input_path,
-                'pdf',
-                outputfile=output_path,
-                format='docx',
-                extra_args=[
-                    '--pdf-engine=xelatex',  # 使用xelatex引擎支持中文
-                    '-V', 'mainfont=SimHei',  # 指定中文字体
-                    '-V', 'geometry:a4paper',  # 设置纸张大小
-                ]
-            )
-        except ImportError:
-            raise FileConversionError("PDF转换需要安装pypandoc和系统上的LaTeX发行版")
-        except Exception as e:
+            # 使用xelatex引擎并添加中文支持（字体、纸张等固定参数见 core/backends/pandoc.py）
+            from core.backends.pandoc import get_pandoc_backend
+            if split:
+                from core.utils import scratch_dir
+                from core.docx_split import split_docx
+                with scratch_dir() as work_dir:
+                    with cls._stage('split', input_path) as record:
+                        chunks = split_docx(input_path, work_dir)
+                        record['chunks'] = len(chunks)
+                    if len(chunks) > 1:
+                        cls._render_chunks(chunks, output_path, work_dir, jobs)
+                        return
+            get_pandoc_backend().render_pdf(input_path, output_path, 'docx')
+        except PASSTHROUGH_ERRORS:
+            raise
+        except FileConversionError as e:
             raise FileWriteError(f"生成PDF失败: {str(e)}")
 
-# 注册转换器
-for input_ext, output_exts in DocxConverter.supported_formats().items():
-    for output_ext in output_exts:
-        register_converter(input_ext, output_ext, DocxConverter)
\ No newline at end of file
+    @classmethod
+    def _render_chunks(cls, chunks: list, output_path: str, work_dir: str, jobs: int):
+        """并行排版各块（pandoc/xelatex 是子进程，线程即可并行），再用 PyPDF2 按顺序合并并保留书签"""
+        import contextvars
+        from concurrent.futures import ThreadPoolExecutor
+        from core.backends.pandoc import get_pandoc_backend
+
+        backend = get_pandoc_backend()
+        pdf_paths = [os.path.join(work_dir, f'chunk{index:04d}.pdf') for index in range(len(chunks))]
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs or 1, len(chunks)))) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, backend.render_pdf, chunk, pdf_path, 'docx')
+                for chunk, pdf_path in zip(chunks, pdf_paths)
+            ]
+            for future in futures:
+                future.result()
+
+        from PyPDF2 import PdfMerger
+        with cls._stage('merge', output_path=output_path, chunks=len(chunks)):
+            merger = PdfMerger()
+            try:
+                for pdf_path in pdf_paths:
+                    merger.append(pdf_path, import_outline=True)
+                merger.write(output_path)
+            finally:
+                merger.close()
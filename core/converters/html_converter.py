@@ -1,8 +1,6 @@
 # core/converters/html_converter.py
-import html2text
-from core.converters.base_converter import BaseConverter
+from core.converters.base_converter import BaseConverter, PASSTHROUGH_ERRORS
 from core.exceptions import FileReadError, FileWriteError, UnsupportedFormatError, FileConversionError
-from core.registry import register_converter  # 导入新的注册函数
 
 class HtmlConverter(BaseConverter):
     """处理HTML文件的转换"""
@@ -15,7 +13,7 @@ class HtmlConverter(BaseConverter):
         }
 
     @classmethod
-    def convert(cls, input_path: str, output_path: str, input_ext: str, output_ext: str):
+    def convert(cls, input_path: str, output_path: str, input_ext: str, output_ext: str, **options):
         try:
             cls._ensure_output_dir_exists(output_path)
 
@@ -25,38 +23,43 @@ class HtmlConverter(BaseConverter):
                 cls._convert_to_pdf(input_path, output_path)
             else:
                 raise UnsupportedFormatError(f"不支持将 html 转换为 {output_ext}")
+        except PASSTHROUGH_ERRORS:
+            raise
         except Exception as e:
             raise FileConversionError(f"HTML转换失败: {str(e)}")
 
     @classmethod
-    def _convert_to_txt(cls, input_path: str, output_path: str):
+    def convert_stream(cls, src, dst, input_ext: str, output_ext: str, **options):
+        """txt 直接在内存里转换，pdf 需要 pandoc，落盘处理"""
+        if output_ext != 'txt':
+            return super().convert_stream(src, dst, input_ext, output_ext, **options)
         try:
-            with open(input_path, 'r', encoding='utf-8') as f:
-                html_content = f.read()
-
-            text = html2text.html2text(html_content)
+            from core.html_text import html_stream_to_text
+            from core.utils import text_writer
+            with cls._stage('html2text') as record, text_writer(dst) as out:
+                record['encoding'] = html_stream_to_text(src, out)
+        except PASSTHROUGH_ERRORS:
+            raise
+        except Exception as e:
+            raise FileConversionError(f"HTML转换失败: {str(e)}")
 
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(text)
+    @classmethod
+    def _convert_to_txt(cls, input_path: str, output_path: str):
+        """分块读取、增量解码并写出，编码取自 BOM 或 meta charset"""
+        try:
+            from core.html_text import html_to_text
+            with cls._stage('html2text', input_path, output_path) as record:
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    record['encoding'] = html_to_text(input_path, f)
         except Exception as e:
             raise FileReadError(f"读取HTML文件失败: {str(e)}")
 
     @classmethod
     def _convert_to_pdf(cls, input_path: str, output_path: str):
         try:
-            import pypandoc
-            pypandoc.convert_file(
-                input_path,
-                'pdf',
-                outputfile=output_path,
-                format='html'
-            )
-        except ImportError:
-            raise FileConversionError("PDF转换需要安装pypandoc和系统上的pandoc")
-        except Exception as e:
+            from core.backends.pandoc import get_pandoc_backend
+            get_pandoc_backend().render_pdf(input_path, output_path, 'html')
+        except PASSTHROUGH_ERRORS:
+            raise
+        except FileConversionError as e:
             raise FileWriteError(f"生成PDF失败: {str(e)}")
-
-# 使用新的注册机制
-for input_ext, output_exts in HtmlConverter.supported_formats().items():
-    for output_ext in output_exts:
-        register_converter(input_ext, output_ext, HtmlConverter)
\ No newline at end of file
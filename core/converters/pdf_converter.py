@@ -1,8 +1,16 @@
 # core/converters/pdf_converter.py
-from pdf2docx import Converter
-from core.converters.base_converter import BaseConverter
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from core.converters.base_converter import BaseConverter, PASSTHROUGH_ERRORS
 from core.exceptions import FileReadError, FileWriteError, UnsupportedFormatError, FileConversionError
-from core.registry import register_converter
+from core.backends.ocr import DEFAULT_OCR_DPI, DEFAULT_OCR_LANG, OCR_UNAVAILABLE_ERRORS, record_ocr_skipped
+from core.utils import parse_page_ranges
+
+# 每个进程至少分到的页数，页数太少时多进程得不偿失
+_MIN_PAGES_PER_WORKER = 16
+# 是否使用OCR：auto 按页面索引只识别扫描页，always 全部识别，never 从不识别
+OCR_MODES = ('auto', 'always', 'never')
 
 class PdfConverter(BaseConverter):
     """处理PDF文件的转换"""
@@ -15,67 +23,324 @@ class PdfConverter(BaseConverter):
         }
 
     @classmethod
-    def convert(cls, input_path: str, output_path: str, input_ext: str, output_ext: str):
+    def convert(cls, input_path: str, output_path: str, input_ext: str, output_ext: str, **options):
         try:
             cls._ensure_output_dir_exists(output_path)
 
             if output_ext == 'docx':
-                cls._convert_to_docx(input_path, output_path)
+                cls._convert_to_docx(
+                    input_path, output_path,
+                    jobs=options.get('jobs', 1),
+                    ocr_dpi=options.get('ocr_dpi', DEFAULT_OCR_DPI),
+                    ocr_lang=options.get('ocr_lang', DEFAULT_OCR_LANG),
+                    progress=options.get('progress'),
+                    ocr=options.get('ocr', 'auto'),
+                    pages=options.get('pages'),
+                )
             elif output_ext == 'txt':
-                cls._convert_to_txt(input_path, output_path)
+                cls._convert_to_txt(input_path, output_path, jobs=options.get('jobs', 1),
+                                    progress=options.get('progress'), ocr=options.get('ocr', 'auto'),
+                                    ocr_dpi=options.get('ocr_dpi', DEFAULT_OCR_DPI),
+                                    ocr_lang=options.get('ocr_lang', DEFAULT_OCR_LANG))
             else:
                 raise UnsupportedFormatError(f"不支持将 pdf 转换为 {output_ext}")
+        except PASSTHROUGH_ERRORS:
+            raise
         except Exception as e:
             raise FileConversionError(f"PDF转换失败: {str(e)}")
 
     @classmethod
-    def _convert_to_docx(cls, input_path: str, output_path: str):
+    def convert_stream(cls, src, dst, input_ext: str, output_ext: str, **options):
+        """
+        txt 用 pdfplumber 直接在内存里逐页提取（单进程，不做OCR）；docx 需要 pdf2docx/OCR 读文件，落盘处理
+        """
+        if output_ext != 'txt':
+            return super().convert_stream(src, dst, input_ext, output_ext, **options)
         try:
-            # 检查PDF是否是扫描版（需要使用pdfplumber或其他库检测）
-            # 这里简化处理，假设用户知道需要OCR处理
-            use_ocr = True  # 可以通过参数或检测决定是否使用OCR
-
-            if use_ocr:
-                # 使用OCR处理
-                import pdf2image
-                from PIL import Image
-                import pytesseract
-
-                # 将PDF转换为图像
-                images = pdf2image.convert_from_path(input_path)
-
-                # 使用OCR提取文本
-                text = ""
-                for image in images:
-                    text += pytesseract.image_to_string(image, lang='chi_sim')  # 指定中文识别
-
-                # 创建DOCX文件
-                from docx import Document
-                doc = Document()
-                doc.add_paragraph(text)
-                doc.save(output_path)
-            else:
-                # 直接转换（适用于文本型PDF）
-                cv = Converter(input_path)
-                cv.convert(output_path)
-                cv.close()
+            import pdfplumber
+            from core.utils import ensure_seekable, text_writer
+            progress = options.get('progress')
+            with pdfplumber.open(ensure_seekable(src)) as pdf, text_writer(dst) as out:
+                page_count = len(pdf.pages)
+                report = (lambda done: cls._report_progress(progress, done, page_count)) if progress else None
+                with cls._stage('extract_text', pages=page_count):
+                    _write_pages_text(pdf, out, 0, page_count, on_page=report)
+        except PASSTHROUGH_ERRORS:
+            raise
         except Exception as e:
-            raise FileConversionError(f"PDF转DOCX失败: {str(e)}")
+            raise FileConversionError(f"PDF转换失败: {str(e)}")
+
     @classmethod
-    def _convert_to_txt(cls, input_path: str, output_path: str):
+    def _convert_to_docx(cls, input_path: str, output_path: str, jobs: int = 1,
+                         ocr_dpi: int = DEFAULT_OCR_DPI, ocr_lang: str = DEFAULT_OCR_LANG, progress=None,
+                         ocr: str = 'auto', pages: str = None):
+        """
+        :param ocr: auto 按页面索引分流：有文本层的页用 pdf2docx 直接转换（保留版式），扫描页OCR后按页序插入；
+                    直接转换失败时整份OCR。always 总是OCR；never 总是直接转换
+        :param pages: 页码范围，例如 '1-5,8'
+        """
+        if ocr not in OCR_MODES:
+            raise ValueError(f"ocr 参数应为 {'/'.join(OCR_MODES)}，而不是 {ocr}")
         try:
-            # 使用 pdfplumber 或其他库提取文本
+            page_count = cls._page_count(input_path)
+            page_numbers = parse_page_ranges(pages, page_count)
+            if not page_numbers:
+                raise FileReadError("PDF文件没有页面")
+
+            ocr_pages = page_numbers if ocr == 'always' else []
+            if ocr == 'auto':
+                ocr_pages = cls._image_pages(input_path, page_numbers)
+            scanned = set(ocr_pages)
+            text_pages = [number for number in page_numbers if number not in scanned]
+
+            if text_pages:
+                total = len(page_numbers)
+                try:
+                    cls._convert_with_pdf2docx(
+                        input_path, output_path, text_pages, page_count, jobs,
+                        (lambda done, _: cls._report_progress(progress, done, total)) if progress else None)
+                except PASSTHROUGH_ERRORS:
+                    raise
+                except Exception:
+                    if ocr == 'never':
+                        raise
+                    # 自动模式下直接转换失败（例如缺少 pdf2docx 或页面结构异常）时整份OCR
+                    ocr_pages, text_pages = page_numbers, []
+                if text_pages:
+                    if ocr_pages:
+                        try:
+                            cls._insert_ocr_pages(input_path, output_path, text_pages, ocr_pages, jobs,
+                                                  ocr_dpi, ocr_lang, progress, total)
+                        except OCR_UNAVAILABLE_ERRORS as e:
+                            # 保留 pdf2docx 的结果（插入是在内存里做的，输出文件没有改动），扫描页留空
+                            record_ocr_skipped(input_path, ocr_pages, e)
+                    return
+
+            cls._convert_with_ocr(input_path, output_path, ocr_pages, jobs, ocr_dpi, ocr_lang, progress)
+        except PASSTHROUGH_ERRORS:
+            raise
+        except Exception as e:
+            raise FileConversionError(f"PDF转DOCX失败: {str(e)}")
+
+    @classmethod
+    def _image_pages(cls, input_path: str, page_numbers: list) -> list:
+        """按页面索引（有缓存）找出需要OCR的扫描页"""
+        from core.pdf_pages import get_page_index, image_pages
+        with cls._stage('page_index', input_path, pages=len(page_numbers)) as record:
+            scanned = image_pages(get_page_index(input_path), page_numbers)
+            record['image_pages'] = len(scanned)
+        return scanned
+
+    @classmethod
+    def _page_count(cls, input_path: str) -> int:
+        with cls._stage('read', input_path):
             import pdfplumber
             with pdfplumber.open(input_path) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    text += page.extract_text() or ""
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(text)
+                return len(pdf.pages)
+
+    @classmethod
+    def _convert_with_pdf2docx(cls, input_path: str, output_path: str, page_numbers: list, page_count: int,
+                               jobs: int = 1, progress=None):
+        """文本型PDF直接转换；jobs > 1 时使用 pdf2docx 的多进程解析"""
+        from pdf2docx import Converter
+
+        cls._report_progress(progress, 0, len(page_numbers))
+        # pdf2docx 的多进程模式只支持连续区间（start/end，从 0 开始、不含 end），离散页码只能单进程
+        contiguous = page_numbers == list(range(page_numbers[0], page_numbers[-1] + 1))
+        multi_processing = (jobs or 1) > 1 and contiguous and len(page_numbers) >= 2 * (jobs or 1)
+        kwargs = {}
+        if contiguous:
+            kwargs.update(start=page_numbers[0] - 1, end=page_numbers[-1])
+        else:
+            kwargs['pages'] = [number - 1 for number in page_numbers]
+        if multi_processing:
+            kwargs.update(multi_processing=True, cpu_count=jobs)
+
+        with cls._stage('pdf2docx', input_path, output_path, pages=len(page_numbers),
+                        multi_processing=multi_processing):
+            cv = Converter(input_path)
+            try:
+                cv.convert(output_path, **kwargs)
+            finally:
+                cv.close()
+        cls._report_progress(progress, len(page_numbers), len(page_numbers))
+
+    @classmethod
+    def _convert_with_ocr(cls, input_path: str, output_path: str, page_numbers: list, jobs: int = 1,
+                          ocr_dpi: int = DEFAULT_OCR_DPI, ocr_lang: str = DEFAULT_OCR_LANG, progress=None):
+        """逐页栅格化到临时文件，多进程识别，按页序写入段落"""
+        from docx import Document
+        from docx.enum.text import WD_BREAK
+        from core.backends.ocr import iter_ocr_pages, split_paragraphs
+
+        doc = Document()
+        for done, (page_number, text) in enumerate(
+                iter_ocr_pages(input_path, page_numbers, dpi=ocr_dpi, lang=ocr_lang, jobs=jobs), start=1):
+            cls._report_progress(progress, done, len(page_numbers))
+            if done > 1:
+                doc.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+            for paragraph in split_paragraphs(text):
+                doc.add_paragraph(paragraph)
+        with cls._stage('write', output_path=output_path):
+            doc.save(output_path)
+
+    @classmethod
+    def _insert_ocr_pages(cls, input_path: str, output_path: str, text_pages: list, ocr_pages: list, jobs: int,
+                          ocr_dpi: int, ocr_lang: str, progress, total: int):
+        """
+        识别扫描页，把结果按页序插入 pdf2docx 生成的文档
+        pdf2docx 每页开始一个“下一页”分节（分栏另有“连续”分节），第 k 个文本页结束于第 k 个这样的分节符所在段落
+        """
+        import bisect
+        from docx import Document
+        from docx.enum.section import WD_SECTION
+        from docx.enum.text import WD_BREAK
+        from docx.oxml.ns import qn
+        from core.backends.ocr import iter_ocr_pages, split_paragraphs
+
+        with cls._stage('read', output_path):
+            doc = Document(output_path)
+        body = doc.element.body
+        breaks = [p for p in body.iterchildren(qn('w:p')) if p.pPr is not None and p.pPr.sectPr is not None]
+        sections = doc.sections
+        page_ends = [p for index, p in enumerate(breaks)
+                     if index + 1 < len(sections) and sections[index + 1].start_type == WD_SECTION.NEW_PAGE]
+
+        def _page_break():
+            paragraph = doc.add_paragraph()
+            paragraph.add_run().add_break(WD_BREAK.PAGE)
+            return paragraph._p
+
+        # 插在第 k 个文本页之前的内容依次接在上一个插入的元素后面
+        cursors = {}
+        for done, (page_number, text) in enumerate(
+                iter_ocr_pages(input_path, ocr_pages, dpi=ocr_dpi, lang=ocr_lang, jobs=jobs), start=1):
+            cls._report_progress(progress, len(text_pages) + done, total)
+            k = bisect.bisect_left(text_pages, page_number)
+            if k >= len(text_pages) or (k > 0 and k - 1 >= len(page_ends)):
+                # 在最后一个文本页之后（或分节与页数对不上）：追加到文末
+                _page_break()
+                for paragraph in split_paragraphs(text):
+                    doc.add_paragraph(paragraph)
+                continue
+            elements = [doc.add_paragraph(paragraph)._p for paragraph in split_paragraphs(text)]
+            elements.append(_page_break())
+            cursor = cursors.get(k, page_ends[k - 1] if k > 0 else None)
+            for element in elements:
+                if cursor is None:
+                    body.insert(0, element)
+                else:
+                    cursor.addnext(element)
+                cursor = element
+            cursors[k] = cursor
+
+        with cls._stage('write', output_path=output_path, ocr_pages=len(ocr_pages)):
+            doc.save(output_path)
+
+    @classmethod
+    def _ocr_text_pages(cls, input_path: str, page_numbers: list, ocr: str, jobs: int, ocr_dpi: int,
+                        ocr_lang: str) -> dict:
+        """
+        txt 输出中用OCR结果代替直接提取的页 {页码: 文本}
+        auto 模式下OCR不可用（见 OCR_UNAVAILABLE_ERRORS）时保留直接提取的结果（扫描页为空）
+        """
+        if ocr not in OCR_MODES:
+            raise ValueError(f"ocr 参数应为 {'/'.join(OCR_MODES)}，而不是 {ocr}")
+        if ocr == 'never':
+            return {}
+        pages = page_numbers if ocr == 'always' else cls._image_pages(input_path, page_numbers)
+        if not pages:
+            return {}
+        from core.backends.ocr import iter_ocr_pages
+        try:
+            with cls._stage('ocr', input_path, pages=len(pages)):
+                return dict(iter_ocr_pages(input_path, pages, dpi=ocr_dpi, lang=ocr_lang, jobs=jobs))
+        except OCR_UNAVAILABLE_ERRORS as e:
+            if ocr == 'always':
+                raise
+            record_ocr_skipped(input_path, pages, e)
+            return {}
+
+    @classmethod
+    def _convert_to_txt(cls, input_path: str, output_path: str, jobs: int = 1, progress=None, ocr: str = 'auto',
+                        ocr_dpi: int = DEFAULT_OCR_DPI, ocr_lang: str = DEFAULT_OCR_LANG):
+        """
+        逐页提取文本并流式写入；jobs > 1 时把页码区间分给多个进程，再按顺序合并
+        扫描页（见 ocr 参数）先OCR，写出时按页序代替直接提取的结果
+        """
+        try:
+            import pdfplumber
+            with cls._stage('read', input_path):
+                with pdfplumber.open(input_path) as pdf:
+                    page_count = len(pdf.pages)
+            ocr_texts = cls._ocr_text_pages(input_path, list(range(1, page_count + 1)), ocr, jobs,
+                                            ocr_dpi, ocr_lang)
+
+            workers = min(jobs or 1, page_count // _MIN_PAGES_PER_WORKER)
+            if workers <= 1:
+                report = (lambda done: cls._report_progress(progress, done, page_count)) if progress else None
+                with cls._stage('extract_text', input_path, output_path, pages=page_count):
+                    _extract_text_range(input_path, output_path, 0, page_count, on_page=report,
+                                        replacements=ocr_texts)
+                return
+
+            bounds = [page_count * i // workers for i in range(workers + 1)]
+            part_paths = [f'{output_path}.part{i}' for i in range(workers)]
+            try:
+                # 工作进程在退出进程池时被回收，它们的 CPU 时间计入本阶段的子进程 CPU 时间
+                with cls._stage('extract_text', input_path, pages=page_count, workers=workers), \
+                        ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        executor.submit(_extract_text_range, input_path, part_paths[i], bounds[i], bounds[i + 1],
+                                        replacements={number: text for number, text in ocr_texts.items()
+                                                      if bounds[i] < number <= bounds[i + 1]})
+                        for i in range(workers)
+                    ]
+                    for index, future in enumerate(futures):
+                        future.result()
+                        cls._report_progress(progress, bounds[index + 1], page_count)
+
+                with cls._stage('write', output_path=output_path, parts=workers), open(output_path, 'wb') as out:
+                    for part_path in part_paths:
+                        with open(part_path, 'rb') as part:
+                            shutil.copyfileobj(part, out)
+            finally:
+                for part_path in part_paths:
+                    if os.path.exists(part_path):
+                        os.unlink(part_path)
+        except PASSTHROUGH_ERRORS:
+            raise
         except Exception as e:
             raise FileReadError(f"读取PDF文件失败: {str(e)}")
 
-# 注册转换器
-for input_ext, output_exts in PdfConverter.supported_formats().items():
-    for output_ext in output_exts:
-        register_converter(input_ext, output_ext, PdfConverter)
\ No newline at end of file
+
+def _release_page(page):
+    """释放 pdfplumber 页面缓存的对象，保证内存不随页数增长"""
+    close = getattr(page, 'close', None) or getattr(page, 'flush_cache', None)
+    if close:
+        close()
+
+
+def _extract_text_range(input_path: str, output_path: str, start: int, end: int, on_page=None,
+                        replacements: dict = None):
+    """提取 [start, end) 页的文本写入 output_path（供进程池调用）；on_page(已完成页数) 只在本进程内使用"""
+    import pdfplumber
+    with pdfplumber.open(input_path) as pdf, open(output_path, 'w', encoding='utf-8') as f:
+        _write_pages_text(pdf, f, start, end, on_page, replacements)
+
+
+def _write_pages_text(pdf, out, start: int, end: int, on_page=None, replacements: dict = None):
+    """
+    把已打开的 pdfplumber 文档 [start, end) 页的文本写入文本流 out
+    :param replacements: {页码: 文本}，这些页（OCR过的扫描页）不再直接提取
+    """
+    for index in range(start, end):
+        if replacements and index + 1 in replacements:
+            out.write(replacements[index + 1])
+        else:
+            page = pdf.pages[index]
+            out.write(page.extract_text() or "")
+            _release_page(page)
+        out.write('\n')
+        if on_page:
+            on_page(index + 1)
@@ -0,0 +1,253 @@
+# core/converters/pdf_text_converter.py
+# PDF转TXT的快速引擎：pdfminer.six 的底层管线（不做版面分组排序）或 PyPDF2，比 pdfplumber 快得多；
+# 逐页检查输出，看起来是乱码的页（空白、无法映射的字形、CJK 字序错乱）用 pdfplumber 重新提取，
+# 提取为空的扫描页（按页面索引判断）OCR
+import importlib.util
+import re
+from abc import abstractmethod
+from typing import Iterator, Optional, Tuple
+from core.converters.base_converter import BaseConverter, PASSTHROUGH_ERRORS
+from core.exceptions import FileConversionError, UnsupportedFormatError
+
+# 替换字符、私用区、C0/C1 控制字符：字体没有 ToUnicode 映射、或双字节编码被逐字节解码时常见
+_BAD_CHARS = re.compile('[\ufffd\ue000-\uf8ff\x00-\x08\x0b\x0e-\x1f\x7f-\x9f]')
+# pdfminer 对无法映射的字形输出 (cid:123)
+_CID = re.compile(r'\(cid:\d+\)')
+# UTF-8 被当作 Latin-1 解码后的典型序列，例如 Ã©
+_MOJIBAKE = re.compile('[\u00c2\u00c3][\u0080-\u00bf]')
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_CJK_CHAR = re.compile(f'[{_CJK}]')
+_SPACED_CJK = re.compile(f'[{_CJK}] (?=[{_CJK}])')
+# 异常字符占非空白字符的比例超过它视为乱码
+_BAD_RATIO = 0.05
+# CJK 字符至少这么多时才检查字序
+_CJK_MIN_CHARS = 20
+# 单字成行或字间插入空格的 CJK 字符比例超过它视为字序错乱
+_CJK_BROKEN_RATIO = 0.3
+
+
+def garbled_reason(text: str) -> Optional[str]:
+    """
+    判断一页提取结果是否像乱码
+    :return: 'empty' / 'mojibake' / 'cjk_order'，看起来正常时返回 None
+    """
+    visible = len(text) - sum(1 for char in text if char.isspace())
+    if visible == 0:
+        return 'empty'
+    bad = len(_BAD_CHARS.findall(text)) + len(_MOJIBAKE.findall(text)) \
+        + sum(len(match) for match in _CID.findall(text))
+    if bad > _BAD_RATIO * visible:
+        return 'mojibake'
+    cjk = len(_CJK_CHAR.findall(text))
+    if cjk >= _CJK_MIN_CHARS:
+        # 没有版面分析时，竖排或逐字定位的中文常被拆成一字一行，或字间被插入空格
+        single = sum(1 for line in text.splitlines() if len(line.strip()) == 1 and _CJK_CHAR.match(line.strip()))
+        if single + len(_SPACED_CJK.findall(text)) > _CJK_BROKEN_RATIO * cjk:
+            return 'cjk_order'
+    return None
+
+
+class _LayoutRetry:
+    """用 pdfplumber 重新提取个别页；第一次需要时才打开，与快速引擎共用同一个输入流"""
+
+    def __init__(self, src):
+        self.src = src
+        self.pdf = None
+
+    def page_text(self, index: int) -> Optional[str]:
+        """:return: 重新提取的文本，没有 pdfplumber 时返回 None"""
+        try:
+            import pdfplumber
+        except ImportError:
+            return None
+        from core.converters.pdf_converter import _release_page
+
+        # 快速引擎还在读同一个流，重新提取前后保持读取位置不变
+        position = self.src.tell()
+        try:
+            if self.pdf is None:
+                self.pdf = pdfplumber.open(self.src)
+            page = self.pdf.pages[index]
+            try:
+                return page.extract_text() or ""
+            finally:
+                _release_page(page)
+        finally:
+            self.src.seek(position)
+
+    def close(self):
+        if self.pdf is not None:
+            self.pdf.close()
+
+
+class _PageOcr:
+    """
+    快速引擎的扫描页OCR：某页提取为空时才读取页面索引（有缓存），是图像页就逐页OCR
+    auto 模式下OCR不可用（见 OCR_UNAVAILABLE_ERRORS）后不再尝试，保留直接提取的结果；always 模式每页都OCR
+    """
+
+    def __init__(self, input_path: str, mode: str = 'auto', dpi: int = None, lang: str = None):
+        from core.converters.pdf_converter import OCR_MODES
+        if mode not in OCR_MODES:
+            raise ValueError(f"ocr 参数应为 {'/'.join(OCR_MODES)}，而不是 {mode}")
+        self.input_path = input_path
+        self.mode = mode
+        self.dpi = dpi
+        self.lang = lang
+        self._kinds = None
+
+    def page_text(self, page_number: int, text: str) -> Optional[str]:
+        """:return: OCR结果，不需要OCR时返回 None"""
+        if self.mode == 'never' or (self.mode == 'auto' and text.strip()):
+            return None
+        if self.mode == 'auto':
+            if self._kinds is None:
+                from core.pdf_pages import get_page_index
+                self._kinds = {info.number: info.kind for info in get_page_index(self.input_path)}
+            if self._kinds.get(page_number) != 'image':
+                return None
+        from core.backends.ocr import (
+            DEFAULT_OCR_DPI, DEFAULT_OCR_LANG, OCR_UNAVAILABLE_ERRORS, ocr_page, record_ocr_skipped
+        )
+        try:
+            return ocr_page(self.input_path, page_number, self.dpi or DEFAULT_OCR_DPI, self.lang or DEFAULT_OCR_LANG)
+        except OCR_UNAVAILABLE_ERRORS as e:
+            if self.mode == 'always':
+                raise
+            record_ocr_skipped(self.input_path, [page_number], e)
+            self.mode = 'never'
+            return None
+
+
+class _PdfTextConverter(BaseConverter):
+    """逐页提取文本并流式写出；子类实现 _open_pages"""
+
+    # 引擎依赖的模块
+    module = None
+
+    @classmethod
+    def supported_formats(cls) -> dict:
+        return {'pdf': ['txt']}
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return importlib.util.find_spec(cls.module) is not None
+
+    @classmethod
+    def convert(cls, input_path: str, output_path: str, input_ext: str, output_ext: str, **options):
+        if not cls.can_convert(input_ext, output_ext):
+            raise UnsupportedFormatError(f"不支持将 {input_ext} 转换为 {output_ext}")
+        try:
+            cls._ensure_output_dir_exists(output_path)
+            ocr = _PageOcr(input_path, options.get('ocr', 'auto'), options.get('ocr_dpi'), options.get('ocr_lang'))
+            with open(input_path, 'rb') as src, open(output_path, 'w', encoding='utf-8') as out, \
+                    cls._stage('extract_text', input_path, output_path) as record:
+                cls._write_text(src, out, record, check=options.get('text_check', True),
+                                progress=options.get('progress'), ocr=ocr)
+        except PASSTHROUGH_ERRORS:
+            raise
+        except Exception as e:
+            raise FileConversionError(f"PDF转换失败: {str(e)}")
+
+    @classmethod
+    def convert_stream(cls, src, dst, input_ext: str, output_ext: str, **options):
+        if not cls.can_convert(input_ext, output_ext):
+            raise UnsupportedFormatError(f"不支持将 {input_ext} 转换为 {output_ext}")
+        try:
+            from core.utils import ensure_seekable, text_writer
+            with text_writer(dst) as out, cls._stage('extract_text') as record:
+                cls._write_text(ensure_seekable(src), out, record, check=options.get('text_check', True),
+                                progress=options.get('progress'))
+        except PASSTHROUGH_ERRORS:
+            raise
+        except Exception as e:
+            raise FileConversionError(f"PDF转换失败: {str(e)}")
+
+    @classmethod
+    def _write_text(cls, src, out, record: dict, check: bool = True, progress=None, ocr=None):
+        """
+        每页之后输出换行；check 为 True 时只把看起来是乱码的页交给 pdfplumber 重新提取
+        阶段记录里附带页数和重新提取的页数（按原因）
+        :param ocr: _PageOcr，只在从文件转换时提供（OCR需要文件路径）
+        """
+        retry = _LayoutRetry(src) if check else None
+        retried = {}
+        pages = 0
+        try:
+            page_count, page_texts = cls._open_pages(src)
+            for index, text in enumerate(page_texts):
+                reason = garbled_reason(text) if check else None
+                ocr_text = ocr.page_text(index + 1, text) if ocr is not None else None
+                if ocr_text is not None:
+                    text, reason = ocr_text, None
+                    retried['ocr'] = retried.get('ocr', 0) + 1
+                if reason is not None:
+                    layout_text = retry.page_text(index)
+                    if layout_text:
+                        text = layout_text
+                        retried[reason] = retried.get(reason, 0) + 1
+                out.write(text)
+                out.write('\n')
+                pages = index + 1
+                if page_count:
+                    cls._report_progress(progress, pages, page_count)
+        finally:
+            if retry is not None:
+                retry.close()
+        record['pages'] = pages
+        record['retried_pages'] = sum(retried.values())
+        if retried:
+            record['retried'] = retried
+
+    @classmethod
+    @abstractmethod
+    def _open_pages(cls, src) -> Tuple[Optional[int], Iterator[str]]:
+        """:return: (页数（未知时为 None）, 逐页文本的迭代器)"""
+        pass
+
+
+class PdfMinerTextConverter(_PdfTextConverter):
+    """
+    pdfminer.six 的底层管线：文本行照常合并，但不做文本框的层次分组和阅读顺序排序（boxes_flow=None，
+    这是 pdfminer 版面分析里最慢的部分），文本框按从上到下、从左到右排列
+    """
+
+    module = 'pdfminer'
+
+    @classmethod
+    def _open_pages(cls, src):
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdftypes import resolve1
+
+        document = PDFDocument(PDFParser(src))
+        pages = resolve1(document.catalog.get('Pages'))
+        page_count = resolve1(pages.get('Count')) if isinstance(pages, dict) else None
+        return (page_count if isinstance(page_count, int) else None), cls._iter_page_texts(document)
+
+    @staticmethod
+    def _iter_page_texts(document) -> Iterator[str]:
+        from pdfminer.converter import PDFPageAggregator
+        from pdfminer.layout import LAParams, LTTextContainer
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+
+        manager = PDFResourceManager(caching=True)
+        device = PDFPageAggregator(manager, laparams=LAParams(boxes_flow=None, detect_vertical=False))
+        interpreter = PDFPageInterpreter(manager, device)
+        for page in PDFPage.create_pages(document):
+            interpreter.process_page(page)
+            layout = device.get_result()
+            yield ''.join(element.get_text() for element in layout if isinstance(element, LTTextContainer))
+
+
+class PyPdf2TextConverter(_PdfTextConverter):
+    """用 PyPDF2 按内容流顺序提取文本，不做版面分析"""
+
+    module = 'PyPDF2'
+
+    @classmethod
+    def _open_pages(cls, src):
+        from PyPDF2 import PdfReader
+        pages = PdfReader(src).pages
+        return len(pages), (page.extract_text() or "" for page in pages)
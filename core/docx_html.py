@@ -0,0 +1,267 @@
+# core/docx_html.py
+# 单遍 DOCX -> HTML：标题、列表、表格和内嵌图片
+# 图片从 zip 成员直接流式复制到资源目录（不解码、不 base64 内嵌），按内容哈希去重
+# 只有输出为内存流、没有资源目录可写时才以 data URI 内嵌
+import base64
+import hashlib
+import html
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+from core.docx_reader import Paragraph, iter_blocks
+
+RELS_PART = 'word/_rels/document.xml.rels'
+NUMBERING_PART = 'word/numbering.xml'
+_CHUNK_SIZE = 1024 * 1024
+_HEADING = re.compile(r'^(?:heading|标题)\s*([1-6])$', re.IGNORECASE)
+_UNORDERED_FORMATS = {'bullet', 'none'}
+# 表格结构事件对应的标签
+_BLOCK_TAGS = {
+    'table_start': '<table border="1">\n', 'table_end': '</table>\n',
+    'row_start': '<tr>', 'row_end': '</tr>\n',
+    'cell_start': '<td>', 'cell_end': '</td>',
+}
+
+
+def assets_dir_for(output_path: str) -> str:
+    """HTML 旁边存放图片的目录：report.html -> report_files/"""
+    base, _ = os.path.splitext(output_path)
+    return base + '_files'
+
+
+def _read_xml(archive: zipfile.ZipFile, part: str):
+    try:
+        return ET.fromstring(archive.read(part))
+    except KeyError:
+        return None
+
+
+def _namespace(tag: str) -> str:
+    return tag[:tag.index('}') + 1] if tag.startswith('{') else ''
+
+
+def read_relationships(archive: zipfile.ZipFile) -> dict:
+    """关系 id -> (目标, 是否外部链接)；包内目标已解析为 zip 成员名"""
+    root = _read_xml(archive, RELS_PART)
+    if root is None:
+        return {}
+    relationships = {}
+    for rel in root:
+        target = rel.get('Target', '')
+        external = rel.get('TargetMode') == 'External'
+        if not external:
+            target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('word', target))
+        relationships[rel.get('Id')] = (target, external)
+    return relationships
+
+
+def read_list_formats(archive: zipfile.ZipFile) -> dict:
+    """numId -> {级别: 编号格式}，用来区分有序列表和项目符号列表"""
+    root = _read_xml(archive, NUMBERING_PART)
+    if root is None:
+        return {}
+    w = _namespace(root.tag)
+    abstract_formats = {}
+    for abstract in root.iter(f'{w}abstractNum'):
+        levels = {}
+        for level in abstract.iter(f'{w}lvl'):
+            num_format = level.find(f'{w}numFmt')
+            levels[int(level.get(f'{w}ilvl', 0))] = num_format.get(f'{w}val') if num_format is not None else 'decimal'
+        abstract_formats[abstract.get(f'{w}abstractNumId')] = levels
+    formats = {}
+    for num in root.iter(f'{w}num'):
+        abstract_id = num.find(f'{w}abstractNumId')
+        if abstract_id is not None:
+            formats[num.get(f'{w}numId')] = abstract_formats.get(abstract_id.get(f'{w}val'), {})
+    return formats
+
+
+class _HashingWriter:
+    """边写边算 sha256，配合 shutil.copyfileobj 使用"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.f.write(data)
+
+
+class DocxHtmlWriter:
+    """把 docx_reader 产出的内容流写成 HTML，同时把引用到的图片写入资源目录"""
+
+    def __init__(self, out, output_path: str = None, archive: zipfile.ZipFile = None, assets_dir: str = None,
+                 embed_images: bool = False):
+        """
+        :param embed_images: 图片以 data URI 写在 HTML 里，不需要 output_path 和资源目录
+        """
+        self.out = out
+        self.embed_images = embed_images
+        self.output_dir = os.path.dirname(os.path.abspath(output_path)) if output_path else None
+        self.archive = archive
+        self.assets_dir = assets_dir or (assets_dir_for(output_path) if output_path else None)
+        self.relationships = read_relationships(archive) if archive else {}
+        self.list_formats = read_list_formats(archive) if archive else {}
+        # 已写出的图片：zip 成员名 / (CRC, 大小) -> img 的 src
+        self._by_member = {}
+        self._by_signature = {}
+        self.images_written = 0
+        self.images_deduplicated = 0
+        # 打开的列表：[(级别, 标签), ...]
+        self._lists = []
+
+    # ---- 图片 ----
+
+    def _image_src(self, rel_id: str):
+        relationship = self.relationships.get(rel_id)
+        if relationship is None:
+            return None
+        target, external = relationship
+        if external:
+            return target
+        if target in self._by_member:
+            return self._by_member[target]
+        try:
+            info = self.archive.getinfo(target)
+        except KeyError:
+            return None
+
+        # 同一文档里重复嵌入的图片通常是不同成员、相同内容，先按 zip 目录里的 CRC 和大小判断，不用读内容
+        signature = (info.CRC, info.file_size)
+        if signature in self._by_signature:
+            self.images_deduplicated += 1
+            src = self._by_signature[signature]
+        else:
+            src = self._embed(info) if self.embed_images else self._extract(info)
+            self._by_signature[signature] = src
+        self._by_member[target] = src
+        return src
+
+    def _embed(self, info: zipfile.ZipInfo) -> str:
+        with self.archive.open(info) as src:
+            data = base64.b64encode(src.read()).decode('ascii')
+        self.images_written += 1
+        mime_type = mimetypes.guess_type(info.filename)[0] or 'application/octet-stream'
+        return f'data:{mime_type};base64,{data}'
+
+    def _extract(self, info: zipfile.ZipInfo) -> str:
+        """流式复制 zip 成员到资源目录，文件名取内容哈希，已存在相同内容时不再写入"""
+        os.makedirs(self.assets_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.assets_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as dst, self.archive.open(info) as src:
+                writer = _HashingWriter(dst)
+                shutil.copyfileobj(src, writer, _CHUNK_SIZE)
+            name = writer.digest.hexdigest()[:16] + posixpath.splitext(info.filename)[1].lower()
+            final_path = os.path.join(self.assets_dir, name)
+            if os.path.exists(final_path):
+                self.images_deduplicated += 1
+            else:
+                os.replace(temp_path, final_path)
+                self.images_written += 1
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        relative = os.path.relpath(final_path, self.output_dir).replace(os.sep, '/')
+        return quote(relative)
+
+    # ---- 列表 ----
+
+    def _list_tag(self, paragraph: Paragraph) -> str:
+        num_format = self.list_formats.get(paragraph.list_id, {}).get(paragraph.list_level or 0, 'bullet')
+        return 'ul' if num_format in _UNORDERED_FORMATS else 'ol'
+
+    def _close_lists(self, level: int = -1):
+        """关闭比 level 更深的列表"""
+        while self._lists and self._lists[-1][0] > level:
+            _, tag = self._lists.pop()
+            self.out.write(f'</li></{tag}>\n')
+
+    def _open_item(self, paragraph: Paragraph):
+        level, tag = paragraph.list_level or 0, self._list_tag(paragraph)
+        self._close_lists(level)
+        if self._lists and self._lists[-1][0] == level and self._lists[-1][1] != tag:
+            self._close_lists(level - 1)
+        if self._lists and self._lists[-1][0] == level:
+            self.out.write('</li>\n<li>')
+        else:
+            self.out.write(f'<{tag}>\n<li>')
+            self._lists.append((level, tag))
+
+    # ---- 段落 ----
+
+    def _inline(self, paragraph: Paragraph) -> str:
+        parts = []
+        for kind, value in paragraph.segments:
+            if kind == 'text':
+                parts.append(html.escape(value).replace('\n', '<br>'))
+            elif self.archive is not None:
+                src = self._image_src(value)
+                if src:
+                    parts.append(f'<img src="{html.escape(src)}" alt="">')
+        return ''.join(parts)
+
+    def _paragraph(self, paragraph: Paragraph):
+        if paragraph.list_id not in (None, '0'):
+            self._open_item(paragraph)
+            self.out.write(self._inline(paragraph))
+            return
+
+        self._close_lists()
+        style = (paragraph.style or '').strip()
+        heading = _HEADING.match(style)
+        if heading:
+            tag = f'h{heading.group(1)}'
+        elif style.lower() == 'title':
+            tag = 'h1'
+        else:
+            tag = 'p'
+        self.out.write(f'<{tag}>{self._inline(paragraph)}</{tag}>\n')
+
+    def write(self, blocks):
+        self.write_header()
+        for kind, value in blocks:
+            self.write_block(kind, value)
+        self.write_footer()
+
+    def write_header(self):
+        self.out.write('<!DOCTYPE html><html><head><meta charset="UTF-8"></head><body>\n')
+
+    def write_block(self, kind: str, value):
+        """写出 iter_blocks 产出的一项，供同时把内容流写成多种格式的调用方逐项驱动"""
+        if kind == 'paragraph':
+            self._paragraph(value)
+        else:
+            self._close_lists()
+            self.out.write(_BLOCK_TAGS[kind])
+
+    def write_footer(self):
+        self._close_lists()
+        self.out.write('</body></html>\n')
+
+
+def convert_docx_to_html(input_path: str, output_path: str, assets_dir: str = None) -> DocxHtmlWriter:
+    """
+    单遍把 DOCX 转为 HTML，图片写入 assets_dir（默认为输出文件旁的 *_files 目录）
+    :return: 写完的 DocxHtmlWriter（含图片写出/去重计数）
+    """
+    with open(output_path, 'w', encoding='utf-8') as out:
+        return write_docx_html(input_path, out, output_path, assets_dir)
+
+
+def write_docx_html(source, out, output_path: str = None, assets_dir: str = None) -> DocxHtmlWriter:
+    """
+    把 DOCX（文件路径，或支持 seek 的二进制文件对象）转为 HTML 写入文本流 out
+    :param output_path: 为 None 时（输出到内存流）图片以 data URI 内嵌
+    """
+    with zipfile.ZipFile(source) as archive:
+        writer = DocxHtmlWriter(out, output_path, archive, assets_dir, embed_images=output_path is None)
+        writer.write(iter_blocks(archive))
+    return writer
@@ -0,0 +1,159 @@
+# core/docx_reader.py
+# 流式读取 DOCX：直接从 zip 里 iterparse word/document.xml，逐个产出段落和表格结构，
+# 处理完的元素立即从树上摘除，内存占用与文档大小无关
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Iterator, Tuple
+
+DOCUMENT_PART = 'word/document.xml'
+STYLES_PART = 'word/styles.xml'
+
+_DRAWING_NS = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+_VML_NS = '{urn:schemas-microsoft-com:vml}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_REL_NS_STRICT = '{http://purl.oclc.org/ooxml/officeDocument/relationships}'
+
+# 读取失败时可以退回 python-docx 的异常
+STREAM_ERRORS = (zipfile.BadZipFile, KeyError, ET.ParseError)
+
+
+class Paragraph:
+    """一个段落：segments 为 [('text', 文本) | ('image', 关系id), ...]"""
+
+    __slots__ = ('segments', 'style', 'list_level', 'list_id')
+
+    def __init__(self):
+        self.segments = []
+        self.style = None
+        self.list_level = None
+        self.list_id = None
+
+    @property
+    def text(self) -> str:
+        return ''.join(value for kind, value in self.segments if kind == 'text')
+
+    def add_text(self, text: str):
+        if self.segments and self.segments[-1][0] == 'text':
+            self.segments[-1] = ('text', self.segments[-1][1] + text)
+        else:
+            self.segments.append(('text', text))
+
+
+def _namespace(tag: str) -> str:
+    return tag[:tag.index('}') + 1] if tag.startswith('{') else ''
+
+
+def read_style_names(archive: zipfile.ZipFile) -> dict:
+    """样式 id -> 样式名（中文版 Word 的样式 id 常是数字，需要查名字才能认出标题）"""
+    try:
+        data = archive.read(STYLES_PART)
+    except KeyError:
+        return {}
+    root = ET.fromstring(data)
+    w = _namespace(root.tag)
+    names = {}
+    for style in root.iter(f'{w}style'):
+        style_id = style.get(f'{w}styleId')
+        name = style.find(f'{w}name')
+        if style_id:
+            names[style_id] = name.get(f'{w}val') if name is not None else style_id
+    return names
+
+
+def iter_blocks(archive: zipfile.ZipFile, part: str = DOCUMENT_PART) -> Iterator[Tuple[str, object]]:
+    """
+    按文档顺序产出 (类型, 内容)：
+    ('paragraph', Paragraph)，以及表格结构 table_start/row_start/cell_start/cell_end/row_end/table_end（内容为 None）
+    表格里的段落出现在 cell_start 和 cell_end 之间，嵌套表格同理
+    """
+    style_names = read_style_names(archive)
+    with archive.open(part) as stream:
+        w = None
+        elements = []
+        paragraphs = []
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            if w is None:
+                w = _namespace(elem.tag)
+                text_tags = {f'{w}t'}
+                break_tags = {f'{w}br', f'{w}cr'}
+                structure = {f'{w}tbl': 'table', f'{w}tr': 'row', f'{w}tc': 'cell'}
+
+            tag = elem.tag
+            if event == 'start':
+                elements.append(elem)
+                if tag == f'{w}p':
+                    paragraphs.append(Paragraph())
+                elif tag in structure:
+                    yield f'{structure[tag]}_start', None
+                continue
+
+            elements.pop()
+            parent = elements[-1] if elements else None
+            paragraph = paragraphs[-1] if paragraphs else None
+
+            if tag == f'{w}p':
+                yield 'paragraph', paragraphs.pop()
+            elif tag in structure:
+                yield f'{structure[tag]}_end', None
+            elif paragraph is not None:
+                parent_tag = parent.tag if parent is not None else None
+                if tag in text_tags:
+                    if elem.text:
+                        paragraph.add_text(elem.text)
+                elif parent_tag == f'{w}r' and tag == f'{w}tab':
+                    paragraph.add_text('\t')
+                elif parent_tag == f'{w}r' and tag in break_tags:
+                    paragraph.add_text('\n')
+                elif parent_tag == f'{w}r' and tag == f'{w}noBreakHyphen':
+                    paragraph.add_text('-')
+                elif tag == f'{_DRAWING_NS}blip' or tag == f'{_VML_NS}imagedata':
+                    rel_id = (elem.get(f'{_REL_NS}embed') or elem.get(f'{_REL_NS}id')
+                              or elem.get(f'{_REL_NS_STRICT}embed') or elem.get(f'{_REL_NS_STRICT}id'))
+                    if rel_id:
+                        paragraph.segments.append(('image', rel_id))
+                elif tag == f'{w}pStyle' and parent_tag == f'{w}pPr':
+                    style_id = elem.get(f'{w}val')
+                    paragraph.style = style_names.get(style_id, style_id)
+                elif tag == f'{w}ilvl' and parent_tag == f'{w}numPr':
+                    paragraph.list_level = int(elem.get(f'{w}val', 0))
+                elif tag == f'{w}numId' and parent_tag == f'{w}numPr':
+                    paragraph.list_id = elem.get(f'{w}val')
+
+            # 已处理完的元素从父节点摘除，树上只保留尚未结束的路径
+            if parent is not None:
+                parent.remove(elem)
+
+
+def iter_docx_blocks(input_path: str) -> Iterator[Tuple[str, object]]:
+    """打开 DOCX 文件并流式产出内容，见 iter_blocks"""
+    with zipfile.ZipFile(input_path) as archive:
+        yield from iter_blocks(archive)
+
+
+def write_text(blocks: Iterator[Tuple[str, object]], out):
+    """
+    把内容写成纯文本：每个段落一行，表格每行一行、单元格之间用制表符分隔
+    只缓存当前表格行，不随文档大小增长
+    """
+    # 每层打开的表格行：[[单元格1的段落, ...], ...]
+    rows = []
+    for kind, value in blocks:
+        if kind == 'paragraph':
+            if rows and rows[-1]:
+                rows[-1][-1].append(value.text)
+            else:
+                out.write(value.text + '\n')
+        elif kind == 'row_start':
+            rows.append([])
+        elif kind == 'cell_start':
+            rows[-1].append([])
+        elif kind == 'cell_end':
+            cell = rows[-1].pop()
+            rows[-1].append(' '.join(text.replace('\n', ' ') for text in cell if text))
+        elif kind == 'row_end':
+            line = '\t'.join(rows.pop())
+            if rows and rows[-1]:
+                # 嵌套表格的一行作为外层单元格的一段
+                rows[-1][-1].append(line)
+            else:
+                out.write(line + '\n')
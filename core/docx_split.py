@@ -0,0 +1,116 @@
+# core/docx_split.py
+# 在分节符/分页符处把 DOCX 切成若干个小 DOCX，用于并行排版
+# 按字节切片 document.xml，命名空间声明、样式、编号、图片等都原样保留
+import os
+import re
+import shutil
+import zipfile
+from xml.parsers import expat
+from core.docx_reader import DOCUMENT_PART
+
+# 每块 document.xml 的目标大小（约几十页），块数只取决于文档本身，与并发数无关，保证输出稳定
+DEFAULT_CHUNK_BYTES = 256 * 1024
+CORE_PROPERTIES_PART = 'docProps/core.xml'
+
+_W_NS = ('http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+         'http://purl.oclc.org/ooxml/wordprocessingml/main')
+_TITLE = re.compile(rb'<dc:title\s*/>|<dc:title>.*?</dc:title>', re.DOTALL)
+
+
+def _scan_body(data: bytes):
+    """
+    找出 body 直接子元素的起点和可以切分的位置
+    :return: (</w:body> 的位置, [[起点, 之后可以切分, 之前可以切分, 是否为 sectPr], ...])
+    """
+    parser = expat.ParserCreate(namespace_separator=' ')
+    state = {'depth': 0, 'body_end': None}
+    children = []
+
+    def _local(name):
+        namespace, _, local = name.rpartition(' ')
+        return local if namespace in _W_NS else None
+
+    def _start(name, attrs):
+        state['depth'] += 1
+        depth, local = state['depth'], _local(name)
+        if depth == 3 and state['body_end'] is None:
+            children.append([parser.CurrentByteIndex, False, False, local == 'sectPr'])
+        elif depth > 3 and children:
+            if local == 'br' and any(key.endswith(' type') and value == 'page' for key, value in attrs.items()):
+                children[-1][1] = True
+            elif local == 'sectPr':
+                # 段落属性里的 sectPr 是分节符
+                children[-1][1] = True
+            elif local == 'pageBreakBefore':
+                children[-1][2] = True
+
+    def _end(name):
+        if state['depth'] == 2 and _local(name) == 'body':
+            state['body_end'] = parser.CurrentByteIndex
+        state['depth'] -= 1
+
+    parser.StartElementHandler = _start
+    parser.EndElementHandler = _end
+    parser.Parse(data, True)
+    return state['body_end'], children
+
+
+def plan_chunks(data: bytes, chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+    """
+    :return: (前缀, 各块的正文字节串, 末尾 sectPr, 后缀)；不需要切分时正文只有一块
+    """
+    body_end, children = _scan_body(data)
+    if not children:
+        return data, [], b'', b''
+
+    final_section = b''
+    if children[-1][3]:
+        final_section = data[children[-1][0]:body_end]
+        content_end = children[-1][0]
+        children = children[:-1]
+    else:
+        content_end = body_end
+
+    prefix = data[:children[0][0]] if children else data[:content_end]
+    suffix = data[body_end:]
+    chunks = []
+    chunk_start = children[0][0] if children else content_end
+    for index, (start, break_after, _, _) in enumerate(children):
+        end = children[index + 1][0] if index + 1 < len(children) else content_end
+        break_before_next = index + 1 < len(children) and children[index + 1][2]
+        if (break_after or break_before_next) and end - chunk_start >= chunk_bytes:
+            chunks.append(data[chunk_start:end])
+            chunk_start = end
+    if chunk_start < content_end:
+        chunks.append(data[chunk_start:content_end])
+    return prefix, chunks, final_section, suffix
+
+
+def split_docx(input_path: str, output_dir: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> list:
+    """
+    把 DOCX 在分节符/分页符处切成多个 DOCX（块内至少 chunk_bytes 字节的 document.xml）
+    除第一块外去掉标题元数据，避免每块都排出一个标题页
+    :return: [块文件路径, ...]，无法切分时只有一个元素即输入文件本身
+    """
+    with zipfile.ZipFile(input_path) as archive:
+        data = archive.read(DOCUMENT_PART)
+        prefix, chunks, final_section, suffix = plan_chunks(data, chunk_bytes)
+        if len(chunks) <= 1:
+            return [input_path]
+
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        for index, chunk in enumerate(chunks):
+            path = os.path.join(output_dir, f'chunk{index:04d}.docx')
+            # 临时文件只在本机使用一次，不压缩以节省 CPU
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as target:
+                for info in archive.infolist():
+                    if info.filename == DOCUMENT_PART:
+                        target.writestr(DOCUMENT_PART, prefix + chunk + final_section + suffix)
+                    elif info.filename == CORE_PROPERTIES_PART and index > 0:
+                        target.writestr(info.filename, _TITLE.sub(b'', archive.read(info)))
+                    else:
+                        with archive.open(info) as src, target.open(info.filename, 'w') as dst:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+            paths.append(path)
+        return paths
@@ -12,4 +12,16 @@ class FileReadError(FileConversionError):
 
 class FileWriteError(FileConversionError):
     """文件写入异常"""
-    pass
\ No newline at end of file
+    pass
+
+class ConversionCancelledError(FileConversionError):
+    """转换被用户取消"""
+    pass
+
+class ConversionTimeoutError(FileConversionError):
+    """外部进程超过墙钟或CPU时间上限，已被终止"""
+    pass
+
+class QuarantinedInputError(FileConversionError):
+    """输入文件多次导致外部进程超时或崩溃，已被隔离，不再尝试转换"""
+    pass
@@ -1,6 +1,17 @@
 # core/factory.py
-from core.registry import get_converter
-from core.exceptions import UnsupportedFormatError
+import io
+import os
+import shutil
+import stat
+import time
+from pathlib import Path
+from core.registry import (
+    get_converter, get_reachable_conversions, plan_route, plan_routes, record_failure, record_latency
+)
+from core.exceptions import (
+    ConversionCancelledError, FileConversionError, QuarantinedInputError, UnsupportedFormatError
+)
+from core import metrics
 
 class ConverterFactory:
     """转换器工厂，负责创建和管理转换器"""
@@ -11,15 +22,384 @@ class ConverterFactory:
         converter_class = get_converter(input_ext, output_ext)
         return converter_class()
 
+    _loaded = False
+
     @classmethod
     def load_converters(cls):
-        """动态加载所有转换器"""
-        # 导入所有转换器模块，触发注册
-        from core.converters import (
-            docx_converter, pdf_converter, html_converter, doc_converter
-        )
+        """按清单注册所有转换器（只登记引用，不导入转换器及其依赖）"""
+        if cls._loaded:
+            return
+        from core.converters import register_manifest
+        register_manifest()
+        cls._loaded = True
 
     @classmethod
     def get_converter(cls, input_ext, output_ext):
         """获取适合的转换器类"""
-        return get_converter(input_ext, output_ext)
\ No newline at end of file
+        return get_converter(input_ext, output_ext)
+
+    @classmethod
+    def supported_conversions(cls):
+        """获取所有支持的转换（包括经由中间格式的多步转换） {input_ext: [output_ext, ...]}"""
+        return get_reachable_conversions()
+
+    @classmethod
+    def plan(cls, input_ext: str, output_ext: str, resolve: bool = True, size: int = None, quality: str = None):
+        """规划预估耗时最小的转换路径 [ConversionStep, ...]，参数见 core.registry.plan_route"""
+        return plan_route(input_ext, output_ext, resolve=resolve, size=size, quality=quality)
+
+    @classmethod
+    def convert(cls, input_path: str, output_path: str, input_ext: str = None, output_ext: str = None,
+                use_cache: bool = True, **options):
+        """
+        执行转换，命中结果缓存时直接复用之前的输出
+        外部进程受 timeout（整个转换的墙钟秒数）、cpu_timeout（每个进程的CPU秒数）、memory_mb 选项限制，
+        缺省取环境变量配置，见 core.backends.process
+        :return: 'hit' / 'miss'，未启用缓存时返回 None
+        """
+        input_ext = input_ext or Path(input_path).suffix[1:].lower()
+        output_ext = output_ext or Path(output_path).suffix[1:].lower()
+        route = plan_route(input_ext, output_ext, size=_file_size(input_path), quality=options.get('quality'))
+
+        from core.cache import get_conversion_cache
+        cache = get_conversion_cache() if use_cache else None
+
+        # 最后一步在输出文件旁生成的附属目录（例如 HTML 的图片目录），随输出一起缓存
+        last = route[-1]
+        side_dirs = last.converter.side_outputs(output_path, last.output_ext)
+
+        with metrics.conversion(f'{input_ext}->{output_ext}'):
+            key = None
+            if cache is not None:
+                # 计算键需要完整读取输入文件做哈希；附属目录名写在输出文件里，也参与缓存键
+                key_options = dict(options, side_outputs=[os.path.basename(path) for path in side_dirs]) \
+                    if side_dirs else options
+                with metrics.stage('cache_lookup', input_path) as record:
+                    planned = [step.converter for step in route]
+                    key = cache.make_key(input_path, planned, output_ext, key_options)
+                    record['hit'] = cache.fetch(key, output_path, side_dirs)
+                if record['hit']:
+                    return 'hit'
+
+            cls._release_output(output_path)
+            for side_dir in side_dirs:
+                # 旧的附属目录可能与缓存条目共享硬链接，重新生成前整个删除
+                shutil.rmtree(side_dir, ignore_errors=True)
+            with _job_limits(input_path, options):
+                used = cls._run_route(route, input_path, output_path, options)
+
+            if cache is None:
+                return None
+            with metrics.stage('cache_store', output_path=output_path):
+                if used != planned:
+                    # 换用了备选引擎，结果记在实际使用的引擎名下
+                    key = cache.make_key(input_path, used, output_ext, key_options)
+                cache.store(key, output_path, side_dirs)
+            return 'miss'
+
+    @classmethod
+    def convert_many(cls, input_path: str, output_paths, input_ext: str = None, use_cache: bool = True,
+                     **options) -> dict:
+        """
+        把一个输入转换为多个格式（各输出的格式取扩展名）：
+        各目标共用的中间结果只生成一次（例如 doc 转 docx/html/txt 时 doc->docx 只做一次，docx 输出本身就是中间结果），
+        同一转换器能一起生成的几个格式合并为一次调用（见 BaseConverter.shared_outputs），
+        互不依赖的步骤在线程里并发执行；每个目标分别查找和写入结果缓存，一个目标失败不影响其它目标
+        :param output_paths: 输出文件路径列表
+        :return: {output_path: {'status': 'ok' / 'failed', 'cache': 'hit' / 'miss' / None, 'error': 错误信息}}
+        """
+        input_ext = input_ext or Path(input_path).suffix[1:].lower()
+        targets = {}
+        for output_path in output_paths:
+            output_ext = Path(output_path).suffix[1:].lower()
+            if output_ext in targets:
+                raise ValueError(f"输出格式重复: {output_ext}")
+            targets[output_ext] = output_path
+        routes = plan_routes(input_ext, list(targets), size=_file_size(input_path), quality=options.get('quality'))
+
+        from core.cache import file_digest, get_conversion_cache
+        cache = get_conversion_cache() if use_cache else None
+        results = {path: {'status': 'ok', 'cache': None, 'error': None} for path in targets.values()}
+        side_dirs = {ext: routes[ext][-1].converter.side_outputs(path, ext) for ext, path in targets.items()}
+        key_options = {
+            ext: dict(options, side_outputs=[os.path.basename(path) for path in side_dirs[ext]])
+            if side_dirs[ext] else options
+            for ext in targets
+        }
+
+        with metrics.conversion(f"{input_ext}->{','.join(targets)}"):
+            # 已经存在的格式 -> 文件；命中缓存的目标也可以作为其它目标的中间结果
+            ready = {input_ext: input_path}
+            digest = None
+            if cache is not None:
+                with metrics.stage('cache_lookup', input_path) as record:
+                    digest = file_digest(input_path)
+                    for ext, path in targets.items():
+                        key = cache.make_key(input_path, [step.converter for step in routes[ext]], ext,
+                                             key_options[ext], digest)
+                        if cache.fetch(key, path, side_dirs[ext]):
+                            results[path]['cache'] = 'hit'
+                            ready[ext] = path
+                    record['hits'] = len(ready) - 1
+
+            # 还要执行的步骤 {输出格式: ConversionStep}，从各目标往回找到已经存在的格式为止
+            steps = {}
+            for ext in targets:
+                if ext in ready:
+                    continue
+                for step in reversed(routes[ext]):
+                    steps[step.output_ext] = step
+                    if step.input_ext in ready:
+                        break
+            if not steps:
+                return results
+
+            from core.utils import scratch_dir
+            with scratch_dir() as work_dir, _job_limits(input_path, options):
+                paths = dict(ready)
+                for ext in steps:
+                    if ext in targets:
+                        paths[ext] = targets[ext]
+                        cls._release_output(targets[ext])
+                        for side_dir in side_dirs[ext]:
+                            shutil.rmtree(side_dir, ignore_errors=True)
+                    else:
+                        paths[ext] = os.path.join(work_dir, f'intermediate.{ext}')
+                outcomes = cls._run_fanout(steps, ready, paths, options)
+
+            for ext, path in targets.items():
+                if ext in ready:
+                    continue
+                route = routes[ext]
+                # 路径上第一个失败的步骤（它下游的步骤没有执行）
+                error = next((outcomes[step.output_ext] for step in route
+                              if isinstance(outcomes.get(step.output_ext), Exception)), None)
+                if error is not None:
+                    results[path].update(status='failed', error=str(error))
+                    continue
+                if cache is None:
+                    continue
+                with metrics.stage('cache_store', output_path=path):
+                    used = [outcomes.get(step.output_ext, step.converter) for step in route]
+                    key = cache.make_key(input_path, used, ext, key_options[ext], digest)
+                    cache.store(key, path, side_dirs[ext])
+                results[path]['cache'] = 'miss'
+        return results
+
+    @classmethod
+    def convert_stream(cls, src, dst, input_ext: str, output_ext: str, **options):
+        """
+        在二进制文件对象之间转换（不经过结果缓存），例如直接转换上传内容、把结果写进响应
+        python-docx / pdfplumber / html2text 能处理的步骤全程在内存里完成；
+        需要外部程序（soffice、pandoc）的步骤才把数据落到临时目录（优先 tmpfs）
+        """
+        input_ext = input_ext.lower().lstrip('.')
+        output_ext = output_ext.lower().lstrip('.')
+        route = plan_route(input_ext, output_ext, size=_stream_size(src), quality=options.get('quality'))
+
+        with metrics.conversion(f'{input_ext}->{output_ext}'), _job_limits(None, options):
+            current = src
+            for index, step in enumerate(route):
+                # 多步路径的中间结果放在内存里传递
+                target = dst if index == len(route) - 1 else io.BytesIO()
+                cls._run_stream_step(step, current, target, options)
+                if target is not dst:
+                    target.seek(0)
+                    current = target
+
+    @classmethod
+    def _run_route(cls, route, input_path: str, output_path: str, options: dict) -> list:
+        """
+        依次执行路径上的每一步，中间结果放在临时目录（优先 tmpfs）里传递
+        :return: 各步实际使用的转换器类
+        """
+        if len(route) == 1:
+            return [cls._run_step(route[0], input_path, output_path, options)]
+
+        from core.utils import scratch_dir
+        used = []
+        with scratch_dir() as work_dir:
+            current = input_path
+            for index, step in enumerate(route):
+                is_last = index == len(route) - 1
+                target = output_path if is_last else os.path.join(work_dir, f'step{index}.{step.output_ext}')
+                used.append(cls._run_step(step, current, target, options))
+                current = target
+        return used
+
+    @classmethod
+    def _run_fanout(cls, steps: dict, ready: dict, paths: dict, options: dict) -> dict:
+        """
+        按依赖关系执行多目标转换的步骤：一个格式生成后，从它出发的步骤立即提交到线程池
+        （外部进程和 I/O 可以并行；线程复制提交时的上下文，阶段记录和外部进程限制随之生效）
+        :param steps: {输出格式: ConversionStep}
+        :param ready: 已经存在的格式，从它们出发
+        :param paths: 每个格式的文件路径
+        :return: {输出格式: 成功的转换器类或失败的异常}，上游失败而没有执行的步骤不在其中
+        """
+        import contextvars
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+            running = {}
+
+            def _launch(node):
+                for group in _group_steps([step for step in steps.values() if step.input_ext == node]):
+                    future = executor.submit(contextvars.copy_context().run, cls._run_group, group, paths, options)
+                    running[future] = group
+
+            for node in ready:
+                _launch(node)
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    for node, outcome in future.result().items():
+                        outcomes[node] = outcome
+                        if not isinstance(outcome, Exception):
+                            _launch(node)
+        return outcomes
+
+    @classmethod
+    def _run_group(cls, group: list, paths: dict, options: dict) -> dict:
+        """
+        执行同一输入的一组步骤：多步时整组调用一次 convert_many，失败后再逐步执行，以便换用备选引擎
+        :return: {输出格式: 成功的转换器类或失败的异常}
+        """
+        input_ext = group[0].input_ext
+        input_path = paths[input_ext]
+        if len(group) > 1:
+            converter = group[0].converter
+            outputs = {step.output_ext: paths[step.output_ext] for step in group}
+            started = time.perf_counter()
+            try:
+                with metrics.stage(f"step:{input_ext}->{','.join(outputs)}", input_path,
+                                   converter=converter.__name__, attempt=1):
+                    converter.convert_many(input_path, outputs, input_ext, **options)
+            except ConversionCancelledError:
+                raise
+            except QuarantinedInputError as e:
+                return {step.output_ext: e for step in group}
+            except FileConversionError:
+                pass
+            else:
+                # 一次调用生成了几个格式，耗时平分到各转换对名下
+                size = _file_size(input_path)
+                seconds = (time.perf_counter() - started) / len(group)
+                for step in group:
+                    record_latency(input_ext, step.output_ext, converter, size, seconds)
+                return {step.output_ext: converter for step in group}
+
+        outcomes = {}
+        for step in group:
+            try:
+                outcomes[step.output_ext] = cls._run_step(step, input_path, paths[step.output_ext], options)
+            except ConversionCancelledError:
+                raise
+            except FileConversionError as e:
+                outcomes[step.output_ext] = e
+        return outcomes
+
+    @staticmethod
+    def _run_step(step, input_path: str, output_path: str, options: dict):
+        """
+        执行一步转换，首选引擎失败时依次换用备选引擎；每次尝试都单独记一个 step:输入->输出 阶段
+        :return: 成功的转换器类
+        """
+        size = _file_size(input_path)
+        engines = (step.converter,) + tuple(step.alternatives)
+        for attempt, converter in enumerate(engines, 1):
+            started = time.perf_counter()
+            try:
+                with metrics.stage(f'step:{step.input_ext}->{step.output_ext}', input_path, output_path,
+                                   converter=converter.__name__, attempt=attempt):
+                    converter.convert(input_path, output_path, step.input_ext, step.output_ext, **options)
+            except (ConversionCancelledError, QuarantinedInputError):
+                raise
+            except FileConversionError:
+                record_failure(step.input_ext, step.output_ext, converter, size)
+                if attempt == len(engines):
+                    raise
+                continue
+            record_latency(step.input_ext, step.output_ext, converter, size, time.perf_counter() - started)
+            return converter
+
+    @staticmethod
+    def _run_stream_step(step, src, dst, options: dict):
+        """同 _run_step；输入输出流都能 seek 时才能换用备选引擎重试"""
+        size = _stream_size(src)
+        src_start = src.tell() if _seekable(src) else None
+        dst_start = dst.tell() if _seekable(dst) else None
+        engines = (step.converter,) + tuple(step.alternatives)
+        if src_start is None or dst_start is None:
+            engines = engines[:1]
+        for attempt, converter in enumerate(engines, 1):
+            started = time.perf_counter()
+            try:
+                with metrics.stage(f'step:{step.input_ext}->{step.output_ext}',
+                                   converter=converter.__name__, attempt=attempt):
+                    converter.convert_stream(src, dst, step.input_ext, step.output_ext, **options)
+            except (ConversionCancelledError, QuarantinedInputError):
+                raise
+            except FileConversionError:
+                record_failure(step.input_ext, step.output_ext, converter, size)
+                if attempt == len(engines):
+                    raise
+                src.seek(src_start)
+                dst.seek(dst_start)
+                dst.truncate()
+                continue
+            record_latency(step.input_ext, step.output_ext, converter, size, time.perf_counter() - started)
+            return converter
+
+    @staticmethod
+    def _release_output(output_path: str):
+        """
+        输出文件如果与缓存条目共享硬链接，先断开，避免覆盖写入时污染缓存
+        硬链接模式下取回的输出是只读的，缓存条目淘汰后也要先删除才能重新写入
+        """
+        try:
+            st = os.stat(output_path)
+            if st.st_nlink > 1 or not st.st_mode & stat.S_IWUSR:
+                os.unlink(output_path)
+        except FileNotFoundError:
+            pass
+
+
+def _group_steps(steps: list) -> list:
+    """同一输入上、同一转换器能共用解析结果的步骤（见 BaseConverter.shared_outputs）合为一组，其余各自一组"""
+    groups = {}
+    for step in steps:
+        key = step.converter if step.output_ext in step.converter.shared_outputs(step.input_ext) else step
+        groups.setdefault(key, []).append(step)
+    return list(groups.values())
+
+
+def _job_limits(subject, options: dict):
+    """本次转换的外部进程限制"""
+    from core.backends.process import job_limits
+    return job_limits(subject=subject, timeout=options.get('timeout'), cpu_timeout=options.get('cpu_timeout'),
+                      memory_mb=options.get('memory_mb'))
+
+
+def _file_size(path: str):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def _seekable(stream) -> bool:
+    seekable = getattr(stream, 'seekable', None)
+    return bool(seekable and seekable())
+
+
+def _stream_size(stream):
+    """可 seek 的流剩余的字节数，否则为 None"""
+    if not _seekable(stream):
+        return None
+    position = stream.tell()
+    size = stream.seek(0, os.SEEK_END) - position
+    stream.seek(position)
+    return size
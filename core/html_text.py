@@ -0,0 +1,116 @@
+# core/html_text.py
+# 分块把 HTML 转为文本：按固定大小读取字节、增量解码、喂给 html2text，产出的文本边生成边写出
+import codecs
+import re
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+# 只在文件开头这么多字节里找 BOM 和 charset 声明
+_SNIFF_SIZE = 4096
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_.:-]+)', re.IGNORECASE)
+_XML_ENCODING = re.compile(rb'<\?xml[^>]+encoding\s*=\s*["\']([A-Za-z0-9_.:-]+)', re.IGNORECASE)
+# 网页里声明的旧编码按浏览器的习惯换成它们的超集
+_ENCODING_ALIASES = {
+    'gb2312': 'gb18030',
+    'gbk': 'gb18030',
+    'iso-8859-1': 'cp1252',
+    'latin-1': 'cp1252',
+    'ascii': 'cp1252',
+    'us-ascii': 'cp1252',
+}
+
+
+def detect_encoding(head: bytes, default: str = 'utf-8'):
+    """
+    根据文件开头的字节判断编码：BOM 优先，其次 <meta charset> / XML 声明
+    :return: (编码名, BOM 长度)
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+
+    match = _META_CHARSET.search(head) or _XML_ENCODING.search(head)
+    if match:
+        declared = match.group(1).decode('ascii').lower()
+        declared = _ENCODING_ALIASES.get(declared, declared)
+        try:
+            return codecs.lookup(declared).name, 0
+        except LookupError:
+            pass
+    return default, 0
+
+
+class _TextWriter:
+    """
+    html2text 的 out 回调：攒到段落边界再按 html2text 的规则折行写出
+    （html2text 只在 handle() 里对整篇结果做折行和 &nbsp; 替换，流式输出需要自己处理）
+    """
+
+    def __init__(self, parser, out):
+        self.parser = parser
+        self.out = out
+        self.nbsp = '\xa0' if parser.unicode_snob else ' '
+        self.pending = []
+        self.pending_size = 0
+
+    def __call__(self, text: str):
+        if not text:
+            return
+        self.parser.lastWasNL = text[-1] == '\n'
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if '\n\n' in text or self.pending_size > DEFAULT_CHUNK_SIZE:
+            self.flush(final=False)
+
+    def flush(self, final: bool = True):
+        text = ''.join(self.pending)
+        if not final:
+            cut = text.rfind('\n\n')
+            if cut < 0:
+                return
+            text, rest = text[:cut + 2], text[cut + 2:]
+            self.pending, self.pending_size = [rest], len(rest)
+        else:
+            self.pending, self.pending_size = [], 0
+        text = text.replace('&nbsp_place_holder;', self.nbsp)
+        self.out.write(self.parser.optwrap(text))
+
+
+def html_to_text(input_path: str, out, chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str = None) -> str:
+    """
+    流式转换 HTML 文件为文本写入 out，内存占用与文件大小无关
+    :param encoding: 缺省时从 BOM / meta charset 检测，检测不到按 UTF-8
+    :return: 实际使用的编码
+    """
+    with open(input_path, 'rb') as f:
+        return html_stream_to_text(f, out, chunk_size, encoding)
+
+
+def html_stream_to_text(src, out, chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str = None) -> str:
+    """同 html_to_text，输入为二进制文件对象（不需要支持 seek）"""
+    import html2text
+
+    head = src.read(_SNIFF_SIZE)
+    detected, bom_length = detect_encoding(head)
+    encoding = encoding or detected
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    parser = html2text.HTML2Text()
+    writer = _TextWriter(parser, out)
+    parser.out = writer
+
+    data = head[bom_length:]
+    while data:
+        parser.feed(decoder.decode(data))
+        data = src.read(chunk_size)
+    parser.feed(decoder.decode(b'', final=True))
+    parser.finish()
+    writer.flush()
+    return encoding
@@ -0,0 +1,185 @@
+# core/latency.py
+# 各转换引擎的实测耗时：按输入大小分桶的滚动直方图，持久化到缓存目录，供工厂挑选最快的引擎
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+# 输入大小分桶的上界（字节）：<100KB、<1MB、<10MB、<100MB、更大
+SIZE_BUCKETS = (100 * 1024, 1024 * 1024, 10 * 1024 * 1024, 100 * 1024 * 1024)
+# 耗时直方图的分箱上界：10ms 起每箱翻倍，约到 3 小时
+LATENCY_EDGES = tuple(0.01 * 2 ** k for k in range(21))
+# 每次记录前旧计数乘以的衰减系数，相当于只看最近约 20 次
+_DECAY = 0.95
+# 衰减后的样本数少于这个值时，仍使用声明的代价
+MIN_SAMPLES = 2.5
+# 样本随时间衰减的半衰期（秒）：长时间没有新样本的统计逐渐作废，退回声明的代价，
+# 这样因失败被排到后面、因此不再被选中的引擎过一段时间会重新得到尝试
+HALF_LIFE = 6 * 3600.0
+# 写回文件的最短间隔（秒）
+_SAVE_INTERVAL = 30.0
+
+
+def size_bucket(size: Optional[int]) -> Optional[int]:
+    """输入大小所在的分桶序号；大小未知时返回 None"""
+    if size is None:
+        return None
+    return bisect.bisect_right(SIZE_BUCKETS, size)
+
+
+class LatencyHistogram:
+    """指数衰减的耗时直方图（每次记录衰减一次，并随时间按 HALF_LIFE 衰减），取分位数作为耗时估计"""
+
+    __slots__ = ('counts', 'updated')
+
+    def __init__(self, counts=None, updated: float = None):
+        self.counts = list(counts) if counts else [0.0] * (len(LATENCY_EDGES) + 1)
+        self.updated = time.time() if updated is None else updated
+
+    def age(self, now: float = None):
+        """按距上次更新的时间衰减计数"""
+        now = time.time() if now is None else now
+        if now > self.updated:
+            factor = 0.5 ** ((now - self.updated) / HALF_LIFE)
+            self.counts = [count * factor for count in self.counts]
+            self.updated = now
+
+    def add(self, seconds: float):
+        self.age()
+        self.counts = [count * _DECAY for count in self.counts]
+        self.counts[bisect.bisect_left(LATENCY_EDGES, seconds)] += 1.0
+
+    @property
+    def total(self) -> float:
+        return sum(self.counts)
+
+    def quantile(self, q: float = 0.5) -> Optional[float]:
+        """分位数所在分箱的几何中点；没有样本时返回 None"""
+        total = self.total
+        if total <= 0:
+            return None
+        target, cumulative = total * q, 0.0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                break
+        if index == 0:
+            return LATENCY_EDGES[0] / 2
+        if index == len(LATENCY_EDGES):
+            return LATENCY_EDGES[-1] * 2
+        return (LATENCY_EDGES[index - 1] * LATENCY_EDGES[index]) ** 0.5
+
+
+def default_latency_path() -> Optional[str]:
+    """FILECONVERT_LATENCY_FILE，设为空字符串时不持久化；默认放在缓存目录下"""
+    configured = os.environ.get('FILECONVERT_LATENCY_FILE')
+    if configured is not None:
+        return configured or None
+    from core.cache import default_cache_dir
+    return os.path.join(default_cache_dir(), 'engine_latency.json')
+
+
+class LatencyStore:
+    """
+    {(输入格式, 输出格式, 引擎名, 大小分桶): LatencyHistogram}
+    多个进程共用一个文件：写回时重新读取文件，只覆盖本进程更新过的条目
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._histograms = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._last_save = time.monotonic()
+        if path:
+            self._histograms = self._read()
+
+    @staticmethod
+    def _key(input_ext: str, output_ext: str, engine: str, bucket: int) -> str:
+        return f'{input_ext}->{output_ext}|{engine}|{bucket}'
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        histograms = {}
+        for key, entry in data.items():
+            # 旧格式只有计数列表，没有更新时间，按刚刚更新处理
+            counts, updated = (entry.get('counts'), entry.get('updated')) if isinstance(entry, dict) else (entry, None)
+            if isinstance(counts, list) and len(counts) == len(LATENCY_EDGES) + 1:
+                histograms[key] = LatencyHistogram(counts, updated)
+        return histograms
+
+    def estimate(self, input_ext: str, output_ext: str, engine: str, size: Optional[int]) -> Optional[float]:
+        """该引擎在这个大小分桶里的耗时中位数；样本不足时返回 None"""
+        bucket = size_bucket(size)
+        if bucket is None:
+            return None
+        with self._lock:
+            histogram = self._histograms.get(self._key(input_ext, output_ext, engine, bucket))
+            if histogram is None:
+                return None
+            histogram.age()
+            if histogram.total < MIN_SAMPLES:
+                return None
+            return histogram.quantile(0.5)
+
+    def record(self, input_ext: str, output_ext: str, engine: str, size: Optional[int], seconds: float):
+        bucket = size_bucket(size)
+        if bucket is None:
+            return
+        key = self._key(input_ext, output_ext, engine, bucket)
+        with self._lock:
+            self._histograms.setdefault(key, LatencyHistogram()).add(seconds)
+            self._dirty.add(key)
+            due = time.monotonic() - self._last_save >= _SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def save(self):
+        """原子地写回文件（合并其他进程写入的条目）"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            merged = self._read()
+            merged.update({key: self._histograms[key] for key in self._dirty})
+            self._dirty.clear()
+            self._last_save = time.monotonic()
+            data = {key: {'counts': [round(count, 4) for count in histogram.counts], 'updated': histogram.updated}
+                    for key, histogram in merged.items()}
+        temp_path = None
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError:
+            # 统计信息写不进去不影响转换
+            pass
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_latency_store() -> LatencyStore:
+    """进程内共享的耗时统计，进程退出时写回"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LatencyStore(default_latency_path())
+            atexit.register(_store.save)
+        return _store
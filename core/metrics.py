@@ -0,0 +1,268 @@
+# core/metrics.py
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，子进程 CPU 时间记为 None
+    resource = None
+
+# 当前所在的转换：{'id': ..., 'pair': 'doc->pdf'}
+_current_conversion = contextvars.ContextVar('fileconvert_conversion', default=None)
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+def _children_cpu() -> Optional[float]:
+    """已回收子进程累计的 CPU 时间（用户态 + 内核态）"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _file_size(path: Optional[str]) -> Optional[int]:
+    try:
+        return os.path.getsize(path) if path else None
+    except OSError:
+        return None
+
+
+def add_sink(sink):
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def clear_sinks():
+    """清空本进程的输出端（进程池工作进程里调用，避免 fork 继承父进程的输出端）"""
+    with _sinks_lock:
+        _sinks.clear()
+
+
+def emit(record: dict):
+    """把一条阶段记录发给所有输出端"""
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        sink.emit(record)
+
+
+def flush():
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        flush_sink = getattr(sink, 'flush', None)
+        if flush_sink:
+            flush_sink()
+
+
+@contextmanager
+def conversion(pair: str):
+    """标记一次转换，期间产生的阶段记录都带上同一个转换 id 和格式对"""
+    token = _current_conversion.set({'id': uuid.uuid4().hex[:12], 'pair': pair})
+    try:
+        yield
+    finally:
+        _current_conversion.reset(token)
+
+
+@contextmanager
+def stage(name: str, input_path: str = None, output_path: str = None, **attrs):
+    """
+    统计一个阶段的耗时、本进程 CPU 时间、子进程 CPU 时间和读写字节数
+    多线程并发时子进程 CPU 时间可能计入同时结束的其他阶段
+    :return: 可以在阶段内追加字段的 dict（例如 record['bytes_out'] = n）
+    """
+    record = {'stage': name, **attrs}
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    children_started = _children_cpu()
+    ok = True
+    try:
+        yield record
+    except BaseException as e:
+        ok = False
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        children_ended = _children_cpu()
+        record.setdefault('bytes_in', _file_size(input_path))
+        record.setdefault('bytes_out', _file_size(output_path))
+        record.update({
+            'seconds': time.perf_counter() - started,
+            'cpu_seconds': time.process_time() - cpu_started,
+            'child_cpu_seconds': None if children_started is None else children_ended - children_started,
+            'ok': ok,
+        })
+        emit(_with_context(record))
+
+
+def record_stage(name: str, seconds: float, **fields):
+    """记录在别处（例如进程池工作进程里）测得的阶段"""
+    emit(_with_context({'stage': name, 'seconds': seconds, **fields}))
+
+
+def replay(records):
+    """重新发出在工作进程里收集到的记录，补上当前转换的 id 和格式对"""
+    for record in records:
+        emit(_with_context(record))
+
+
+def _with_context(record: dict) -> dict:
+    current = _current_conversion.get()
+    record = dict(record)
+    record.setdefault('ts', time.time())
+    if current:
+        record.setdefault('conversion', current['id'])
+        record.setdefault('pair', current['pair'])
+    return record
+
+
+class ListSink:
+    """把记录收集到列表里（批量模式用来把工作进程的记录带回父进程）"""
+
+    def __init__(self):
+        self.records: List[dict] = []
+
+    def emit(self, record: dict):
+        self.records.append(record)
+
+
+@contextmanager
+def collect():
+    """在当前进程里临时收集所有阶段记录"""
+    sink = ListSink()
+    add_sink(sink)
+    try:
+        yield sink.records
+    finally:
+        remove_sink(sink)
+
+
+class JsonLinesSink:
+    """每条记录追加一行 JSON"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+
+    def emit(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+class _Aggregator:
+    """按 (格式对, 阶段) 汇总次数、耗时、CPU 时间和字节数"""
+
+    FIELDS = ('seconds', 'cpu_seconds', 'child_cpu_seconds', 'bytes_in', 'bytes_out')
+
+    def __init__(self):
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict):
+        key = (record.get('pair') or '-', record['stage'])
+        with self._lock:
+            totals = self.totals.setdefault(key, dict({'count': 0, 'errors': 0, 'max_seconds': 0.0},
+                                                      **{field: 0 for field in self.FIELDS}))
+            totals['count'] += 1
+            if record.get('ok') is False:
+                totals['errors'] += 1
+            totals['max_seconds'] = max(totals['max_seconds'], record.get('seconds') or 0.0)
+            for field in self.FIELDS:
+                totals[field] += record.get(field) or 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: dict(value) for key, value in self.totals.items()}
+
+
+class PrometheusTextfileSink(_Aggregator):
+    """
+    汇总后写成 Prometheus 文本格式（供 node_exporter textfile collector 读取）
+    最多每 interval 秒重写一次文件，退出前调用 flush() 写入最终值
+    """
+
+    def __init__(self, path: str, interval: float = 5.0):
+        super().__init__()
+        self.path = path
+        self.interval = interval
+        self._last_write = 0.0
+
+    def emit(self, record: dict):
+        super().emit(record)
+        if time.monotonic() - self._last_write >= self.interval:
+            self.flush()
+
+    def flush(self):
+        lines = []
+        metrics = (
+            ('fileconvert_stage_total', 'counter', '阶段执行次数', 'count'),
+            ('fileconvert_stage_errors_total', 'counter', '阶段失败次数', 'errors'),
+            ('fileconvert_stage_seconds_total', 'counter', '阶段累计耗时', 'seconds'),
+            ('fileconvert_stage_cpu_seconds_total', 'counter', '阶段累计本进程CPU时间', 'cpu_seconds'),
+            ('fileconvert_stage_child_cpu_seconds_total', 'counter', '阶段累计子进程CPU时间', 'child_cpu_seconds'),
+            ('fileconvert_stage_input_bytes_total', 'counter', '阶段累计读取字节数', 'bytes_in'),
+            ('fileconvert_stage_output_bytes_total', 'counter', '阶段累计写出字节数', 'bytes_out'),
+        )
+        snapshot = self.snapshot()
+        for name, kind, help_text, field in metrics:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (pair, stage_name), totals in sorted(snapshot.items()):
+                lines.append(f'{name}{{pair="{pair}",stage="{stage_name}"}} {totals[field]}')
+
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, self.path)
+        self._last_write = time.monotonic()
+
+
+class SummarySink(_Aggregator):
+    """命令行 --profile 的汇总表"""
+
+    def format(self) -> str:
+        rows = [('格式对', '阶段', '次数', '总耗时(s)', '最长(s)', 'CPU(s)', '子进程CPU(s)', '读取(MB)', '写出(MB)')]
+        for (pair, stage_name), totals in sorted(self.snapshot().items(), key=lambda item: -item[1]['seconds']):
+            rows.append((
+                pair, stage_name, str(totals['count']),
+                f"{totals['seconds']:.3f}", f"{totals['max_seconds']:.3f}",
+                f"{totals['cpu_seconds']:.3f}", f"{totals['child_cpu_seconds']:.3f}",
+                f"{totals['bytes_in'] / 1024 / 1024:.2f}", f"{totals['bytes_out'] / 1024 / 1024:.2f}",
+            ))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        return '\n'.join('  '.join(cell.ljust(widths[i]) for i, cell in enumerate(row)) for row in rows)
+
+
+def configure_from_env(worker: bool = False):
+    """
+    按环境变量配置输出端：FILECONVERT_METRICS_JSONL、FILECONVERT_METRICS_PROM
+    工作进程里 Prometheus 文件名带上 pid，避免多个进程互相覆盖
+    """
+    jsonl_path = os.environ.get('FILECONVERT_METRICS_JSONL')
+    if jsonl_path:
+        add_sink(JsonLinesSink(jsonl_path))
+    prom_path = os.environ.get('FILECONVERT_METRICS_PROM')
+    if prom_path:
+        if worker:
+            base, ext = os.path.splitext(prom_path)
+            prom_path = f'{base}.{os.getpid()}{ext}'
+        add_sink(PrometheusTextfileSink(prom_path))
@@ -0,0 +1,126 @@
+# core/pdf_pages.py
+# PDF 页面索引：逐页统计文本字符数和图像覆盖率，把每页分为文本页、图像页（扫描页）和空白页，
+# 供转换时按页选择直接提取或OCR；索引按文件缓存，同一文件的多次转换只计算一次
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional
+
+# 每页至少有这么多个可见字符才算有文本层
+TEXT_MIN_CHARS = 20
+# 没有文本层、且图像覆盖页面的比例不低于它时视为扫描页
+IMAGE_MIN_COVERAGE = 0.3
+# 索引格式变化时递增，旧的缓存自动失效
+_INDEX_VERSION = 1
+
+
+@dataclass
+class PageInfo:
+    number: int
+    chars: int
+    image_coverage: float
+
+    @property
+    def kind(self) -> str:
+        """text 直接提取；image 需要OCR；blank 既没有文本也没有大图"""
+        if self.chars >= TEXT_MIN_CHARS:
+            return 'text'
+        if self.image_coverage >= IMAGE_MIN_COVERAGE:
+            return 'image'
+        return 'blank'
+
+
+def _measure(container, page_bbox, counts: list):
+    """累计可见字符数和图像面积（图像框裁剪到页面内）"""
+    from pdfminer.layout import LTChar, LTImage
+
+    x0, y0, x1, y1 = page_bbox
+    for item in container:
+        if isinstance(item, LTChar):
+            if not item.get_text().isspace():
+                counts[0] += 1
+        elif isinstance(item, LTImage):
+            width = min(item.x1, x1) - max(item.x0, x0)
+            height = min(item.y1, y1) - max(item.y0, y0)
+            if width > 0 and height > 0:
+                counts[1] += width * height
+        elif hasattr(item, '__iter__'):
+            # LTFigure（表单 XObject 或图像的外框）
+            _measure(item, page_bbox, counts)
+
+
+def scan_pages(input_path: str) -> List[PageInfo]:
+    """
+    解释每页的内容流但不做版面分析（pdfminer，laparams=None），只统计字符和图像
+    比任何一种文本提取都便宜，也不栅格化
+    """
+    from pdfminer.converter import PDFPageAggregator
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    manager = PDFResourceManager(caching=True)
+    device = PDFPageAggregator(manager, laparams=None)
+    interpreter = PDFPageInterpreter(manager, device)
+    index = []
+    with open(input_path, 'rb') as f:
+        for number, page in enumerate(PDFPage.get_pages(f), start=1):
+            interpreter.process_page(page)
+            layout = device.get_result()
+            counts = [0, 0.0]
+            _measure(layout, layout.bbox, counts)
+            area = layout.width * layout.height
+            index.append(PageInfo(number, counts[0], min(1.0, counts[1] / area) if area > 0 else 0.0))
+    return index
+
+
+def _index_path(input_path: str) -> Optional[str]:
+    """按路径、大小和修改时间标识文件，文件被修改后自动重新计算"""
+    try:
+        st = os.stat(input_path)
+    except OSError:
+        return None
+    from core.cache import default_cache_dir
+    identity = f'{os.path.realpath(input_path)}|{st.st_size}|{st.st_mtime_ns}'
+    name = hashlib.sha256(identity.encode('utf-8')).hexdigest()[:32] + '.json'
+    return os.path.join(default_cache_dir(), 'page-index', name)
+
+
+def get_page_index(input_path: str) -> List[PageInfo]:
+    """读取缓存的页面索引，没有时扫描并写入缓存"""
+    path = _index_path(input_path)
+    if path is not None:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == _INDEX_VERSION:
+                return [PageInfo(number, chars, coverage)
+                        for number, (chars, coverage) in enumerate(data['pages'], start=1)]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    index = scan_pages(input_path)
+    if path is not None:
+        temp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'version': _INDEX_VERSION,
+                           'pages': [[info.chars, round(info.image_coverage, 4)] for info in index]}, f)
+            os.replace(temp_path, path)
+        except OSError:
+            # 缓存写不进去不影响转换
+            pass
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.unlink(temp_path)
+    return index
+
+
+def image_pages(index: List[PageInfo], page_numbers=None) -> List[int]:
+    """需要OCR的页码（限定在 page_numbers 内）"""
+    wanted = set(page_numbers) if page_numbers is not None else None
+    return [info.number for info in index
+            if info.kind == 'image' and (wanted is None or info.number in wanted)]
@@ -1,15 +1,316 @@
 # core/registry.py
+import heapq
+import importlib
+import itertools
+from collections import namedtuple
 from core.exceptions import UnsupportedFormatError
 
+# 转换图：{input_ext: {output_ext: [Engine, ...]}}，同一转换对可以有多个引擎
 _converter_registry = {}
 
-def register_converter(input_ext, output_ext, converter_class):
-    if input_ext not in _converter_registry:
-        _converter_registry[input_ext] = {}
-    _converter_registry[input_ext][output_ext] = converter_class
+# 质量档位，由低到高；选择引擎时只考虑不低于要求档位的引擎
+QUALITY_TIERS = ('draft', 'standard', 'high')
+DEFAULT_QUALITY = 'standard'
+# 不作为中间格式的格式：从自己渲染出来的 PDF 再提取文本或还原 DOCX 既慢又丢失结构，
+# 规划路径时 pdf 出发的转换只在输入本身就是 PDF 时使用（pdf 仍可以是最终输出）
+TERMINAL_FORMATS = frozenset({'pdf'})
+# 引擎失败时记入的耗时（秒），让它在随后一段时间里排到后面
+_FAILURE_PENALTY = 600.0
 
-def get_converter(input_ext, output_ext):
-    try:
-        return _converter_registry[input_ext][output_ext]
-    except KeyError:
-        raise UnsupportedFormatError(f"不支持从 {input_ext} 到 {output_ext} 的转换")
\ No newline at end of file
+# alternatives: 同一步骤的备选引擎（按预估耗时排序），首选引擎失败时依次尝试
+ConversionStep = namedtuple('ConversionStep', ['input_ext', 'output_ext', 'converter', 'alternatives'],
+                            defaults=((),))
+
+
+class Engine:
+    """转换对上的一个引擎：转换器类（或 'module:ClassName' 引用）、质量档位和声明的代价"""
+
+    __slots__ = ('name', 'converter', 'tier', 'cost')
+
+    def __init__(self, name, converter, tier, cost):
+        self.name = name
+        self.converter = converter
+        self.tier = tier
+        self.cost = cost
+
+
+def engine_name(converter) -> str:
+    """引擎名即转换器类名，耗时统计按它区分"""
+    if isinstance(converter, str):
+        return converter.rsplit(':', 1)[-1]
+    return converter.__name__
+
+def register_converter(input_ext, output_ext, converter_class, cost=None, tier=DEFAULT_QUALITY):
+    """
+    注册一条转换边上的一个引擎，同一转换器重复注册时替换原来的
+    :param converter_class: 转换器类，或 'module:ClassName' 形式的引用（第一次使用时才导入）
+    :param cost: 缺省时取转换器声明的 conversion_cost
+    :param tier: 输出质量档位，见 QUALITY_TIERS
+    """
+    if tier not in QUALITY_TIERS:
+        raise ValueError(f"未知的质量档位: {tier}")
+    if cost is None:
+        declared = getattr(converter_class, 'conversion_cost', None)
+        cost = declared(input_ext, output_ext) if declared else 1.0
+    name = engine_name(converter_class)
+    engines = _converter_registry.setdefault(input_ext, {}).setdefault(output_ext, [])
+    engines[:] = [engine for engine in engines if engine.name != name]
+    engines.append(Engine(name, converter_class, tier, cost))
+
+def _resolve(engine):
+    """把字符串引用解析为转换器类（此时才导入转换器模块）"""
+    if isinstance(engine.converter, str):
+        module_name, class_name = engine.converter.split(':')
+        engine.converter = getattr(importlib.import_module(module_name), class_name)
+    return engine.converter
+
+def _is_available(engine) -> bool:
+    """引擎依赖的可选模块是否已安装"""
+    available = getattr(_resolve(engine), 'is_available', None)
+    return available() if available else True
+
+def get_engines(input_ext, output_ext, resolve=True):
+    """转换对上注册的全部引擎 [Engine, ...]"""
+    engines = list(_converter_registry.get(input_ext, {}).get(output_ext, []))
+    if resolve:
+        for engine in engines:
+            _resolve(engine)
+    return engines
+
+def get_converter(input_ext, output_ext, quality=None):
+    """转换对上预估最快的可用引擎"""
+    candidates = _candidates(input_ext, output_ext, None, quality or DEFAULT_QUALITY, True, strict=False)
+    if not candidates:
+        raise UnsupportedFormatError(f"不支持从 {input_ext} 到 {output_ext} 的转换")
+    return _resolve(candidates[0][1])
+
+def get_supported_conversions():
+    """返回所有已注册的转换 {input_ext: [output_ext, ...]}"""
+    return {input_ext: sorted(outputs) for input_ext, outputs in _converter_registry.items()}
+
+def record_latency(input_ext, output_ext, converter, size, seconds):
+    """记录引擎的一次实测耗时（按输入大小分桶）"""
+    from core.latency import get_latency_store
+    get_latency_store().record(input_ext, output_ext, engine_name(converter), size, seconds)
+
+def record_failure(input_ext, output_ext, converter, size):
+    """
+    引擎转换失败：记一次很长的耗时，之后优先使用其他引擎
+    统计随时间衰减（见 core.latency.HALF_LIFE），样本作废后按声明的代价重新参与选择
+    """
+    record_latency(input_ext, output_ext, converter, size, _FAILURE_PENALTY)
+
+def get_cost(input_ext, output_ext, engine, size=None):
+    """
+    引擎的预估耗时：该大小分桶有足够实测样本时用实测中位数；
+    否则用声明值，按同一分桶里有实测的引擎的 实测/声明 比例缩放，使两者可以比较
+    """
+    from core.latency import get_latency_store
+    store = get_latency_store()
+    measured = store.estimate(input_ext, output_ext, engine.name, size)
+    if measured is not None:
+        return measured
+    return engine.cost * _declared_scale(store, size)
+
+def _declared_scale(store, size):
+    """
+    声明值按典型文档估计，文件大或机器慢时普遍偏低：取同一大小分桶里各引擎 实测/声明 的中位数
+    被失败惩罚主导的实测值不参与；没有可用实测时为 1
+    """
+    ratios = []
+    for input_ext, outputs in _converter_registry.items():
+        for output_ext, engines in outputs.items():
+            for engine in engines:
+                measured = store.estimate(input_ext, output_ext, engine.name, size)
+                if measured is not None and measured < _FAILURE_PENALTY / 2 and engine.cost > 0:
+                    ratios.append(measured / engine.cost)
+    if not ratios:
+        return 1.0
+    ratios.sort()
+    return ratios[len(ratios) // 2]
+
+def _candidates(input_ext, output_ext, size, quality, resolve, strict=True):
+    """
+    满足质量要求的引擎 [(预估耗时, Engine), ...]，按耗时排序；不导入转换器时不检查可用性
+    :param strict: 为 False 时，没有引擎达到要求的转换对取档位最高的那些
+    """
+    engines = _converter_registry.get(input_ext, {}).get(output_ext, [])
+    if resolve and len(engines) > 1:
+        engines = [engine for engine in engines if _is_available(engine)]
+    if not engines:
+        return []
+    minimum = QUALITY_TIERS.index(quality)
+    if not strict:
+        minimum = min(minimum, max(QUALITY_TIERS.index(engine.tier) for engine in engines))
+    candidates = [
+        (get_cost(input_ext, output_ext, engine, size), index, engine)
+        for index, engine in enumerate(engines)
+        if QUALITY_TIERS.index(engine.tier) >= minimum
+    ]
+    candidates.sort(key=lambda item: item[:2])
+    return [(cost, engine) for cost, _, engine in candidates]
+
+def _search(input_ext, output_ext, size, quality, resolve, strict):
+    """Dijkstra，返回路径 [(起点, 终点, 该边的候选引擎), ...]，不可达时返回 None"""
+    best = {input_ext: 0.0}
+    previous = {}
+    edges = {}
+    heap = [(0.0, input_ext)]
+    while heap:
+        cost, node = heapq.heappop(heap)
+        if node == output_ext:
+            break
+        if cost > best.get(node, float('inf')):
+            continue
+        if node != input_ext and node in TERMINAL_FORMATS:
+            continue
+        for next_ext in _converter_registry.get(node, {}):
+            candidates = _candidates(node, next_ext, size, quality, resolve, strict)
+            if not candidates:
+                continue
+            next_cost = cost + candidates[0][0]
+            if next_cost < best.get(next_ext, float('inf')):
+                best[next_ext] = next_cost
+                previous[next_ext] = node
+                edges[(node, next_ext)] = candidates
+                heapq.heappush(heap, (next_cost, next_ext))
+
+    if output_ext not in previous:
+        return None
+    path = []
+    node = output_ext
+    while node != input_ext:
+        source = previous[node]
+        path.append((source, node, edges[(source, node)]))
+        node = source
+    path.reverse()
+    return path
+
+def plan_route(input_ext, output_ext, resolve=True, size=None, quality=None):
+    """
+    在转换图上求预估耗时最小的路径，每条边取满足质量要求的最快引擎
+    先只用达到质量要求的引擎规划；走不通时再放宽为各转换对档位最高的引擎
+    :param resolve: 为 False 时不导入转换器，step.converter 可能是字符串引用
+    :param size: 输入文件大小，用于按大小分桶查实测耗时（中间步骤也按它估计）
+    :param quality: 最低质量档位，缺省为 DEFAULT_QUALITY
+    :return: [ConversionStep, ...]
+    """
+    if input_ext == output_ext:
+        raise UnsupportedFormatError(f"输入和输出格式相同: {input_ext}")
+    quality = quality or DEFAULT_QUALITY
+    if quality not in QUALITY_TIERS:
+        raise ValueError(f"未知的质量档位: {quality}")
+
+    path = _search(input_ext, output_ext, size, quality, resolve, strict=True) \
+        or _search(input_ext, output_ext, size, quality, resolve, strict=False)
+    if path is None:
+        raise UnsupportedFormatError(f"不支持从 {input_ext} 到 {output_ext} 的转换")
+
+    route = []
+    for source, target, candidates in path:
+        converters = [_resolve(engine) if resolve else engine.converter for _, engine in candidates]
+        route.append(ConversionStep(source, target, converters[0], tuple(converters[1:])))
+    return route
+
+# 目标不多于这么多个时比较所有规划顺序，否则按请求的顺序
+_MAX_ORDERED_TARGETS = 6
+
+def _fanout_cost(available, resolve):
+    """
+    多目标计划的总预估耗时：各格式的生成代价之和，
+    同一起点上能由同一转换器一次生成的几个格式（见 BaseConverter.shared_outputs）只计其中最大的
+    """
+    groups = {}
+    for node, route in available.items():
+        if not route:
+            continue
+        source, _, candidates = route[-1]
+        cost, engine = candidates[0]
+        key = (source, node)
+        if resolve:
+            converter = _resolve(engine)
+            if node in converter.shared_outputs(source):
+                key = (source, converter)
+        groups[key] = max(groups.get(key, 0.0), cost)
+    return sum(groups.values())
+
+def plan_routes(input_ext, output_exts, resolve=True, size=None, quality=None):
+    """
+    一个输入转换为多个格式的计划，各目标尽量共用中间结果：
+    按某个顺序逐个规划目标，每个目标从已经会生成的格式（输入、前面目标路径上的各个格式）中挑增量耗时最小的出发；
+    比较各种顺序的总预估耗时（见 _fanout_cost）取最小者，例如 doc 转 html/txt 时两者都经 docx，doc->docx 只做一次
+    参数同 plan_route
+    :return: {output_ext: [ConversionStep, ...]}，按 output_exts 的顺序；共用的步骤是同一个对象
+    """
+    quality = quality or DEFAULT_QUALITY
+    if quality not in QUALITY_TIERS:
+        raise ValueError(f"未知的质量档位: {quality}")
+    targets = list(dict.fromkeys(output_exts))
+    if input_ext in targets:
+        raise UnsupportedFormatError(f"输入和输出格式相同: {input_ext}")
+
+    paths = {}
+
+    def _path(source, target):
+        if (source, target) not in paths:
+            paths[(source, target)] = _search(source, target, size, quality, resolve, strict=True) \
+                or _search(source, target, size, quality, resolve, strict=False)
+        return paths[(source, target)]
+
+    best = None
+    orders = itertools.permutations(targets) if len(targets) <= _MAX_ORDERED_TARGETS else [targets]
+    for order in orders:
+        # 已经会生成的格式 -> 到它的路径 [(起点, 终点, 候选引擎), ...]
+        available = {input_ext: []}
+        for target in order:
+            if target in available:
+                continue
+            choice = None
+            for source, prefix in available.items():
+                if source != input_ext and source in TERMINAL_FORMATS:
+                    continue
+                path = _path(source, target)
+                if path is None:
+                    continue
+                cost = sum(candidates[0][0] for _, _, candidates in path)
+                if choice is None or cost < choice[0]:
+                    choice = (cost, prefix, path)
+            if choice is None:
+                raise UnsupportedFormatError(f"不支持从 {input_ext} 到 {target} 的转换")
+            _, route, path = choice
+            for edge in path:
+                # 经过已经会生成的格式时（代价相同的另一条路）改从它接着走，保证每个格式只生成一次
+                route = available[edge[1]] if edge[1] in available else route + [edge]
+                available.setdefault(edge[1], route)
+        total = _fanout_cost(available, resolve)
+        if best is None or total < best[0]:
+            best = (total, available)
+
+    steps = {}
+    routes = {}
+    for target in targets:
+        route = []
+        for source, node, candidates in best[1][target]:
+            if node not in steps:
+                converters = [_resolve(engine) if resolve else engine.converter for _, engine in candidates]
+                steps[node] = ConversionStep(source, node, converters[0], tuple(converters[1:]))
+            route.append(steps[node])
+        routes[target] = route
+    return routes
+
+def get_reachable_conversions():
+    """返回所有可达（含多步）的转换 {input_ext: [output_ext, ...]}"""
+    reachable = {}
+    for input_ext in _converter_registry:
+        seen = set()
+        stack = [input_ext]
+        while stack:
+            node = stack.pop()
+            if node != input_ext and node in TERMINAL_FORMATS:
+                continue
+            for next_ext in _converter_registry.get(node, {}):
+                if next_ext not in seen and next_ext != input_ext:
+                    seen.add(next_ext)
+                    stack.append(next_ext)
+        reachable[input_ext] = sorted(seen)
+    return reachable
@@ -0,0 +1,439 @@
+# core/shard.py
+# 多节点分片批量转换：任务清单切成分片放在共享目录里，各节点上的工作进程用租约文件认领分片，
+# 转换期间心跳续约；工作进程退出或节点宕机后租约过期，分片由其他工作进程接手
+#
+# 共享目录结构（各节点须把共享文件系统挂载在相同路径，任务里的输入输出路径都是绝对路径）：
+#   manifest/job.json          任务参数（目标格式、转换参数、租约有效期）
+#   manifest/00000.jsonl       分片：每行一个 BatchJob
+#   leases/00000.lease         租约：内容为持有者，修改时间即最近一次心跳
+#   reports/00000.jsonl        分片完成后的结果报告，存在即表示分片已完成
+#   reports/00000.<worker>.partial.jsonl  转换中的逐条记录，接手的工作进程据此跳过已完成的文件
+#   workers/<worker>           工作进程登记，修改时间作为共享文件系统上的时钟
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import asdict
+from typing import List, Optional
+from core.batch import BatchJob, _init_pool_worker, _init_worker, _run_job
+
+MANIFEST_DIR = 'manifest'
+LEASES_DIR = 'leases'
+REPORTS_DIR = 'reports'
+WORKERS_DIR = 'workers'
+JOB_FILE = 'job.json'
+
+DEFAULT_SHARD_SIZE = 100
+# 租约有效期（秒），心跳间隔为它的三分之一
+DEFAULT_LEASE_TTL = 60.0
+# 没有可认领的分片（都被其他工作进程持有）时，隔这么久重新扫描
+DEFAULT_POLL_INTERVAL = 5.0
+# 转换同一个文件时工作进程意外退出这么多次后，不再尝试，直接记为失败
+MAX_ITEM_ATTEMPTS = 2
+
+
+def _shard_name(index: int) -> str:
+    return f'{index:05d}'
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _read_jsonl(path: str):
+    """读取 JSON Lines，跳过写了一半的最后一行"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except OSError:
+        return
+
+
+def _create_exclusive(path: str, data: dict) -> bool:
+    """原子地创建一个带内容的文件（先写临时文件再硬链接），文件已存在时返回 False"""
+    temp_path = f'{path}.tmp-{uuid.uuid4().hex}'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    try:
+        os.link(temp_path, path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.unlink(temp_path)
+
+
+def create_sharded_job(job_dir: str, jobs: List[BatchJob], shard_size: int = DEFAULT_SHARD_SIZE,
+                       use_cache: bool = True, options: Optional[dict] = None,
+                       lease_ttl: float = DEFAULT_LEASE_TTL) -> bool:
+    """
+    在共享目录里创建分片任务；清单在临时目录里写好后整体改名，多个节点同时创建时只有一个生效
+    :return: 是否由本次调用创建（任务已存在时返回 False）
+    """
+    manifest_dir = os.path.join(job_dir, MANIFEST_DIR)
+    if os.path.exists(manifest_dir):
+        return False
+    os.makedirs(job_dir, exist_ok=True)
+    staging = os.path.join(job_dir, f'.staging-{uuid.uuid4().hex}')
+    os.makedirs(staging)
+    try:
+        shard_size = max(1, shard_size)
+        shard_count = 0
+        for start in range(0, len(jobs), shard_size):
+            with open(os.path.join(staging, _shard_name(shard_count) + '.jsonl'), 'w', encoding='utf-8') as f:
+                for job in jobs[start:start + shard_size]:
+                    record = dict(asdict(job), input_path=os.path.abspath(job.input_path),
+                                  output_path=os.path.abspath(job.output_path))
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            shard_count += 1
+        with open(os.path.join(staging, JOB_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'shards': shard_count,
+                'total': len(jobs),
+                'use_cache': use_cache,
+                'options': options or {},
+                'lease_ttl': lease_ttl,
+                'created_at': time.time(),
+            }, f, ensure_ascii=False)
+        for name in (LEASES_DIR, REPORTS_DIR, WORKERS_DIR):
+            os.makedirs(os.path.join(job_dir, name), exist_ok=True)
+        try:
+            os.rename(staging, manifest_dir)
+        except OSError:
+            # 另一个节点抢先创建了任务
+            return False
+        return True
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def load_job(job_dir: str) -> dict:
+    """读取任务参数，任务不存在时抛出 FileNotFoundError"""
+    path = os.path.join(job_dir, MANIFEST_DIR, JOB_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"分片任务不存在: {job_dir}")
+    return _read_json(path)
+
+
+def _done_shards(job_dir: str) -> set:
+    names = os.listdir(os.path.join(job_dir, REPORTS_DIR))
+    return {name[:-len('.jsonl')] for name in names if name.endswith('.jsonl') and '.' not in name[:-len('.jsonl')]}
+
+
+def shard_status(job_dir: str) -> dict:
+    """
+    任务进度（租约是否过期按本机时钟估计）
+    :return: {'shards', 'done', 'running', 'expired', 'pending', 'workers', 'total', 'ok', 'failed'}
+    """
+    job = load_job(job_dir)
+    done = _done_shards(job_dir)
+    now = time.time()
+    status = {'shards': job['shards'], 'done': len(done), 'running': 0, 'expired': 0, 'pending': 0,
+              'workers': 0, 'total': job['total'], 'ok': 0, 'failed': 0}
+    for index in range(job['shards']):
+        shard = _shard_name(index)
+        if shard in done:
+            for result in _read_jsonl(os.path.join(job_dir, REPORTS_DIR, shard + '.jsonl')):
+                status[result['status']] += 1
+            continue
+        try:
+            fresh = now - os.stat(os.path.join(job_dir, LEASES_DIR, shard + '.lease')).st_mtime < job['lease_ttl']
+            status['running' if fresh else 'expired'] += 1
+        except FileNotFoundError:
+            status['pending'] += 1
+    for name in os.listdir(os.path.join(job_dir, WORKERS_DIR)):
+        try:
+            if now - os.stat(os.path.join(job_dir, WORKERS_DIR, name)).st_mtime < job['lease_ttl']:
+                status['workers'] += 1
+        except FileNotFoundError:
+            pass
+    return status
+
+
+class _Heartbeat(threading.Thread):
+    """转换期间定期续约；发现租约已被接手时设置 lost，工作进程做完当前文件后放弃该分片"""
+
+    def __init__(self, worker, shard: str):
+        super().__init__(daemon=True)
+        self.worker = worker
+        self.shard = shard
+        self.lost = threading.Event()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.worker.lease_ttl / 3):
+            if not self.worker._renew(self.shard):
+                self.lost.set()
+                return
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class ShardWorker:
+    """
+    分片任务的一个工作进程：反复认领未完成的分片并逐个转换其中的文件，直到所有分片完成
+    可以在任意多个节点上启动任意多个，包括任务运行期间中途加入
+    """
+
+    def __init__(self, job_dir: str, worker_id: str = None, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 on_result=None):
+        job = load_job(job_dir)
+        self.job_dir = job_dir
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.shard_count = job['shards']
+        self.lease_ttl = float(job['lease_ttl'])
+        self.use_cache = job['use_cache']
+        self.options = job['options']
+        self.poll_interval = poll_interval
+        self.on_result = on_result
+        self._worker_path = os.path.join(job_dir, WORKERS_DIR, self.worker_id)
+
+    def _path(self, directory: str, name: str) -> str:
+        return os.path.join(self.job_dir, directory, name)
+
+    def _now(self) -> float:
+        """共享文件系统上的当前时间：刷新本进程的登记文件并读取它的修改时间，避免各节点时钟偏差"""
+        with open(self._worker_path, 'a'):
+            pass
+        os.utime(self._worker_path, None)
+        return os.stat(self._worker_path).st_mtime
+
+    # ---- 租约 ----
+
+    def _try_claim(self, shard: str) -> bool:
+        lease = self._path(LEASES_DIR, shard + '.lease')
+        attempt = 1
+        try:
+            mtime = os.stat(lease).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None:
+            now = self._now()
+            if now - mtime < self.lease_ttl:
+                return False
+            # 租约过期：先改名为墓碑，同时发现过期的工作进程只有一个能改名成功
+            tomb = f'{lease}.expired-{self.worker_id}'
+            try:
+                os.rename(lease, tomb)
+            except FileNotFoundError:
+                return False
+            if now - os.stat(tomb).st_mtime < self.lease_ttl:
+                # 改名前刚被别人续约或重新认领，还回去
+                try:
+                    os.link(tomb, lease)
+                except FileExistsError:
+                    pass
+                os.unlink(tomb)
+                return False
+            attempt = _read_json(tomb).get('attempt', 0) + 1
+            os.unlink(tomb)
+        return _create_exclusive(lease, {
+            'worker': self.worker_id,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'attempt': attempt,
+            'claimed_at': time.time(),
+        })
+
+    def _owns(self, shard: str) -> bool:
+        return _read_json(self._path(LEASES_DIR, shard + '.lease')).get('worker') == self.worker_id
+
+    def _renew(self, shard: str) -> bool:
+        """心跳：确认租约仍归自己后刷新修改时间"""
+        if not self._owns(shard):
+            return False
+        try:
+            os.utime(self._path(LEASES_DIR, shard + '.lease'), None)
+            os.utime(self._worker_path, None)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _release(self, shard: str):
+        if self._owns(shard):
+            try:
+                os.unlink(self._path(LEASES_DIR, shard + '.lease'))
+            except FileNotFoundError:
+                pass
+
+    # ---- 分片 ----
+
+    def _load_shard(self, shard: str) -> List[BatchJob]:
+        return [BatchJob(**record) for record in _read_jsonl(self._path(MANIFEST_DIR, shard + '.jsonl'))]
+
+    def _previous_attempts(self, shard: str):
+        """
+        汇总之前接手过该分片的工作进程留下的逐条记录
+        :return: ({(input, output): 结果}, {(input, output): 开始后未完成的次数})
+        """
+        finished, crashes = {}, {}
+        prefix = shard + '.'
+        for name in os.listdir(os.path.join(self.job_dir, REPORTS_DIR)):
+            if not (name.startswith(prefix) and name.endswith('.partial.jsonl')):
+                continue
+            started = None
+            for record in _read_jsonl(self._path(REPORTS_DIR, name)):
+                key = (record['input'], record['output'])
+                if record['status'] == 'started':
+                    started = key
+                    continue
+                finished[key] = record
+                started = None
+            if started is not None and started not in finished:
+                # 这个工作进程在转换该文件时退出
+                crashes[started] = crashes.get(started, 0) + 1
+        return finished, crashes
+
+    def _run_shard(self, shard: str, summary: dict, stop_event) -> bool:
+        """
+        转换分片里的所有文件，完成后写出分片报告并释放租约
+        :return: 是否完成；租约丢失或被要求停止时返回 False
+        """
+        jobs = self._load_shard(shard)
+        finished, crashes = self._previous_attempts(shard)
+        partial_path = self._path(REPORTS_DIR, f'{shard}.{self.worker_id}.partial.jsonl')
+        results = []
+
+        heartbeat = _Heartbeat(self, shard)
+        heartbeat.start()
+        try:
+            with open(partial_path, 'a', encoding='utf-8') as partial:
+                for job in jobs:
+                    if heartbeat.lost.is_set() or (stop_event is not None and stop_event.is_set()):
+                        return False
+                    key = (job.input_path, job.output_path)
+                    result = finished.get(key)
+                    if result is None:
+                        if crashes.get(key, 0) >= MAX_ITEM_ATTEMPTS:
+                            result = {'input': job.input_path, 'output': job.output_path, 'status': 'failed',
+                                      'error': f"转换该文件时工作进程已意外退出 {crashes[key]} 次，不再尝试",
+                                      'cache': None, 'seconds': None}
+                        else:
+                            partial.write(json.dumps({'input': job.input_path, 'output': job.output_path,
+                                                      'status': 'started'}, ensure_ascii=False) + '\n')
+                            partial.flush()
+                            result = _run_job(job, use_cache=self.use_cache, options=self.options)
+                        partial.write(json.dumps(result, ensure_ascii=False) + '\n')
+                        partial.flush()
+                        _count(summary, result)
+                        if self.on_result:
+                            self.on_result(result)
+                    results.append(result)
+        finally:
+            heartbeat.stop()
+
+        if not self._owns(shard):
+            return False
+        report_path = self._path(REPORTS_DIR, shard + '.jsonl')
+        temp_path = f'{report_path}.tmp-{self.worker_id}'
+        with open(temp_path, 'w', encoding='utf-8') as report:
+            for result in results:
+                report.write(json.dumps(result, ensure_ascii=False) + '\n')
+        os.replace(temp_path, report_path)
+        for name in os.listdir(os.path.join(self.job_dir, REPORTS_DIR)):
+            if name.startswith(shard + '.') and name.endswith('.partial.jsonl'):
+                os.unlink(self._path(REPORTS_DIR, name))
+        self._release(shard)
+        return True
+
+    def run(self, stop_event: threading.Event = None) -> dict:
+        """
+        处理分片直到全部完成（或 stop_event 被设置）
+        :return: {'shards': 本进程完成的分片数, 'total', 'ok', 'failed', 'cache_hits', 'cache_misses', 'seconds'}
+        """
+        summary = {'shards': 0, 'total': 0, 'ok': 0, 'failed': 0, 'cache_hits': 0, 'cache_misses': 0}
+        started = time.perf_counter()
+        shards = [_shard_name(index) for index in range(self.shard_count)]
+        # 各工作进程从不同位置开始扫描，减少争抢同一个分片
+        if shards:
+            offset = zlib.crc32(self.worker_id.encode('utf-8')) % len(shards)
+            shards = shards[offset:] + shards[:offset]
+
+        _init_worker()
+        current = None
+        try:
+            while stop_event is None or not stop_event.is_set():
+                done = _done_shards(self.job_dir)
+                pending = [shard for shard in shards if shard not in done]
+                if not pending:
+                    break
+                claimed = False
+                for shard in pending:
+                    if stop_event is not None and stop_event.is_set():
+                        break
+                    if not self._try_claim(shard):
+                        continue
+                    current = shard
+                    if os.path.exists(self._path(REPORTS_DIR, shard + '.jsonl')):
+                        # 认领前刚被其他工作进程完成
+                        self._release(shard)
+                    else:
+                        claimed = True
+                        if self._run_shard(shard, summary, stop_event):
+                            summary['shards'] += 1
+                        else:
+                            self._release(shard)
+                    current = None
+                if not claimed:
+                    # 剩下的分片都在别人手里，等它们完成或租约过期
+                    (stop_event or threading.Event()).wait(self.poll_interval)
+        finally:
+            if current is not None:
+                # 中断时立即释放租约，其他工作进程不必等它过期
+                self._release(current)
+            try:
+                os.unlink(self._worker_path)
+            except FileNotFoundError:
+                pass
+
+        summary['seconds'] = round(time.perf_counter() - started, 3)
+        return summary
+
+
+def _count(summary: dict, result: dict):
+    summary['total'] += 1
+    summary[result['status']] += 1
+    if result.get('cache') == 'hit':
+        summary['cache_hits'] += 1
+    elif result.get('cache') == 'miss':
+        summary['cache_misses'] += 1
+
+
+def _run_worker_process(job_dir: str, poll_interval: float) -> dict:
+    return ShardWorker(job_dir, poll_interval=poll_interval).run()
+
+
+def run_shard_workers(job_dir: str, workers: int = 1, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                      on_result=None) -> dict:
+    """
+    在本机启动 workers 个工作进程处理分片任务，汇总它们的结果
+    :param on_result: 每个文件的结果回调，只在单进程时调用（多进程时结果见各分片报告）
+    """
+    if workers <= 1:
+        return ShardWorker(job_dir, poll_interval=poll_interval, on_result=on_result).run()
+
+    from concurrent.futures import ProcessPoolExecutor
+    started = time.perf_counter()
+    total = {'shards': 0, 'total': 0, 'ok': 0, 'failed': 0, 'cache_hits': 0, 'cache_misses': 0}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker) as executor:
+        futures = [executor.submit(_run_worker_process, job_dir, poll_interval) for _ in range(workers)]
+        for future in futures:
+            for key, value in future.result().items():
+                if key in total:
+                    total[key] += value
+    total['seconds'] = round(time.perf_counter() - started, 3)
+    return total
@@ -0,0 +1,260 @@
+# core/sync.py
+# 目录同步：把源目录镜像为目标格式，只转换新增或变化的文件，删除已删除输入对应的输出
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from core.batch import BatchJob, run_batch
+from core.cache import RUNTIME_OPTIONS, file_digest
+from core.factory import ConverterFactory
+from core.registry import get_engines
+
+MANIFEST_NAME = '.fileconvert-sync.sqlite'
+# 修改时间距现在不足这么多秒的文件视为仍在写入，推迟到下一轮
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_INTERVAL = 5.0
+# 每完成这么多个转换提交一次清单，中途退出也不会丢失已完成的记录
+_COMMIT_EVERY = 100
+
+
+@dataclass
+class ManifestRow:
+    input_path: str
+    output_path: str
+    size: int
+    mtime_ns: int
+    digest: str
+    version: str
+    status: str
+
+
+class SyncManifest:
+    """同步清单（SQLite）：每个输出对应的输入路径、大小、修改时间、内容哈希和转换器版本"""
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS outputs ('
+            ' input_path TEXT NOT NULL,'
+            ' output_path TEXT NOT NULL,'
+            ' output_ext TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' mtime_ns INTEGER NOT NULL,'
+            ' digest TEXT NOT NULL,'
+            ' version TEXT NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' error TEXT,'
+            ' converted_at REAL NOT NULL,'
+            ' PRIMARY KEY (input_path, output_ext))'
+        )
+        self._db.commit()
+
+    def load(self, output_ext: str, source_dir: str) -> dict:
+        """{input_path: ManifestRow}，只包含 source_dir 下的记录"""
+        prefix = os.path.join(source_dir, '')
+        cursor = self._db.execute(
+            'SELECT input_path, output_path, size, mtime_ns, digest, version, status FROM outputs '
+            'WHERE output_ext = ?', (output_ext,))
+        return {row[0]: ManifestRow(*row) for row in cursor if row[0].startswith(prefix)}
+
+    def save(self, row: ManifestRow, output_ext: str, error: Optional[str] = None):
+        self._db.execute(
+            'INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (row.input_path, row.output_path, output_ext, row.size, row.mtime_ns, row.digest, row.version,
+             row.status, error, time.time()))
+
+    def touch(self, rows, output_ext: str):
+        """内容没变、只是大小/时间戳变了的文件，更新记录而不重新转换"""
+        self._db.executemany(
+            'UPDATE outputs SET size = ?, mtime_ns = ? WHERE input_path = ? AND output_ext = ?',
+            [(row.size, row.mtime_ns, row.input_path, output_ext) for row in rows])
+
+    def delete(self, input_path: str, output_ext: str):
+        self._db.execute('DELETE FROM outputs WHERE input_path = ? AND output_ext = ?', (input_path, output_ext))
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+
+class DirectorySync:
+    """
+    把 source_dir 同步为 output_dir 下的 output_ext 文件（保持相对路径）
+    未变化的文件只比较 stat 信息，不读取内容；大小或时间戳变了才计算哈希确认
+    """
+
+    def __init__(self, source_dir: str, output_dir: str, output_ext: str, manifest_path: Optional[str] = None,
+                 workers: int = 1, use_cache: bool = True, options: Optional[dict] = None,
+                 debounce: float = DEFAULT_DEBOUNCE, on_result=None):
+        self.source_dir = os.path.abspath(source_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.output_ext = output_ext.lower().lstrip('.')
+        self.manifest = SyncManifest(manifest_path or os.path.join(self.output_dir, MANIFEST_NAME))
+        self.workers = max(1, workers)
+        self.use_cache = use_cache
+        self.options = options or {}
+        self.debounce = debounce
+        self.on_result = on_result
+        self._versions = {}
+
+        ConverterFactory.load_converters()
+        self._supported_inputs = {
+            input_ext for input_ext, outputs in ConverterFactory.supported_conversions().items()
+            if self.output_ext in outputs
+        }
+
+    def _version(self, input_ext: str) -> str:
+        """
+        转换路径上各转换器的版本，加上影响输出的参数；任何一项变化都会触发重新转换
+        同一步骤的引擎会随实测耗时切换，版本里包含该步骤的全部引擎，切换引擎本身不算变化
+        """
+        if input_ext not in self._versions:
+            route = ConverterFactory.plan(input_ext, self.output_ext, quality=self.options.get('quality'))
+            parts = [
+                ','.join(f'{engine.name}@{engine.converter.version}'
+                         for engine in get_engines(step.input_ext, step.output_ext))
+                for step in route
+            ]
+            options = sorted((k, str(v)) for k, v in self.options.items() if k not in RUNTIME_OPTIONS)
+            if options:
+                parts.append(repr(options))
+            self._versions[input_ext] = '+'.join(parts)
+        return self._versions[input_ext]
+
+    def _output_path(self, input_path: str) -> str:
+        rel_path = os.path.relpath(input_path, self.source_dir)
+        return str(Path(self.output_dir, rel_path).with_suffix(f'.{self.output_ext}'))
+
+    def scan(self):
+        """递归遍历源目录，产出 (路径, 扩展名, 大小, 修改时间ns)；只用 scandir 自带的 stat 信息"""
+        stack = [self.source_dir]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    # 输出目录在源目录内部时跳过，避免把输出当成输入
+                    if os.path.abspath(entry.path) != self.output_dir:
+                        stack.append(entry.path)
+                    continue
+                input_ext = Path(entry.name).suffix[1:].lower()
+                if input_ext not in self._supported_inputs:
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, input_ext, st.st_size, st.st_mtime_ns
+
+    def _remove_output(self, row: ManifestRow):
+        try:
+            os.unlink(row.output_path)
+        except FileNotFoundError:
+            pass
+        input_ext = Path(row.input_path).suffix[1:].lower()
+        if input_ext in self._supported_inputs:
+            last = ConverterFactory.plan(input_ext, self.output_ext)[-1]
+            for side_dir in last.converter.side_outputs(row.output_path, self.output_ext):
+                shutil.rmtree(side_dir, ignore_errors=True)
+
+    def sync_once(self) -> dict:
+        """
+        执行一轮同步
+        :return: {'scanned', 'converted', 'failed', 'unchanged', 'deferred', 'removed', 'seconds'}
+        """
+        started = time.perf_counter()
+        now_ns = time.time_ns()
+        stats = {'scanned': 0, 'converted': 0, 'failed': 0, 'unchanged': 0, 'deferred': 0, 'removed': 0}
+        rows = self.manifest.load(self.output_ext, self.source_dir)
+        seen = set()
+        touched = []
+        jobs = []
+        pending = {}
+
+        for input_path, input_ext, size, mtime_ns in self.scan():
+            stats['scanned'] += 1
+            seen.add(input_path)
+            row = rows.get(input_path)
+            version = self._version(input_ext)
+            output_path = self._output_path(input_path)
+
+            if row is not None and row.version == version and row.size == size and row.mtime_ns == mtime_ns:
+                # 转换失败的文件在内容变化之前不再重试
+                if row.status == 'failed' or os.path.exists(row.output_path):
+                    stats['unchanged'] += 1
+                    continue
+
+            if (now_ns - mtime_ns) / 1e9 < self.debounce:
+                stats['deferred'] += 1
+                continue
+
+            digest = file_digest(input_path)
+            new_row = ManifestRow(input_path, output_path, size, mtime_ns, digest, version, 'ok')
+            if row is not None and row.status == 'ok' and row.digest == digest and row.version == version \
+                    and os.path.exists(row.output_path):
+                touched.append(new_row)
+                stats['unchanged'] += 1
+                continue
+            jobs.append(BatchJob(input_path, output_path, input_ext, self.output_ext))
+            pending[input_path] = new_row
+
+        self.manifest.touch(touched, self.output_ext)
+
+        for input_path, row in rows.items():
+            if input_path not in seen:
+                self._remove_output(row)
+                self.manifest.delete(input_path, self.output_ext)
+                stats['removed'] += 1
+        self.manifest.commit()
+
+        completed = [0]
+
+        def _record(result):
+            row = pending[result['input']]
+            if result['status'] == 'ok':
+                stats['converted'] += 1
+            else:
+                row.status = 'failed'
+                stats['failed'] += 1
+            self.manifest.save(row, self.output_ext, result['error'])
+            completed[0] += 1
+            if completed[0] % _COMMIT_EVERY == 0:
+                self.manifest.commit()
+            if self.on_result:
+                self.on_result(result)
+
+        if jobs:
+            run_batch(jobs, workers=self.workers, on_result=_record, use_cache=self.use_cache,
+                      options=self.options)
+        self.manifest.commit()
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        return stats
+
+    def watch(self, interval: float = DEFAULT_INTERVAL, stop_event: Optional[threading.Event] = None,
+              on_sync=None):
+        """轮询同步，直到 stop_event 被设置（或 KeyboardInterrupt）"""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            stats = self.sync_once()
+            if on_sync:
+                on_sync(stats)
+            stop_event.wait(interval)
+
+    def close(self):
+        self.manifest.close()
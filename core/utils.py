@@ -1,6 +1,13 @@
+import io
 import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
+
+# 使用 tmpfs 作为中间文件目录时要求的最小剩余空间
+_MIN_TMPFS_FREE = 512 * 1024 * 1024
 
 
 def validate_file_path(input_path: str, output_path: str) -> Tuple[str, str, str, str]:
@@ -17,4 +24,77 @@ def validate_file_path(input_path: str, output_path: str) -> Tuple[str, str, str
     if not input_ext or not output_ext:
         raise ValueError("文件必须包含扩展名")
 
-    return input_path, output_path, input_ext, output_ext
\ No newline at end of file
+    return input_path, output_path, input_ext, output_ext
+
+
+def scratch_root() -> Optional[str]:
+    """
+    中间文件的根目录：FILECONVERT_SCRATCH_DIR，否则在剩余空间足够时使用 /dev/shm（tmpfs）
+    :return: None 表示使用系统默认临时目录
+    """
+    configured = os.environ.get('FILECONVERT_SCRATCH_DIR')
+    if configured:
+        os.makedirs(configured, exist_ok=True)
+        return configured
+    shm = '/dev/shm'
+    try:
+        if os.path.isdir(shm) and os.access(shm, os.W_OK) and shutil.disk_usage(shm).free >= _MIN_TMPFS_FREE:
+            return shm
+    except OSError:
+        pass
+    return None
+
+
+@contextmanager
+def scratch_dir():
+    """创建一个用完即删的中间文件目录"""
+    path = tempfile.mkdtemp(prefix='fileconvert-', dir=scratch_root())
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def ensure_seekable(src):
+    """需要随机读取（zip、PDF）时使用：不可 seek 的流先读入内存"""
+    seekable = getattr(src, 'seekable', None)
+    if seekable and seekable():
+        return src
+    return io.BytesIO(src.read())
+
+
+@contextmanager
+def text_writer(dst):
+    """把二进制输出流包装成 UTF-8 文本流，结束时刷新并解除包装（不关闭 dst）"""
+    writer = io.TextIOWrapper(dst, encoding='utf-8')
+    try:
+        yield writer
+        writer.flush()
+    finally:
+        writer.detach()
+
+
+def parse_page_ranges(spec: Optional[str], page_count: int) -> list:
+    """
+    解析页码范围，例如 '1-5,8,10-'（从 1 开始，含两端，'10-' 表示到最后一页）
+    :return: 去重排序后的页码列表；spec 为空时返回全部页
+    """
+    if not spec:
+        return list(range(1, page_count + 1))
+    pages = set()
+    for part in str(spec).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, dash, end = part.partition('-')
+        try:
+            first = int(start) if start.strip() else 1
+            last = (int(end) if end.strip() else page_count) if dash else first
+        except ValueError:
+            raise ValueError(f"无效的页码范围: {part}")
+        if first < 1 or last < first:
+            raise ValueError(f"无效的页码范围: {part}")
+        pages.update(range(first, min(last, page_count) + 1))
+    if not pages:
+        raise ValueError(f"页码范围超出文档页数（共 {page_count} 页）: {spec}")
+    return sorted(pages)
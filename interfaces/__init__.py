@@ -1,5 +1,15 @@
 # 界面模块导出
-from .cli import run_cli
-from .gui import run_gui
+# GUI 依赖 tkinter，只在真正使用时才导入，命令行启动不受影响
 
-__all__ = ['run_cli', 'run_gui']
\ No newline at end of file
+
+def run_cli():
+    from .cli import run_cli as _run_cli
+    return _run_cli()
+
+
+def run_gui():
+    from .gui import run_gui as _run_gui
+    return _run_gui()
+
+
+__all__ = ['run_cli', 'run_gui']
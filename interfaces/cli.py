@@ -1,4 +1,6 @@
 import argparse
+import glob
+import os
 from core.factory import ConverterFactory
 from core.utils import validate_file_path
 from core.exceptions import FileConversionError, UnsupportedFormatError
@@ -6,9 +8,55 @@ import sys
 
 def run_cli():
     parser = argparse.ArgumentParser(description='文件格式转换工具')
-    parser.add_argument('input', help='输入文件路径')
-    parser.add_argument('output', help='输出文件路径')
+    parser.add_argument('input', nargs='?', help='输入文件路径；批量模式下可以是目录或通配符')
+    parser.add_argument('output', nargs='?', help='输出文件路径；批量模式下为输出目录')
     parser.add_argument('--list', action='store_true', help='列出支持的转换格式')
+    parser.add_argument('--to', dest='target_format',
+                        help='批量模式的目标格式，例如 pdf；可用逗号分隔多个格式（例如 docx,pdf,txt,html），'
+                             '每个文件只解析一次，共用中间结果并发生成各格式（输入为单个文件时也适用）')
+    parser.add_argument('--manifest', help='批量模式的清单文件（每行一个输入路径，可用制表符附带输出路径）')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='并发进程数：批量模式下为同时转换的文件数（默认CPU核数），单文件时用于按页并行')
+    parser.add_argument('--report', help='批量模式的结果报告路径（JSON Lines），默认写到输出目录')
+    parser.add_argument('--ocr-dpi', type=int, help='扫描版PDF做OCR时的栅格化分辨率（默认200）')
+    parser.add_argument('--ocr', choices=['auto', 'always', 'never'],
+                        help='PDF转DOCX/TXT是否OCR：auto 按页判断，只识别没有文本层的扫描页（默认），'
+                             'always 全部OCR，never 从不OCR')
+    parser.add_argument('--pages', help='PDF转DOCX的页码范围，例如 1-5,8,10-')
+    parser.add_argument('--ocr-lang', help='tesseract 识别语言（默认 chi_sim）')
+    parser.add_argument('--quality', choices=['draft', 'standard', 'high'],
+                        help='同一转换有多个引擎时要求的最低质量档位（默认 standard），在满足要求的引擎中选实测最快的；'
+                             'draft 时PDF转TXT改用快速引擎（PyPDF2/pdfminer）')
+    parser.add_argument('--no-text-check', action='store_true',
+                        help='用快速引擎提取PDF文本时不检查乱码页（默认把看起来是乱码的页交给 pdfplumber 重新提取）')
+    parser.add_argument('--split-pdf', action='store_true',
+                        help='DOCX转PDF时在分节符/分页符处切块，按 -j 并行排版后合并（块边界处另起一页）')
+    parser.add_argument('--timeout', type=float,
+                        help='每个文件转换的墙钟时间上限（秒，默认600），超时后终止外部进程及其子进程')
+    parser.add_argument('--cpu-timeout', type=float, help='每个外部进程（soffice、xelatex、tesseract 等）的CPU时间上限（秒）')
+    parser.add_argument('--memory-limit', type=int, metavar='MB', help='每个外部进程的内存上限（MB）')
+    parser.add_argument('--sync', action='store_true',
+                        help='同步模式：把输入目录镜像到输出目录，只转换新增/变化的文件，删除已删除文件的输出')
+    parser.add_argument('--watch', nargs='?', type=float, const=5.0, metavar='SECONDS',
+                        help='持续同步，每隔 SECONDS 秒（默认5）轮询一次输入目录')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help='同步模式下修改时间在这么多秒内的文件视为仍在写入，推迟到下一轮（默认2）')
+    parser.add_argument('--shard-dir', metavar='DIR',
+                        help='多节点分片批量模式的共享任务目录：给出输入时创建任务（已存在则直接加入），'
+                             '各节点用同一目录启动工作进程，按 -j 在本机启动多个')
+    parser.add_argument('--shard-size', type=int, default=100, help='分片批量模式每个分片的文件数')
+    parser.add_argument('--lease-ttl', type=float, default=60.0,
+                        help='分片租约有效期（秒），工作进程停止心跳这么久后分片由其他工作进程接手')
+    parser.add_argument('--shard-status', action='store_true', help='输出 --shard-dir 任务的进度')
+    parser.add_argument('--no-cache', action='store_true', help='不使用转换结果缓存')
+    parser.add_argument('--cache-stats', action='store_true', help='输出缓存命中统计')
+    parser.add_argument('--serve', nargs='?', const='127.0.0.1:8765', metavar='ADDR',
+                        help='以常驻服务方式运行，监听 host:port 或 unix:/path（默认 127.0.0.1:8765）')
+    parser.add_argument('--queue-size', type=int, default=1000, help='服务模式的任务队列上限')
+    parser.add_argument('--server', metavar='ADDR', help='把转换任务提交给已运行的转换服务')
+    parser.add_argument('--profile', action='store_true', help='结束后输出各阶段耗时、CPU时间和读写字节数汇总')
+    parser.add_argument('--metrics-jsonl', metavar='PATH', help='把每个阶段的记录追加写入 JSON Lines 文件')
+    parser.add_argument('--metrics-prom', metavar='PATH', help='把阶段汇总写成 Prometheus 文本文件（textfile collector）')
 
     args = parser.parse_args()
 
@@ -16,24 +64,324 @@ def run_cli():
         _list_supported_conversions()
         return
 
+    if args.serve:
+        from interfaces.server import run_server
+        run_server(args.serve, workers=args.jobs, queue_size=args.queue_size)
+        return
+
+    profile = _setup_metrics(args)
+    try:
+        _run_local(parser, args)
+    finally:
+        _finish_metrics(profile)
+
+
+def _run_local(parser, args):
+    if args.shard_dir:
+        _run_sharded(parser, args)
+        return
+
+    if args.sync or args.watch is not None:
+        _run_sync(parser, args)
+        return
+
+    if _is_batch(args):
+        _run_batch(parser, args)
+        return
+
+    if not args.input or not args.output:
+        parser.error('需要提供输入和输出文件路径')
+
     try:
         input_path, output_path, input_ext, output_ext = validate_file_path(args.input, args.output)
 
-        converter = ConverterFactory.get_converter(input_ext, output_ext)
-        converter.convert(input_path, output_path, input_ext, output_ext)
+        if args.server:
+            _convert_remote(args, input_path, output_path)
+            return
+
+        cache_status = ConverterFactory.convert(input_path, output_path, input_ext, output_ext,
+                                                use_cache=not args.no_cache, jobs=args.jobs or 1,
+                                                **_conversion_options(args))
 
-        print(f"转换成功: {input_path} -> {output_path}")
+        print(f"转换成功: {input_path} -> {output_path}" + ("（来自缓存）" if cache_status == 'hit' else ""))
+        if args.cache_stats:
+            _print_cache_stats()
     except Exception as e:
         print(f"错误: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
 
+def _setup_metrics(args):
+    """按命令行参数和环境变量配置阶段记录的输出端，--profile 时返回汇总用的 SummarySink"""
+    from core import metrics
+
+    metrics.configure_from_env()
+    if args.metrics_jsonl:
+        metrics.add_sink(metrics.JsonLinesSink(args.metrics_jsonl))
+    if args.metrics_prom:
+        metrics.add_sink(metrics.PrometheusTextfileSink(args.metrics_prom))
+    if not args.profile:
+        return None
+    profile = metrics.SummarySink()
+    metrics.add_sink(profile)
+    return profile
+
+
+def _finish_metrics(profile):
+    from core import metrics
+
+    metrics.flush()
+    if profile is not None:
+        print("\n阶段耗时汇总:", file=sys.stderr)
+        print(profile.format(), file=sys.stderr)
+
+
+def _convert_remote(args, input_path: str, output_path: str):
+    """客户端模式：提交给转换服务并等待结果"""
+    from interfaces.client import ConversionClient
+
+    result = ConversionClient(args.server).convert(
+        input_path, output_path, use_cache=not args.no_cache, options=_conversion_options(args))
+    if result['status'] != 'done':
+        raise FileConversionError(result['error'])
+    print(f"转换成功: {input_path} -> {output_path}" + ("（来自缓存）" if result['cache'] == 'hit' else ""))
+
+
+def _conversion_options(args) -> dict:
+    """收集命令行上显式指定的转换参数（未指定的不传，保持缓存键稳定）"""
+    options = {
+        'ocr_dpi': args.ocr_dpi,
+        'ocr_lang': args.ocr_lang,
+        'ocr': args.ocr,
+        'pages': args.pages,
+        'split_pdf': args.split_pdf or None,
+        'text_check': False if args.no_text_check else None,
+        'quality': args.quality,
+        'timeout': args.timeout,
+        'cpu_timeout': args.cpu_timeout,
+        'memory_mb': args.memory_limit,
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def _is_batch(args) -> bool:
+    """指定了目标格式/清单，或输入是目录/通配符时进入批量模式"""
+    if args.target_format or args.manifest:
+        return True
+    return bool(args.input) and (os.path.isdir(args.input) or glob.has_magic(args.input))
+
+
+def _is_multi_target(args) -> bool:
+    return bool(args.target_format) and ',' in args.target_format
+
+
+def _result_outputs(result) -> str:
+    """多目标任务列出全部输出"""
+    outputs = result.get('outputs')
+    return ', '.join(outputs) if outputs else result['output']
+
+
+def _print_result(result):
+    """批量、分片和同步模式共用的单个文件结果输出"""
+    if result['status'] == 'ok':
+        print(f"转换成功: {result['input']} -> {_result_outputs(result)}")
+    else:
+        print(f"转换失败: {result['input']}: {result['error']}", file=sys.stderr)
+
+
+def _run_batch(parser, args):
+    from core.batch import collect_jobs, run_batch, REPORT_NAME
+
+    sources = [args.input] if args.input else []
+    output_dir = args.output
+    # 只给了清单和一个位置参数时，该参数就是输出目录
+    if args.manifest and args.input and not args.output:
+        sources, output_dir = [], args.input
+
+    if not args.target_format:
+        parser.error('批量模式需要用 --to 指定目标格式')
+    if not output_dir:
+        parser.error('批量模式需要提供输出目录')
+
+    if args.server and _is_multi_target(args):
+        parser.error('客户端模式不支持多个目标格式')
+
+    jobs = collect_jobs(sources, output_dir, args.target_format, manifest=args.manifest)
+    if not jobs:
+        print("没有找到可转换的文件", file=sys.stderr)
+        sys.exit(1)
+
+    report_path = args.report or os.path.join(output_dir, REPORT_NAME)
+
+    if args.server:
+        summary = _run_batch_remote(args, jobs, report_path, _print_result)
+    else:
+        summary = run_batch(jobs, workers=max(1, args.jobs or os.cpu_count() or 1), report_path=report_path,
+                            on_result=_print_result, use_cache=not args.no_cache,
+                            options=_conversion_options(args))
+    print(f"共 {summary['total']} 个文件，成功 {summary['ok']}，失败 {summary['failed']}，"
+          f"耗时 {summary['seconds']} 秒，报告: {report_path}")
+    if args.cache_stats:
+        print(f"缓存命中 {summary['cache_hits']}，未命中 {summary['cache_misses']}")
+        _print_cache_stats(include_counters=False)
+    if summary['failed']:
+        sys.exit(1)
+
+
+def _run_sharded(parser, args):
+    from core.batch import collect_jobs
+    from core.shard import create_sharded_job, run_shard_workers, shard_status, MANIFEST_DIR, REPORTS_DIR
+
+    def _print_status():
+        status = shard_status(args.shard_dir)
+        print(f"分片 {status['shards']} 个：完成 {status['done']}，处理中 {status['running']}，"
+              f"租约过期 {status['expired']}，待处理 {status['pending']}；活动工作进程 {status['workers']}；"
+              f"共 {status['total']} 个文件，已成功 {status['ok']}，已失败 {status['failed']}")
+
+    if args.shard_status:
+        try:
+            _print_status()
+        except FileNotFoundError as e:
+            print(f"错误: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if args.input or args.manifest:
+        sources = [args.input] if args.input else []
+        output_dir = args.output
+        # 同批量模式：只给了清单和一个位置参数时，该参数就是输出目录
+        if args.manifest and args.input and not args.output:
+            sources, output_dir = [], args.input
+        if not args.target_format or not output_dir:
+            parser.error('创建分片任务需要用 --to 指定目标格式，并提供输出目录')
+        jobs = collect_jobs(sources, output_dir, args.target_format, manifest=args.manifest)
+        if not jobs:
+            print("没有找到可转换的文件", file=sys.stderr)
+            sys.exit(1)
+        if create_sharded_job(args.shard_dir, jobs, shard_size=args.shard_size, use_cache=not args.no_cache,
+                              options=_conversion_options(args), lease_ttl=args.lease_ttl):
+            print(f"已创建分片任务: {len(jobs)} 个文件")
+        else:
+            print("分片任务已存在，加入处理（使用任务创建时的参数）")
+    elif not os.path.isdir(os.path.join(args.shard_dir, MANIFEST_DIR)):
+        parser.error('分片任务不存在；创建任务需要提供输入、输出目录和 --to')
+
+    try:
+        summary = run_shard_workers(args.shard_dir, workers=max(1, args.jobs or 1), on_result=_print_result)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(f"本机完成 {summary['shards']} 个分片，{summary['total']} 个文件，成功 {summary['ok']}，"
+          f"失败 {summary['failed']}，耗时 {summary['seconds']} 秒，"
+          f"报告目录: {os.path.join(args.shard_dir, REPORTS_DIR)}")
+    _print_status()
+
+
+def _run_sync(parser, args):
+    from core.sync import DirectorySync
+
+    if not args.input or not args.output or not os.path.isdir(args.input):
+        parser.error('同步模式需要提供输入目录和输出目录')
+    if not args.target_format:
+        parser.error('同步模式需要用 --to 指定目标格式')
+    if _is_multi_target(args):
+        parser.error('同步模式只支持一个目标格式')
+
+    def _print_stats(stats):
+        print(f"扫描 {stats['scanned']} 个文件，转换 {stats['converted']}，失败 {stats['failed']}，"
+              f"未变化 {stats['unchanged']}，推迟 {stats['deferred']}，删除 {stats['removed']}，"
+              f"耗时 {stats['seconds']} 秒")
+
+    sync = DirectorySync(args.input, args.output, args.target_format,
+                         workers=max(1, args.jobs or os.cpu_count() or 1), use_cache=not args.no_cache,
+                         options=_conversion_options(args), debounce=args.debounce, on_result=_print_result)
+    try:
+        if args.watch is None:
+            stats = sync.sync_once()
+            _print_stats(stats)
+            if stats['failed']:
+                sys.exit(1)
+        else:
+            print(f"开始监视 {args.input}，每 {args.watch} 秒同步一次（Ctrl+C 退出）")
+            # 监视模式只在有变化时输出统计
+            sync.watch(interval=args.watch,
+                       on_sync=lambda stats: (stats['converted'] or stats['failed'] or stats['removed'])
+                       and _print_stats(stats))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sync.close()
+
+
+def _run_batch_remote(args, jobs, report_path: str, on_result) -> dict:
+    """客户端模式的批量转换：全部提交给转换服务（队列满时退避重试），再逐个等待结果"""
+    import json
+    import time
+    from interfaces.client import ConversionClient, ServiceBusyError
+
+    client = ConversionClient(args.server)
+    options = _conversion_options(args)
+    summary = {'total': len(jobs), 'ok': 0, 'failed': 0, 'cache_hits': 0, 'cache_misses': 0}
+    started = time.perf_counter()
+
+    submitted = []
+    for job in jobs:
+        while True:
+            try:
+                submitted.append(client.submit(job.input_path, job.output_path,
+                                               use_cache=not args.no_cache, options=options))
+                break
+            except ServiceBusyError:
+                time.sleep(0.5)
+
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as report:
+        for remote_job in submitted:
+            remote = client.wait(remote_job['id'])
+            result = {
+                'input': remote['input'],
+                'output': remote['output'],
+                'status': 'ok' if remote['status'] == 'done' else 'failed',
+                'error': remote['error'],
+                'cache': remote['cache'],
+                'seconds': round(remote['finished_at'] - remote['started_at'], 3) if remote['started_at'] else None,
+            }
+            summary[result['status']] += 1
+            if result['cache'] == 'hit':
+                summary['cache_hits'] += 1
+            elif result['cache'] == 'miss':
+                summary['cache_misses'] += 1
+            report.write(json.dumps(result, ensure_ascii=False) + '\n')
+            on_result(result)
+
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def _print_cache_stats(include_counters: bool = True):
+    from core.cache import get_conversion_cache
+
+    cache = get_conversion_cache()
+    if cache is None:
+        print("缓存已通过 FILECONVERT_NO_CACHE 禁用")
+        return
+    stats = cache.stats()
+    print(f"缓存目录: {stats['cache_dir']}")
+    if include_counters:
+        print(f"本次命中 {stats['hits']}，未命中 {stats['misses']}，命中率 {stats['hit_rate']:.1%}，淘汰 {stats['evictions']}")
+    print(f"缓存条目 {stats['entries']}，占用 {stats['size'] / 1024 / 1024:.1f} MB / "
+          f"{stats['max_size'] / 1024 / 1024:.0f} MB")
+
+
 def _list_supported_conversions():
     print("支持的转换格式:")
     print("输入格式 -> 输出格式")
     print("-------------------")
 
-    # 获取所有已注册的转换器支持格式
-    for input_ext in ConverterFactory._converters:
-        for output_ext in ConverterFactory._converters[input_ext]:
-            print(f"{input_ext:8} -> {output_ext}")
\ No newline at end of file
+    # 只读取注册表，不导入任何转换后端
+    for input_ext, output_exts in sorted(ConverterFactory.supported_conversions().items()):
+        for output_ext in output_exts:
+            route = ConverterFactory.plan(input_ext, output_ext, resolve=False)
+            via = ''
+            if len(route) > 1:
+                via = '（经 ' + ' -> '.join(step.output_ext for step in route[:-1]) + '）'
+            print(f"{input_ext:8} -> {output_ext}{via}")
@@ -0,0 +1,88 @@
+# interfaces/client.py
+import http.client
+import json
+import os
+import socket
+import time
+from interfaces.server import DEFAULT_ADDRESS, parse_address
+
+# 队列满时的重试间隔（秒）
+_RETRY_DELAY = 0.5
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = None):
+        super().__init__('localhost', timeout=timeout)
+        self._socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
+
+
+class ServiceBusyError(Exception):
+    """服务端队列已满"""
+    pass
+
+
+class ConversionClient:
+    """转换服务的轻量客户端：只依赖标准库，不加载任何转换器"""
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, timeout: float = 60):
+        self.address = address
+        self.timeout = timeout
+        self._kind, self._target = parse_address(address)
+
+    def _connection(self, timeout: float):
+        if self._kind == 'unix':
+            return _UnixHTTPConnection(self._target, timeout=timeout)
+        return http.client.HTTPConnection(self._target[0], self._target[1], timeout=timeout)
+
+    def _request(self, method: str, path: str, payload: dict = None, timeout: float = None):
+        connection = self._connection(timeout or self.timeout)
+        try:
+            body = json.dumps(payload).encode('utf-8') if payload is not None else None
+            headers = {'Content-Type': 'application/json'} if body else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read().decode('utf-8'))
+        finally:
+            connection.close()
+
+    def submit(self, input_path: str, output_path: str, use_cache: bool = True, options: dict = None) -> dict:
+        """提交任务；队列满时抛出 ServiceBusyError"""
+        status, result = self._request('POST', '/jobs', {
+            'input': os.path.abspath(input_path),
+            'output': os.path.abspath(output_path),
+            'use_cache': use_cache,
+            'options': options or {},
+        })
+        if status == 429:
+            raise ServiceBusyError(result.get('error'))
+        if status != 202:
+            raise RuntimeError(result.get('error', f'HTTP {status}'))
+        return result
+
+    def status(self, job_id: str, wait: float = 0) -> dict:
+        status, result = self._request('GET', f'/jobs/{job_id}?wait={wait}', timeout=self.timeout + wait)
+        if status != 200:
+            raise RuntimeError(result.get('error', f'HTTP {status}'))
+        return result
+
+    def wait(self, job_id: str, poll: float = 30) -> dict:
+        """长轮询直到任务结束"""
+        while True:
+            result = self.status(job_id, wait=poll)
+            if result['status'] in ('done', 'failed'):
+                return result
+
+    def convert(self, input_path: str, output_path: str, use_cache: bool = True, options: dict = None) -> dict:
+        """提交并等待结果；服务端繁忙时退避重试"""
+        while True:
+            try:
+                job = self.submit(input_path, output_path, use_cache=use_cache, options=options)
+                break
+            except ServiceBusyError:
+                time.sleep(_RETRY_DELAY)
+        return self.wait(job['id'])
@@ -1,24 +1,109 @@
+import itertools
+import os
+import queue
+import threading
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
+from core.backends.process import cancel_scope
 from core.factory import ConverterFactory
 from core.utils import validate_file_path
-from core.exceptions import FileConversionError
+from core.exceptions import FileConversionError, UnsupportedFormatError, ConversionCancelledError
+
+# 后台同时执行的转换数（重活主要在 soffice/xelatex/tesseract 等子进程里，线程足够）
+DEFAULT_GUI_WORKERS = min(4, os.cpu_count() or 1)
+# Tk 主循环轮询后台事件的间隔（毫秒）
+_POLL_INTERVAL = 100
+
+
+class ConversionJobQueue:
+    """
+    后台转换队列：转换在线程池里执行，进度和结果通过线程安全的事件队列交回 Tk 主线程
+    事件: ('progress', job_id, done, total) / ('started', job_id) /
+          ('done', job_id, seconds, cache) / ('failed', job_id, message) / ('cancelled', job_id)
+    """
+
+    def __init__(self, workers: int = DEFAULT_GUI_WORKERS):
+        self.events = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='convert')
+        self._ids = itertools.count(1)
+        self._futures = {}
+        self._cancel_flags = {}
+
+    def submit(self, input_path: str, output_path: str, input_ext: str, output_ext: str) -> int:
+        job_id = next(self._ids)
+        cancel_flag = threading.Event()
+        self._cancel_flags[job_id] = cancel_flag
+        self._futures[job_id] = self._executor.submit(
+            self._run, job_id, cancel_flag, input_path, output_path, input_ext, output_ext)
+        return job_id
+
+    def cancel(self, job_id: int):
+        """
+        排队中的任务直接取消；运行中的任务立即杀掉正在运行的外部进程（soffice、xelatex、tesseract 等），
+        或在下一次进度回调时中止；只在进程内计算、不报告进度的步骤跑完后丢弃结果
+        """
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            self.events.put(('cancelled', job_id))
+            return
+        if job_id in self._cancel_flags:
+            self._cancel_flags[job_id].set()
+
+    def _run(self, job_id, cancel_flag, input_path, output_path, input_ext, output_ext):
+        def _progress(done, total):
+            if cancel_flag.is_set():
+                raise ConversionCancelledError("转换已取消")
+            self.events.put(('progress', job_id, done, total))
+
+        self.events.put(('started', job_id))
+        started = time.perf_counter()
+        try:
+            with cancel_scope(cancel_flag):
+                cache = ConverterFactory.convert(input_path, output_path, input_ext, output_ext, progress=_progress)
+            if cancel_flag.is_set():
+                raise ConversionCancelledError("转换已取消")
+            self.events.put(('done', job_id, time.perf_counter() - started, cache))
+        except ConversionCancelledError:
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+            self.events.put(('cancelled', job_id))
+        except Exception as e:
+            self.events.put(('failed', job_id, str(e)))
+        finally:
+            self._futures.pop(job_id, None)
+            self._cancel_flags.pop(job_id, None)
+
+    def shutdown(self):
+        for flag in list(self._cancel_flags.values()):
+            flag.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
 
 class FileConverterGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("PDF-DOCX 转换器")
-        self.root.geometry("600x400")
+        self.root.geometry("720x620")
         self.root.resizable(True, True)  # 允许窗口调整大小
         self.setup_ui()
 
         # 初始化转换器工厂
         ConverterFactory.load_converters()
 
-        # 支持的格式列表（仅PDF和DOCX）
-        self.supported_formats = {'pdf': ['docx'], 'html':['html'],'docx': ['pdf']}
+        # 支持的格式列表（包括经由中间格式的多步转换）
+        self.supported_formats = ConverterFactory.supported_conversions()
+
+        # 后台转换队列，结果通过 after() 轮询交回主线程
+        self.jobs = ConversionJobQueue()
+        self.job_info = {}
+        self.batch_started = None
+        self.batch_bytes = 0
+        self.batch_files = 0
+        self.root.after(_POLL_INTERVAL, self.poll_job_events)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def setup_ui(self):
         # 主框架
@@ -74,6 +159,23 @@ class FileConverterGUI:
             command=self.perform_conversion,
             style='Accent.TButton'
         ).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="批量添加...", command=self.add_multiple_files).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="取消所选", command=self.cancel_selected_jobs).pack(side=tk.RIGHT, padx=5)
+
+        # 任务列表
+        jobs_frame = ttk.LabelFrame(main_frame, text="转换任务", padding="10")
+        jobs_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+
+        self.job_tree = ttk.Treeview(jobs_frame, columns=('file', 'target', 'status', 'progress'),
+                                     show='headings', height=6)
+        for column, title, width in (('file', '文件', 320), ('target', '目标', 60),
+                                     ('status', '状态', 80), ('progress', '进度', 120)):
+            self.job_tree.heading(column, text=title)
+            self.job_tree.column(column, width=width, anchor=tk.W)
+        job_scrollbar = ttk.Scrollbar(jobs_frame, command=self.job_tree.yview)
+        self.job_tree.configure(yscrollcommand=job_scrollbar.set)
+        job_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.job_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
         # 日志输出
         log_frame = ttk.LabelFrame(main_frame, text="转换日志", padding="10")
@@ -96,7 +198,8 @@ class FileConverterGUI:
 
     def select_input_file(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("PDF文件", "*.pdf"), ("Word文档", "*.docx"),("Html文件","*.html")]
+            filetypes=[("PDF文件", "*.pdf"), ("Word文档", "*.docx"), ("Word 97-2003文档", "*.doc"),
+                       ("Html文件", "*.html")]
         )
         if file_path:
             self.input_path.set(file_path)
@@ -191,30 +294,105 @@ class FileConverterGUI:
             if output_ext not in self.supported_formats.get(input_ext, []):
                 raise UnsupportedFormatError(f"不支持从 {input_ext} 到 {output_ext} 的转换")
 
-            # 获取转换器并执行转换
-            converter = ConverterFactory.get_converter(input_ext, output_ext)
-
-            # 显示进度提示
-            progress_window = tk.Toplevel(self.root)
-            progress_window.title("转换中")
-            progress_window.geometry("300x100")
-            progress_window.transient(self.root)
-            progress_window.grab_set()
-
-            ttk.Label(progress_window, text="正在处理文件，请稍候...", font=('微软雅黑', 10)).pack(pady=20)
-            self.root.update()
-
-            try:
-                converter.convert(input_path, output_path, input_ext, output_ext)
-                self.log(f"转换成功: {input_path} -> {output_path}")
-                messagebox.showinfo("成功", "文件转换成功!")
-            finally:
-                progress_window.destroy()
-
+            # 放入后台队列，界面不会被阻塞
+            self.enqueue_job(input_path, output_path, input_ext, output_ext)
         except Exception as e:
             self.log(f"转换失败: {str(e)}", error=True)
             messagebox.showerror("错误", f"转换失败: {str(e)}")
 
+    def add_multiple_files(self):
+        """一次选择多个文件，按当前选择的目标格式转换到各自所在目录"""
+        output_ext = self.output_format.get()
+        if not output_ext:
+            messagebox.showwarning("提示", "请先选择一个输入文件并确定目标格式")
+            return
+
+        file_paths = filedialog.askopenfilenames(
+            filetypes=[("所有支持的文件", "*.pdf *.docx *.doc *.html"), ("PDF文件", "*.pdf"),
+                       ("Word文档", "*.docx"), ("Word 97-2003文档", "*.doc"), ("Html文件", "*.html")]
+        )
+        for file_path in file_paths:
+            input_ext = Path(file_path).suffix[1:].lower()
+            if output_ext not in self.supported_formats.get(input_ext, []):
+                self.log(f"跳过 {file_path}: 不支持从 {input_ext} 到 {output_ext} 的转换", error=True)
+                continue
+            self.enqueue_job(file_path, str(Path(file_path).with_suffix(f'.{output_ext}')), input_ext, output_ext)
+
+    def enqueue_job(self, input_path, output_path, input_ext, output_ext):
+        if not self.job_info or all(info['finished'] for info in self.job_info.values()):
+            self.batch_started = time.perf_counter()
+            self.batch_bytes = 0
+            self.batch_files = 0
+
+        job_id = self.jobs.submit(input_path, output_path, input_ext, output_ext)
+        self.job_info[job_id] = {
+            'input': input_path,
+            'output': output_path,
+            'size': os.path.getsize(input_path),
+            'finished': False,
+        }
+        self.job_tree.insert('', tk.END, iid=str(job_id),
+                             values=(input_path, output_ext, '排队中', ''))
+        self.log(f"已加入队列: {input_path} -> {output_path}")
+
+    def cancel_selected_jobs(self):
+        for item in self.job_tree.selection():
+            job_id = int(item)
+            if not self.job_info.get(job_id, {}).get('finished', True):
+                self.jobs.cancel(job_id)
+                self.job_tree.set(item, 'status', '取消中')
+
+    def poll_job_events(self):
+        """在 Tk 主线程里处理后台事件"""
+        try:
+            while True:
+                self.handle_job_event(self.jobs.events.get_nowait())
+        except queue.Empty:
+            pass
+        self.root.after(_POLL_INTERVAL, self.poll_job_events)
+
+    def handle_job_event(self, event):
+        kind, job_id = event[0], event[1]
+        info = self.job_info.get(job_id)
+        if info is None:
+            return
+        item = str(job_id)
+
+        if kind == 'started':
+            self.job_tree.set(item, 'status', '转换中')
+        elif kind == 'progress':
+            done, total = event[2], event[3]
+            self.job_tree.set(item, 'progress', f"第 {done} / {total} 页")
+        elif kind == 'done':
+            seconds, cache = event[2], event[3]
+            info['finished'] = True
+            self.batch_files += 1
+            self.batch_bytes += info['size']
+            self.job_tree.set(item, 'status', '完成')
+            self.job_tree.set(item, 'progress', '来自缓存' if cache == 'hit' else f"{seconds:.1f} 秒")
+            self.log(f"转换成功: {info['input']} -> {info['output']}（{seconds:.1f} 秒）")
+            self.log_throughput()
+        elif kind == 'failed':
+            info['finished'] = True
+            self.job_tree.set(item, 'status', '失败')
+            self.log(f"转换失败: {info['input']}: {event[2]}", error=True)
+        elif kind == 'cancelled':
+            info['finished'] = True
+            self.job_tree.set(item, 'status', '已取消')
+            self.log(f"已取消: {info['input']}")
+
+    def log_throughput(self):
+        elapsed = time.perf_counter() - self.batch_started if self.batch_started else 0
+        if elapsed <= 0:
+            return
+        pending = sum(1 for info in self.job_info.values() if not info['finished'])
+        self.log(f"吞吐: {self.batch_files / elapsed * 60:.1f} 个文件/分钟，"
+                 f"{self.batch_bytes / 1024 / 1024 / elapsed:.2f} MB/秒，剩余 {pending} 个任务")
+
+    def on_close(self):
+        self.jobs.shutdown()
+        self.root.destroy()
+
     def log(self, message, error=False):
         self.log_text.config(state=tk.NORMAL)
         tag = "ERROR" if error else "INFO"
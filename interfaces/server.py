@@ -0,0 +1,319 @@
+# interfaces/server.py
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from core import metrics
+from core.factory import ConverterFactory
+from core.exceptions import UnsupportedFormatError
+
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+DEFAULT_QUEUE_SIZE = 1000
+# 保留的已结束任务数量，超过后丢弃最早结束的
+_MAX_FINISHED_JOBS = 10000
+_MAX_BODY = 1024 * 1024
+# 每种输出格式同时执行的任务数上限（PDF 排版最占资源）
+DEFAULT_FORMAT_LIMITS = {'pdf': 2}
+# 工作进程意外退出使进程池失效时，正在执行的任务最多执行这么多次
+_MAX_JOB_ATTEMPTS = 2
+
+_STATUS_TEXT = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+                405: 'Method Not Allowed', 413: 'Payload Too Large', 429: 'Too Many Requests',
+                500: 'Internal Server Error'}
+
+
+def parse_address(address: str):
+    """'unix:/path/to.sock' 或 'host:port'"""
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def _init_worker():
+    # 工作进程各自按环境变量输出阶段记录（Prometheus 文件名带 pid）
+    metrics.clear_sinks()
+    metrics.configure_from_env(worker=True)
+    ConverterFactory.load_converters()
+
+
+def _execute(input_path, output_path, input_ext, output_ext, use_cache, options):
+    """在工作进程里执行转换；进程常驻，LibreOffice/pandoc 等后端保持预热"""
+    return ConverterFactory.convert(input_path, output_path, input_ext, output_ext,
+                                    use_cache=use_cache, **options)
+
+
+class ConversionJob:
+    def __init__(self, input_path, output_path, input_ext, output_ext, use_cache=True, options=None):
+        self.id = uuid.uuid4().hex
+        self.input_path = input_path
+        self.output_path = output_path
+        self.input_ext = input_ext
+        self.output_ext = output_ext
+        self.use_cache = use_cache
+        self.options = options or {}
+        self.status = 'queued'
+        self.error = None
+        self.cache = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'input': self.input_path,
+            'output': self.output_path,
+            'error': self.error,
+            'cache': self.cache,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class ConversionService:
+    """
+    常驻转换服务：每种输出格式一个队列（总长度有上限）+ 按输出格式限流 + 常驻进程池
+    每个队列的消费者数量就是该格式的并发上限，受限格式的任务排队时不会占住其它格式的消费者
+    队列满时直接拒绝（HTTP 429），不会无限制地堆积任务
+    """
+
+    def __init__(self, workers: int = None, queue_size: int = DEFAULT_QUEUE_SIZE, format_limits: dict = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.jobs = OrderedDict()
+        self.running = 0
+        limits = dict(DEFAULT_FORMAT_LIMITS, **(format_limits or {}))
+        self._format_limits = limits
+        # 输出格式 -> 队列，第一次出现该格式的任务时创建，同时启动该格式的消费者
+        self._queues = {}
+        self._executor = None
+        self._consumers = []
+
+    def _queue(self, output_ext: str) -> asyncio.Queue:
+        if output_ext not in self._queues:
+            queue = self._queues[output_ext] = asyncio.Queue()
+            limit = max(1, min(self._format_limits.get(output_ext, self.workers), self.workers))
+            self._consumers.extend(asyncio.create_task(self._consume(queue)) for _ in range(limit))
+        return self._queues[output_ext]
+
+    def queued(self) -> int:
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    async def start(self):
+        ConverterFactory.load_converters()
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+
+    def _replace_executor(self, broken: ProcessPoolExecutor):
+        """工作进程意外退出后进程池不能再用，换一个新的（几个任务同时发现时只换一次）"""
+        if self._executor is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._new_executor()
+
+    async def _run_job(self, job: ConversionJob):
+        """
+        在进程池里执行任务；工作进程意外退出时无法知道是哪个任务导致的，
+        换新进程池后重试当时正在执行的任务，最多执行 _MAX_JOB_ATTEMPTS 次
+        """
+        loop = asyncio.get_running_loop()
+        attempt = 1
+        while True:
+            executor = self._executor
+            try:
+                return await loop.run_in_executor(
+                    executor, _execute, job.input_path, job.output_path,
+                    job.input_ext, job.output_ext, job.use_cache, job.options)
+            except BrokenProcessPool:
+                self._replace_executor(executor)
+                if attempt >= _MAX_JOB_ATTEMPTS:
+                    raise RuntimeError(f"转换该文件时工作进程已意外退出 {attempt} 次，不再尝试")
+                attempt += 1
+
+    async def stop(self):
+        for task in self._consumers:
+            task.cancel()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, payload: dict) -> ConversionJob:
+        """校验并入队；队列满时抛出 asyncio.QueueFull"""
+        input_path = payload.get('input')
+        output_path = payload.get('output')
+        if not input_path or not output_path:
+            raise ValueError("需要提供 input 和 output")
+        if not os.path.exists(input_path):
+            raise ValueError(f"输入文件不存在: {input_path}")
+        input_ext = payload.get('input_ext') or Path(input_path).suffix[1:].lower()
+        output_ext = payload.get('output_ext') or Path(output_path).suffix[1:].lower()
+        ConverterFactory.plan(input_ext, output_ext, resolve=False)
+        if self.queued() >= self.queue_size:
+            raise asyncio.QueueFull
+
+        job = ConversionJob(input_path, output_path, input_ext, output_ext,
+                            use_cache=payload.get('use_cache', True), options=payload.get('options'))
+        self._queue(output_ext).put_nowait(job)
+        self.jobs[job.id] = job
+        self._trim_finished()
+        return job
+
+    def _trim_finished(self):
+        overflow = len(self.jobs) - _MAX_FINISHED_JOBS
+        if overflow <= 0:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done.is_set()][:overflow]:
+            del self.jobs[job_id]
+
+    async def _consume(self, queue: asyncio.Queue):
+        while True:
+            job = await queue.get()
+            try:
+                job.status = 'running'
+                job.started_at = time.time()
+                self.running += 1
+                try:
+                    job.cache = await self._run_job(job)
+                    job.status = 'done'
+                except Exception as e:
+                    job.status = 'failed'
+                    job.error = str(e)
+                finally:
+                    self.running -= 1
+            finally:
+                job.finished_at = time.time()
+                job.done.set()
+                queue.task_done()
+
+    def health(self) -> dict:
+        return {
+            'workers': self.workers,
+            'queued': self.queued(),
+            'queue_size': self.queue_size,
+            'running': self.running,
+            'jobs': len(self.jobs),
+        }
+
+    # ---- HTTP ----
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, query, body, keep_alive = request
+                status, payload = await self._route(method, path, query, body)
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, version = request_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > _MAX_BODY:
+            raise ConnectionError("请求体过大")
+        body = await reader.readexactly(length) if length else b''
+        path, _, query_string = target.partition('?')
+        query = dict(part.split('=', 1) for part in query_string.split('&') if '=' in part)
+        keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+        return method, path, query, body, keep_alive
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (
+            f'HTTP/1.1 {status} {_STATUS_TEXT.get(status, "")}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+        )
+        writer.write(head.encode('latin-1') + body)
+
+    async def _route(self, method: str, path: str, query: dict, body: bytes):
+        parts = [part for part in path.split('/') if part]
+        if parts == ['health'] and method == 'GET':
+            return 200, self.health()
+
+        if parts == ['jobs'] and method == 'POST':
+            try:
+                job = self.submit(json.loads(body or b'{}'))
+            except asyncio.QueueFull:
+                return 429, {'error': '队列已满，请稍后重试', **self.health()}
+            except (ValueError, UnsupportedFormatError) as e:
+                return 400, {'error': str(e)}
+            return 202, job.to_dict()
+
+        if len(parts) == 2 and parts[0] == 'jobs' and method == 'GET':
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return 404, {'error': '任务不存在'}
+            # ?wait=秒数：长轮询，直到任务结束或超时
+            try:
+                wait = float(query.get('wait', 0) or 0)
+            except ValueError:
+                wait = None
+            if wait is None or not math.isfinite(wait) or wait < 0:
+                return 400, {'error': f"wait 应为非负的秒数，而不是 {query['wait']}"}
+            if wait > 0 and not job.done.is_set():
+                try:
+                    await asyncio.wait_for(job.done.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+            return 200, job.to_dict()
+
+        if parts and parts[0] in ('jobs', 'health'):
+            return 405, {'error': '不支持的请求方法'}
+        return 404, {'error': '未知的路径'}
+
+
+async def serve(address: str = DEFAULT_ADDRESS, workers: int = None, queue_size: int = DEFAULT_QUEUE_SIZE):
+    service = ConversionService(workers=workers, queue_size=queue_size)
+    await service.start()
+    kind, target = parse_address(address)
+    if kind == 'unix':
+        if os.path.exists(target):
+            os.unlink(target)
+        server = await asyncio.start_unix_server(service.handle_connection, path=target)
+    else:
+        server = await asyncio.start_server(service.handle_connection, host=target[0], port=target[1])
+    print(f"转换服务已启动: {address}（{service.workers} 个工作进程，队列上限 {queue_size}）")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def run_server(address: str = DEFAULT_ADDRESS, workers: int = None, queue_size: int = DEFAULT_QUEUE_SIZE):
+    try:
+        asyncio.run(serve(address, workers, queue_size))
+    except KeyboardInterrupt:
+        print("转换服务已停止", file=sys.stderr)
@@ -1,6 +1,6 @@
 import sys
 from core.factory import ConverterFactory
-from interfaces import run_cli, run_gui
+from interfaces import run_cli, run_gui  # 两者都在调用时才导入对应界面模块
 
 
 def main():